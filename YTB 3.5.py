@@ -11,18 +11,35 @@ import shutil
 import time
 import ctypes
 import signal
+import math
+import struct
+import random
 import zipfile  # 用于解压 ffmpeg
+import glob
+import wave
+import atexit
+import tempfile
+import io
+import collections
+import hashlib
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor  # 用于有界的预取线程池
 
-# psutil 为可选依赖，用于更彻底地终止子进程。
-# 如果未安装 psutil，不会影响程序其它功能，仅在“取消下载”时退化为普通 terminate。
-try:
-    import psutil  # type: ignore[reportMissingImports]
-except ImportError:  # 在当前环境未安装时，后续逻辑会做兼容处理
-    psutil = None  # type: ignore[assignment]
 try:
     import winreg  # Windows 注册表操作，用于环境变量配置
 except ImportError:
     winreg = None
+try:
+    import winsound  # Windows 下用于 EQ 试听播放，其它平台改用 ffplay
+except ImportError:
+    winsound = None
+# numpy/scipy 为可选依赖，仅用于进程内 EQ 引擎；未安装时均衡器照常使用 ffmpeg 滤镜链
+try:
+    import numpy as np  # type: ignore[reportMissingImports]
+    from scipy import signal as scipy_signal  # type: ignore[reportMissingImports]
+except ImportError:
+    np = None  # type: ignore[assignment]
+    scipy_signal = None  # type: ignore[assignment]
 
 ###YTB 3.5 版本更新说明
 #时间：2025-11-26
@@ -33,6 +50,8 @@ except ImportError:
 CONFIG_DIR = os.path.join(os.getenv("APPDATA"), "YTBDownloader")  # 获取配置文件路径
 os.makedirs(CONFIG_DIR, exist_ok=True)  # 创建配置文件夹
 CONFIG_PATH = os.path.join(CONFIG_DIR, "config.json")  # 获取配置文件路径
+EQ_AUDIO_EXTS = [".mp3", ".wav", ".flac", ".m4a"]  # 均衡器支持的音频格式（输出 *_扩展名_EQ.wav）
+EQ_VIDEO_EXTS = [".mp4", ".mkv", ".mov"]  # 均衡器支持的视频格式（输出 *_扩展名_EQ.mkv）
 
 def resource_path(relative_path):  # 获取资源路径
     try:  # 如果资源路径存在
@@ -128,7 +147,7 @@ class AutoSetup:
     def check_and_install_python_dependencies(self):
         """检查并安装所有 Python 依赖"""
         self.log("🔍 检查 Python 依赖...")
-        dependencies = ['requests', 'psutil']
+        dependencies = ['requests']
         all_installed = True
         
         for dep in dependencies:
@@ -142,53 +161,27 @@ class AutoSetup:
         return all_installed
     
     def download_yt_dlp(self):
-        """下载 yt-dlp.exe"""
+        """下载 yt-dlp.exe（装入版本目录，旧版本保留，可回滚）"""
         try:
-            save_dir = os.path.join(os.getenv("APPDATA"), "YTBDownloader")
-            os.makedirs(save_dir, exist_ok=True)
-            save_path = os.path.join(save_dir, "yt-dlp.exe")
-            
-            # 检查是否已存在
-            if os.path.exists(save_path):
-                try:
-                    # 检查版本
-                    result = subprocess.run(
-                        [save_path, "--version"],
-                        capture_output=True,
-                        text=True,
-                        timeout=10,
-                        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-                    )
-                    if result.returncode == 0:
-                        version = result.stdout.strip().split('\n')[0]
-                        self.log(f"✅ yt-dlp 已存在: {version}")
-                        return True
-                except:
-                    pass
+            tool = TOOLS.get("yt-dlp")
+            if tool:
+                self.log(f"✅ yt-dlp 已存在: {tool['version']}")
+                return True
             
             self.log("📥 正在下载 yt-dlp.exe...")
-            url = "https://github.com/yt-dlp/yt-dlp/releases/latest/download/yt-dlp.exe"
-            response = requests.get(url, stream=True, timeout=30)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-            chunk_size = 8192
-            
-            with open(save_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if total_size > 0:
-                            percent = int(downloaded * 100 / total_size)
-                            if percent % 10 == 0:  # 每10%显示一次
-                                self.log(f"📥 下载进度: {percent}%")
-            
-            self.log(f"✅ yt-dlp.exe 下载完成: {save_path}")
+            reported = set()
+
+            def progress(downloaded, total_size):
+                percent = int(downloaded * 100 / total_size) // 10 * 10 if total_size else 0
+                if total_size and percent not in reported:  # 每10%显示一次
+                    reported.add(percent)
+                    self.log(f"📥 下载进度: {percent}%")
+
+            version = install_yt_dlp(progress)
+            self.log(f"✅ yt-dlp.exe 下载完成: {version}（{STORE.current_dir('yt-dlp')}）")
             
-            # 添加到 PATH
-            self.add_to_user_path(save_dir)
+            # 添加到 PATH（配置目录中同步了一份 yt-dlp.exe）
+            self.add_to_user_path(CONFIG_DIR)
             
             return True
         except Exception as e:
@@ -196,131 +189,38 @@ class AutoSetup:
             return False
     
     def check_ffmpeg(self):
-        """检查 ffmpeg 是否在 PATH 中"""
-        try:
-            result = subprocess.run(
-                ["ffmpeg", "-version"],
-                capture_output=True,
-                text=True,
-                timeout=5,
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-            )
-            if result.returncode == 0:
-                version_line = result.stdout.split('\n')[0]
-                self.log(f"✅ ffmpeg 已安装: {version_line}")
-                return True
-        except:
-            pass
-        
-        # 检查常见安装位置
-        common_paths = [
-            r"C:\ffmpeg\bin",
-            r"C:\Program Files\ffmpeg\bin",
-            r"C:\Program Files (x86)\ffmpeg\bin",
-            os.path.join(os.getenv("PROGRAMFILES", ""), "ffmpeg", "bin"),
-            os.path.join(os.getenv("PROGRAMFILES(X86)", ""), "ffmpeg", "bin"),
-        ]
-        
-        for path in common_paths:
-            if not path:
-                continue
-            ffmpeg_exe = os.path.join(path, "ffmpeg.exe")
-            if os.path.exists(ffmpeg_exe):
-                self.log(f"✅ 在 {path} 找到 ffmpeg")
-                self.add_to_user_path(path)
-                return True
-        
-        return False
+        """检查 ffmpeg 是否可用（PATH 或常见安装位置，结果由工具链登记表缓存）"""
+        tool = TOOLS.get("ffmpeg")
+        if not tool:
+            return False
+        self.log(f"✅ ffmpeg 已安装: {tool['version']}（{tool['path']}）")
+        missing = [name for name in ToolchainRegistry.FFMPEG_ENCODERS + ToolchainRegistry.FFMPEG_FILTERS
+                   if name not in tool["capabilities"]]
+        if missing:
+            self.log(f"⚠️ 当前 ffmpeg 缺少: {', '.join(missing)}，相关功能可能不可用")
+        in_store = os.path.abspath(tool["path"]).startswith(os.path.abspath(STORE.root) + os.sep)
+        if shutil.which("ffmpeg") is None and not in_store:
+            # 在常见安装位置找到但不在 PATH 中，补充到 PATH（本程序安装的版本目录会随升级变化，不加入 PATH）
+            self.add_to_user_path(os.path.dirname(tool["path"]))
+        return True
     
     def download_ffmpeg(self):
-        """自动下载并安装 ffmpeg"""
+        """自动下载并安装 ffmpeg：新版本装在单独的版本目录，装好后才切换，旧版本保留可回滚"""
         try:
             self.log("📥 正在下载 ffmpeg...")
-            
-            # 使用 Gyan.dev 的构建版本（稳定可靠）
-            # 下载 essentials 版本（包含必要文件）
-            download_url = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"
-            
-            # 安装目录
-            install_dir = r"C:\ffmpeg"
-            bin_dir = os.path.join(install_dir, "bin")
-            temp_zip = os.path.join(os.getenv("TEMP"), "ffmpeg.zip")
-            temp_extract = os.path.join(os.getenv("TEMP"), "ffmpeg_extract")
-            
-            try:
-                # 下载 zip 文件
-                response = requests.get(download_url, stream=True, timeout=60)
-                response.raise_for_status()
-                
-                total_size = int(response.headers.get('content-length', 0))
-                downloaded = 0
-                chunk_size = 8192
-                
-                with open(temp_zip, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=chunk_size):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            if total_size > 0:
-                                percent = int(downloaded * 100 / total_size)
-                                if percent % 10 == 0:  # 每10%显示一次
-                                    self.log(f"📥 下载进度: {percent}%")
-                
-                self.log("📦 正在解压 ffmpeg...")
-                
-                # 解压 zip 文件
-                with zipfile.ZipFile(temp_zip, 'r') as zip_ref:
-                    zip_ref.extractall(temp_extract)
-                
-                # 查找解压后的 ffmpeg 文件夹（通常是 ffmpeg-x.x.x-essentials_build）
-                extracted_dirs = [d for d in os.listdir(temp_extract) if os.path.isdir(os.path.join(temp_extract, d)) and d.startswith("ffmpeg")]
-                if not extracted_dirs:
-                    self.log("❌ 解压后未找到 ffmpeg 文件夹")
-                    return False
-                
-                source_dir = os.path.join(temp_extract, extracted_dirs[0])
-                
-                # 如果安装目录已存在，先删除
-                if os.path.exists(install_dir):
-                    self.log(f"⚠️ 检测到已存在的 {install_dir}，正在删除...")
-                    try:
-                        shutil.rmtree(install_dir)
-                    except Exception as e:
-                        self.log(f"⚠️ 删除旧目录失败: {e}，尝试继续...")
-                
-                # 复制到安装目录
-                self.log(f"📁 正在安装到 {install_dir}...")
-                shutil.copytree(source_dir, install_dir)
-                
-                # 验证安装
-                ffmpeg_exe = os.path.join(bin_dir, "ffmpeg.exe")
-                if not os.path.exists(ffmpeg_exe):
-                    self.log("❌ 安装后未找到 ffmpeg.exe")
-                    return False
-                
-                # 添加到 PATH
-                self.add_to_user_path(bin_dir)
-                
-                self.log(f"✅ ffmpeg 安装完成: {install_dir}")
-                self.log("   ⚠️ 需要重启程序或重新打开命令行才能使用 ffmpeg")
-                
-                return True
-                
-            except Exception as e:
-                self.log(f"❌ 下载或安装 ffmpeg 失败: {e}")
-                return False
-            finally:
-                # 清理临时文件
-                try:
-                    if os.path.exists(temp_zip):
-                        os.remove(temp_zip)
-                    if os.path.exists(temp_extract):
-                        shutil.rmtree(temp_extract)
-                except:
-                    pass
-                    
+            reported = set()
+
+            def progress(downloaded, total_size):
+                percent = int(downloaded * 100 / total_size) // 10 * 10 if total_size else 0
+                if total_size and percent not in reported:  # 每10%显示一次
+                    reported.add(percent)
+                    self.log(f"📥 下载进度: {percent}%")
+
+            version = install_ffmpeg(progress)
+            self.log(f"✅ ffmpeg 安装完成: {version}（{STORE.current_dir('ffmpeg')}）")
+            return True
         except Exception as e:
-            self.log(f"❌ 下载 ffmpeg 时出错: {e}")
+            self.log(f"❌ 下载或安装 ffmpeg 失败: {e}")
             return False
     
     def add_to_user_path(self, new_path):
@@ -365,22 +265,9 @@ class AutoSetup:
     
     def check_biliup(self):
         """检查 biliup 是否存在（可选）"""
-        # 获取程序所在目录
-        if getattr(sys, 'frozen', False):
-            program_dir = os.path.dirname(sys.executable)
-        else:
-            program_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # 检查程序目录
-        biliup_exe = os.path.join(program_dir, "biliup.exe")
-        if os.path.exists(biliup_exe):
-            self.log(f"✅ 找到 biliup: {biliup_exe}")
-            return True
-        
-        # 检查 biliup 文件夹
-        biliup_dir = os.path.join(program_dir, "biliup")
-        if os.path.exists(os.path.join(biliup_dir, "biliup.exe")):
-            self.log(f"✅ 找到 biliup: {biliup_dir}")
+        tool = TOOLS.get("biliup")
+        if tool:
+            self.log(f"✅ 找到 biliup: {tool['path']}")
             return True
         
         self.log("ℹ️ 未找到 biliup（可选，用于B站上传）")
@@ -464,173 +351,3022 @@ def run_auto_setup(log_callback=None, force=False):
 
 # ==================== 自动配置模块结束 ====================
 
-class SimpleDownloader:  # 创建下载器类
-    def __init__(self, root):
-        self.root = root
-        self.root.geometry("1500x800")
-        self.root.configure(bg="white")
+# ==================== 队列预取模块 ====================
 
-        # 获取屏幕宽度和高度
-        screen_width = self.root.winfo_screenwidth()
-        screen_height = self.root.winfo_screenheight()
+class LookaheadPrefetcher:
+    """队列预取器：当前任务下载期间，提前为后续排队任务解析标题/格式/封面"""
 
-        # 窗口宽度和高度
-        window_width = 1500
-        window_height = 800
+    def __init__(self, worker_fn, depth=2, max_workers=2, cleanup_fn=None):
+        """
+        初始化预取器
+        :param worker_fn: 预取函数，参数为 (url, format_id)，返回结果字典（失败返回 None）
+        :param depth: 预取深度，即提前处理队列中前几个任务
+        :param max_workers: 同时进行预取的最大线程数
+        :param cleanup_fn: 可选，任务被丢弃时对已得到的预取结果调用，用于删除预取生成的文件
+        """
+        self.worker_fn = worker_fn
+        self.cleanup_fn = cleanup_fn
+        self.depth = max(0, int(depth))
+        self.max_workers = max(1, int(max_workers))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch")
+        self.futures = {}  # url -> Future
+        self.lock = threading.Lock()
+
+    def schedule(self, pending_tasks):
+        """为队列中前 depth 个任务提交预取，已提交过的任务不会重复提交"""
+        with self.lock:
+            for url, format_id in pending_tasks[:self.depth]:
+                if url not in self.futures:
+                    self.futures[url] = self.executor.submit(self.worker_fn, url, format_id)
+
+    def claim(self, url):
+        """
+        领取某个任务的预取结果：
+        - 仍在排队未开始：撤销预取并返回 None，由调用方按原流程处理
+        - 正在进行：等待其完成，避免重复请求
+        """
+        with self.lock:
+            future = self.futures.pop(url, None)
+        if future is None or future.cancel():
+            return None
+        try:
+            return future.result()
+        except Exception:
+            return None
 
-        # 计算窗口左上角坐标
-        x = (screen_width - window_width) // 2
-        y = (screen_height - window_height) // 2
+    def scheduled(self, url):
+        """该任务是否已提交预取（尚未被领取或丢弃）"""
+        with self.lock:
+            return url in self.futures
 
-        # 设置窗口几何形状
-        self.root.geometry(f"{window_width}x{window_height}+{x}+{y}")
+    def discard(self, url):
+        """丢弃某个任务的预取（任务被取消时调用）；已完成或正在进行的预取在得到结果后交给 cleanup_fn 清理"""
+        with self.lock:
+            future = self.futures.pop(url, None)
+        if future is None or future.cancel() or self.cleanup_fn is None:
+            return
 
-        config = load_config()
-        # 统一规范为 Windows 风格路径显示（使用反斜杠）
-        self.save_path = os.path.normpath(config.get("save_path", os.getcwd()))
-        self.cookies_path = os.path.normpath(config.get("cookies_path", "")) if config.get("cookies_path") else ""
-        # 检查是否以管理员身份运行
-        try:
-            is_admin = ctypes.windll.shell32.IsUserAnAdmin()
-        except:
-            is_admin = False
+        def cleanup(done):
+            try:
+                result = done.result()
+            except Exception:
+                return
+            if result:
+                self.cleanup_fn(result)
+        future.add_done_callback(cleanup)
+
+    def reconfigure(self, depth, max_workers):
+        """修改预取深度与并发上限；并发数变化时换用新的线程池，旧线程池中的任务照常完成"""
+        self.depth = max(0, int(depth))
+        max_workers = max(1, int(max_workers))
+        if max_workers != self.max_workers:
+            old_executor = self.executor
+            self.max_workers = max_workers
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+            old_executor.shutdown(wait=False)
+
+# ==================== 队列预取模块结束 ====================
+
+# ==================== 带宽管理模块 ====================
+
+def parse_rate(text):
+    """把 "4M" / "500K" / "1048576" 这类速率文本解析为字节/秒；空值或 0 表示不限速"""
+    text = (text or "").strip().upper().rstrip("B/S").rstrip("/")
+    if not text:
+        return 0
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    multiplier = 1
+    if text[-1] in units:
+        multiplier = units[text[-1]]
+        text = text[:-1]
+    return max(0, int(float(text) * multiplier))
+
+
+def format_rate(rate):
+    """把字节/秒格式化为便于阅读的文本"""
+    if not rate:
+        return "不限速"
+    for unit, size in (("G", 1024 ** 3), ("M", 1024 ** 2), ("K", 1024)):
+        if rate >= size:
+            return f"{rate / size:.1f}{unit}B/s"
+    return f"{rate}B/s"
+
+
+class BandwidthManager:
+    """全局带宽管理：按时间段确定总速率预算，并在同时进行的下载之间平均分配"""
+
+    # 单个任务的最低速率（总预算很小时降为 预算/槽位数）；剩余预算不足时任务留在队列中，不超出总预算启动
+    MIN_SHARE = 64 * 1024
+
+    def __init__(self, global_limit="", schedule=""):
+        """
+        初始化带宽管理
+        :param global_limit: 默认总限速，如 "4M"，空值或 0 表示不限速
+        :param schedule: 时间段规则，如 "09:00-18:00=2M;22:00-07:00=0"，命中的时间段覆盖默认总限速
+        """
+        self.lock = threading.Lock()
+        self.active = {}  # task_id -> 分配到的速率（字节/秒）
+        self.configure(global_limit, schedule)
+
+    @staticmethod
+    def parse_schedule(schedule):
+        """解析时间段规则，返回 [(开始分钟, 结束分钟, 速率), ...]，格式错误的规则会被跳过"""
+        rules = []
+        for item in (schedule or "").replace("；", ";").split(";"):
+            m = re.fullmatch(r"\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(\S*)\s*", item)
+            if not m:
+                continue
+            try:
+                start = int(m.group(1)) * 60 + int(m.group(2))
+                end = int(m.group(3)) * 60 + int(m.group(4))
+                rules.append((start, end, parse_rate(m.group(5))))
+            except ValueError:
+                continue
+        return rules
+
+    def configure(self, global_limit, schedule):
+        """更新默认总限速和时间段规则"""
+        with self.lock:
+            self.global_limit = parse_rate(global_limit)
+            self.schedule = self.parse_schedule(schedule)
+
+    def current_budget(self, now=None):
+        """返回当前时刻的总速率预算（字节/秒，0 表示不限速）"""
+        now = now or time.localtime()
+        minute = now.tm_hour * 60 + now.tm_min
+        for start, end, rate in self.schedule:
+            # 支持跨午夜的时间段，例如 22:00-07:00
+            if (start <= minute < end) if start <= end else (minute >= start or minute < end):
+                return rate
+        return self.global_limit
+
+    def acquire(self, task_id, expected=1):
+        """
+        为即将启动的任务预留速率，返回分配给它的速率（字节/秒，0 表示不限速）；
+        剩余预算不足最低速率时返回 None，调用方可先用 rebalance 压低正在运行的任务，否则让任务继续排队。
+        每个任务最多领取 预算/预计同时下载数，且不超过尚未分出去的部分，保证总和不超过预算。
+        :param expected: 预计同时进行的下载数（含本任务），即现在就能启动的任务数
+        """
+        with self.lock:
+            budget = self.current_budget()
+            if not budget:
+                self.active[task_id] = 0
+                return 0
+            expected = max(expected, len(self.active) + 1, 1)
+            remaining = budget - sum(self.active.values())
+            share = min(budget // expected, remaining)
+            if share < min(self.MIN_SHARE, budget // expected):
+                return None
+            self.active[task_id] = share
+            return share
+
+    def rebalance(self, expected, movable):
+        """
+        按预计同时进行的下载数重新计算份额。yt-dlp 无法在运行中修改 --limit-rate，
+        调整只能通过以新速率重启 yt-dlp（断点续传）完成，所以只调整 movable 中的任务，且变化不大时不调整。
+        先压低超出份额的任务，再把空出的预算分给份额偏低的任务，任何时刻分出去的总和都不超过预算。
+        :param expected: 预计同时进行的下载数（可包含即将启动、尚未登记的任务）
+        :param movable: 可以重启调整限速的正在运行任务
+        :return: 需要以新速率重启的 {task_id: 新速率}（0 表示不限速）
+        """
+        with self.lock:
+            budget = self.current_budget()
+            movable = [task_id for task_id in movable if task_id in self.active]
+            changes = {}
+            if not budget:
+                for task_id in movable:
+                    if self.active[task_id]:
+                        self.active[task_id] = changes[task_id] = 0
+                return changes
+            target = budget // max(expected, len(self.active), 1)
+            for task_id in movable:
+                current = self.active[task_id]
+                if not current or current > target * 1.2:
+                    self.active[task_id] = changes[task_id] = target
+            free = budget - sum(self.active.values())
+            for task_id in movable:
+                current = self.active[task_id]
+                raised = min(target, current + free)
+                if raised >= current * 1.5:
+                    free -= raised - current
+                    self.active[task_id] = changes[task_id] = raised
+            return changes
+
+    def release(self, task_id):
+        """任务结束（或不再占用网络）时释放其份额，重复调用无副作用"""
+        with self.lock:
+            self.active.pop(task_id, None)
+
+# ==================== 带宽管理模块结束 ====================
+
+# ==================== 自适应并发模块 ====================
+
+class ThrottleController:
+    """
+    自适应并发控制：从 yt-dlp 输出中识别 429/限流信号，按站点（host）分别记录，
+    用 AIMD（加性增、乘性减）调整同时下载的槽位数和 --concurrent-fragments。
+    """
 
-        # 更新窗口标题
-        admin_status = "以管理员身份运行" if is_admin else "非管理员身份运行"
-        self.root.title(f"YTB视频下载器-3.5版本-{admin_status}")
+    # yt-dlp 输出中代表被限流/风控的关键字；503 等普通服务端错误和泛泛的“稍后重试”不计入，
+    # 只认 429、明确的限流提示和 YouTube 的风控文案（"This content isn't available, try again later"）
+    THROTTLE_PATTERN = re.compile(
+        r"HTTP Error 429|Too Many Requests|\brate[- ]?limit(?:ed|ing)?\b|\bthrottl(?:ed|ing)\b|"
+        r"Sign in to confirm you.?re not a bot|content isn.?t available, try again later",
+        re.IGNORECASE
+    )
+    # 形如 "[youtube] abc123: Downloading webpage" 的行首提取器名称
+    EXTRACTOR_PATTERN = re.compile(r"^\[([\w:]+)\]")
+    # yt-dlp 自身处理阶段的标签，不是提取器
+    NON_EXTRACTOR_TAGS = {"download", "info", "Merger", "VideoRemuxer", "FixupM3u8", "ThumbnailsConvertor", "hlsnative", "dashsegments"}
+    # 同一站点的短链/移动版域名归并到同一个限流状态
+    HOST_ALIASES = {"youtu.be": "youtube.com", "m.youtube.com": "youtube.com", "music.youtube.com": "youtube.com"}
+
+    def __init__(self, max_slots=3, max_fragments=4, cooldown=30):
+        """
+        初始化自适应并发控制
+        :param max_slots: 同时下载任务数上限（也是每个站点的上限）
+        :param max_fragments: 单任务分片并发上限
+        :param cooldown: 检测到限流后暂停该站点新任务的秒数，同时也是两次减半之间的最短间隔
+        """
+        self.lock = threading.Lock()
+        self.hosts = {}  # host -> 限流状态
+        self.cooldown = cooldown
+        self.configure(max_slots, max_fragments)
+
+    def configure(self, max_slots, max_fragments):
+        """修改并发上限，已有站点状态同步收紧到新上限内"""
+        with self.lock:
+            self.max_slots = max(1, int(max_slots))
+            self.max_fragments = max(1, int(max_fragments))
+            for state in self.hosts.values():
+                state["slots"] = min(state["slots"], self.max_slots)
+                state["fragments"] = min(state["fragments"], self.max_fragments)
+
+    @classmethod
+    def host_of(cls, url):
+        """从链接提取站点名，去掉 www. 前缀并归并别名"""
+        host = (urlparse(url).hostname or "").lower()
+        if host.startswith("www."):
+            host = host[4:]
+        return cls.HOST_ALIASES.get(host, host)
+
+    def _state(self, host):
+        # 新站点从 1 个槽位、1 个分片开始，成功后逐步放开（与原先的单任务单线程行为一致）
+        return self.hosts.setdefault(host, {
+            "slots": 1.0,
+            "fragments": 1.0,
+            "extractor": None,
+            "paused_until": 0.0,
+            "last_decrease": 0.0,
+            "throttle_events": 0,
+        })
+
+    def slots(self, host):
+        with self.lock:
+            return int(self._state(host)["slots"])
+
+    def fragments(self, host):
+        with self.lock:
+            return int(self._state(host)["fragments"])
+
+    def wait_time(self, host):
+        """该站点距离允许启动新任务还需等待的秒数（0 表示可以立即启动）"""
+        with self.lock:
+            return max(0.0, self._state(host)["paused_until"] - time.time())
+
+    def can_start(self, host, active_on_host, active_total):
+        """判断是否还能为该站点启动一个新任务"""
+        return (active_total < self.max_slots
+                and active_on_host < self.slots(host)
+                and self.wait_time(host) == 0)
+
+    def observe(self, host, line):
+        """
+        处理一行 yt-dlp 输出：记录提取器名称，识别限流信号。
+        :return: 本行是否为限流信号
+        """
+        m = self.EXTRACTOR_PATTERN.match(line)
+        if m and m.group(1) not in self.NON_EXTRACTOR_TAGS:
+            with self.lock:
+                self._state(host)["extractor"] = m.group(1)
+        if not self.THROTTLE_PATTERN.search(line):
+            return False
+        self._decrease(host)
+        return True
+
+    def _decrease(self, host):
+        """乘性减：槽位和分片并发减半，并暂停该站点的新任务一段时间"""
+        now = time.time()
+        with self.lock:
+            state = self._state(host)
+            state["throttle_events"] += 1
+            state["paused_until"] = max(state["paused_until"], now + self.cooldown)
+            # 一次限流往往连续输出多行，冷却期内只减半一次
+            if now - state["last_decrease"] < self.cooldown:
+                return
+            state["last_decrease"] = now
+            state["slots"] = max(1.0, state["slots"] / 2)
+            state["fragments"] = max(1.0, state["fragments"] / 2)
 
-        self.create_menu()
-        self.create_widgets()
-        self.cookies_valid = False
-        self.current_process = None
-        # 当前正在下载的任务在队列中的名称（用于“取消下载”识别，避免依赖文本里的“下载中”关键字）
-        self.current_downloading_name = None
-        self.download_info = {}  # 用于存储下载信息
-        # 下载队列控制：确保一次只下载一个任务
-        self.download_task_queue = []  # [(url, format_id), ...]
-        self.is_downloading = False    # 当前是否有任务正在下载
-        # 下载取消标记：用于在“准备下载/获取标题/封面”阶段安全中止当前任务
-        self.download_cancelled = False
-        # 标题缓存：url -> (原始标题, 已清洗标题)
-        self.title_cache = {}
-        self.log_lock = threading.Lock()  # 添加日志锁
-        self.yt_dlp_path = os.path.join(os.getenv("APPDATA"), "YTBDownloader", "yt-dlp.exe")
+    def task_finished(self, host, success, throttled):
+        """加性增：任务成功且期间没有限流时，逐步放开槽位和分片并发"""
+        if not success or throttled:
+            return
+        with self.lock:
+            state = self._state(host)
+            state["slots"] = min(float(self.max_slots), state["slots"] + 0.5)
+            state["fragments"] = min(float(self.max_fragments), state["fragments"] + 1)
 
-        # 启动自动配置（首次运行）
-        self.root.after(50, self.run_auto_setup_on_startup)  # 最先运行自动配置
-        
-        self.root.after(100, self.check_and_update_yt_dlp)  # 启动后延迟检测 yt-dlp
-        self.root.after(200, self._check_biliup_status)  # 启动后延迟检测 biliup
-        self.show_home()  # 启动时直接显示主页
-        
-        self.download_status_label = tk.Label(self.root, text="", bg="white", font=(None, 10))
-        self.download_status_label.pack(pady=5)
-        
-        # 初始化biliup路径
-        self.biliup_path = None
-        self.biliup_exe_path = None
-        self.biliup_cookies_path = None
-        
-        # 初始化上传进程跟踪
-        self.bili_upload_process = None
-        self.bili_terminal_process = None
-        self.bili_upload_thread = None
-        self.bili_upload_cancelled = False  # 标记是否被用户取消
+    def describe(self, host):
+        """返回用于日志显示的站点状态"""
+        with self.lock:
+            state = self._state(host)
+            name = state["extractor"] or host
+            return f"{name}: 槽位 {int(state['slots'])}/{self.max_slots}，分片并发 {int(state['fragments'])}/{self.max_fragments}"
 
-    def center_window(self):  # 居中窗口
-        self.root.update_idletasks()  # 更新窗口信息
-        width = self.root.winfo_width()  # 获取窗口宽度
-        height = self.root.winfo_height()  # 获取窗口高度
-        screen_width = self.root.winfo_screenwidth()  # 获取屏幕宽度
-        screen_height = self.root.winfo_screenheight()  # 获取屏幕高度
-        x = (screen_width // 2) - (width // 2)  # 计算窗口居中位置的X坐标
-        y = (screen_height // 2) - (height // 2)  # 计算窗口居中位置的Y坐标
-        self.root.geometry(f'{width}x{height}+{x}+{y}')  # 设置窗口位置
+# ==================== 自适应并发模块结束 ====================
 
+# ==================== 传输参数自动调优模块 ====================
 
-    def create_menu(self):  # 创建菜单
-        menubar = tk.Menu(self.root)  # 创建菜单栏
-        self.root.config(menu=menubar)  # 设置菜单栏
+def classify_format(format_id, format_types):
+    """
+    根据预取到的格式信息判断本次下载的传输类型
+    :param format_id: 用户输入的格式编号，如 "137+140"
+    :param format_types: 预取结果中的 {format_id: (protocol, container, vcodec, acodec)}
+    :return: "hls" / "dash" / "progressive" / "unknown"
+    """
+    kinds = set()
+    for fid in re.split(r"[+/,]", format_id or ""):
+        protocol, container = (format_types or {}).get(fid, ("", ""))[:2]
+        if not protocol:
+            continue
+        if "m3u8" in protocol:
+            kinds.add("hls")
+        elif "dash" in protocol or (container or "").endswith("_dash"):
+            kinds.add("dash")
+        else:
+            kinds.add("progressive")
+    # 多个流类型不同时，按分片化程度最高的类型计
+    for kind in ("hls", "dash", "progressive"):
+        if kind in kinds:
+            return kind
+    return "unknown"
 
-        menubar.add_command(label=" 🏠 主页  ", command=self.show_home) # 添加主页菜单项
-        menubar.add_command(label=" 📝 日志 ", command=self.show_log) # 添加日志菜单项
-        menubar.add_command(label=" ⚙️ 设置 ", command=self.show_settings) # 添加设置菜单项
 
+def can_stream_format(format_id, format_types):
+    """
+    判断本次下载能否边下边转（yt-dlp 输出到管道，ffmpeg 直接读取）：
+    只支持单一格式（"+" 合并需要 yt-dlp 先落盘再合并），且必须是可顺序读取的 HLS（MPEG-TS）或 DASH 分片流；
+    普通 HTTP 下载的 MP4 可能把 moov 放在文件末尾，需要随机访问，只能走落盘流程。
+    单一格式还必须同时带音频和视频：DASH 单流通常只有视频或只有音频，交付文件需要两者
+    """
+    if not format_id or "+" in format_id or "," in format_id:
+        return False
 
-    def check_cookies_valid(self):
-        if not self.cookies_path or not os.path.exists(self.cookies_path):
-            return False
-        try:
-            test_url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
-            cmd = [self.yt_dlp_path, "--cookies", self.cookies_path, "--dump-json", test_url]
-            creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-            env = os.environ.copy()
-            env['PYTHONIOENCODING'] = 'utf-8'
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=10, creationflags=creationflags, env=env)
-            return result.returncode == 0 and "LOGIN_REQUIRED" not in result.stderr
-        except Exception:
-            return False
+    def muxed(fid):
+        _, _, vcodec, acodec = ((format_types or {}).get(fid) or ("", "", "none", "none"))
+        return vcodec not in ("", "none") and acodec not in ("", "none")
 
-    def create_widgets(self):
-        self.settings_frame = tk.Frame(self.root, bg="white")
-        self.main_frame = tk.Frame(self.root, bg="white")
-        self.main_frame.pack(fill="both", expand=True, padx=0, pady=0)
+    return all(classify_format(fid, format_types) in ("hls", "dash") and muxed(fid) for fid in format_id.split("/"))
 
-        frame = tk.Frame(self.main_frame, bg="white")
-        frame.pack(pady=0)  # Reduced padding here
 
-        # 添加下载和下载列表选项卡
-        self.main_tabs = ttk.Notebook(self.main_frame)
+def parse_download_throughput(lines):
+    """
+    从 yt-dlp 的完成行（如 "[download] 100% of 10.00MiB in 00:00:05 at 1.95MiB/s"）统计平均吞吐量
+    :return: 字节/秒；没有可用的完成行时返回 None
+    """
+    units = {"B": 1, "KIB": 1024, "MIB": 1024 ** 2, "GIB": 1024 ** 3, "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3}
+    total_bytes = 0.0
+    total_seconds = 0
+    for line in lines:
+        m = re.search(r"100(?:\.0)?% of\s+~?\s*([\d.]+)\s*([KMG]?i?B)\s+in\s+(?:(\d+):)?(\d+):(\d+)", line)
+        if not m:
+            continue
+        unit = units.get(m.group(2).upper())
+        if unit is None:
+            continue
+        total_bytes += float(m.group(1)) * unit
+        total_seconds += int(m.group(3) or 0) * 3600 + int(m.group(4)) * 60 + int(m.group(5))
+    if total_bytes <= 0:
+        return None
+    return total_bytes / max(total_seconds, 1)
+
+
+class TransferTuner:
+    """
+    传输参数自动调优：按网络配置（代理 + 格式类型）记录每种 --http-chunk-size / --concurrent-fragments
+    组合的实际吞吐量，先把候选组合各试一次，之后以最优组合为主、少量随机探索，结果持久化到 CONFIG_DIR。
+    """
 
-        self.custom_tab = tk.Frame(self.main_tabs, bg="white", height=10)
-        self.main_tabs.add(self.custom_tab, text="📥 下载页")
+    MB = 1024 * 1024
+    # 候选组合 (chunk_size, fragments)，每类第一个为默认值（与原先的固定参数一致）
+    CANDIDATES = {
+        # 非分片的 HTTP 下载只受分块大小影响
+        "progressive": [(5 * MB, 1), (10 * MB, 1), (20 * MB, 1), (1 * MB, 1)],
+        # HLS 按分片下载，分块大小不起作用
+        "hls": [(5 * MB, 1), (5 * MB, 2), (5 * MB, 4), (5 * MB, 8)],
+        # DASH 可能是分片（dash segments），也可能是带 Range 的单文件，两者都调
+        "dash": [(5 * MB, 1), (10 * MB, 1), (5 * MB, 2), (10 * MB, 2), (5 * MB, 4), (20 * MB, 1), (1 * MB, 1)],
+    }
+
+    def __init__(self, state_path, epsilon=0.1, alpha=0.3):
+        """
+        初始化调优器
+        :param state_path: 学习结果的保存路径（JSON）
+        :param epsilon: 收敛后继续随机探索的概率，用于适应网络变化
+        :param alpha: 吞吐量指数滑动平均的权重，越大越偏向最近的测量
+        """
+        self.state_path = state_path
+        self.epsilon = epsilon
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.profiles = {}  # "代理|格式类型" -> {"chunk:fragments": {"n": 次数, "mean": 平均吞吐}}
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                self.profiles = json.load(f)
+        except (OSError, ValueError):
+            pass
 
-        custom_frame = tk.Frame(self.custom_tab, bg="white")
-        custom_frame.pack(pady=10, padx=10, anchor="center")
+    @staticmethod
+    def profile_key(format_type, proxy=None):
+        return f"{proxy or 'direct'}|{format_type}"
+
+    def choose(self, format_type, proxy=None):
+        """为本次下载选出 (chunk_size, fragments)"""
+        arms = self.CANDIDATES.get(format_type, self.CANDIDATES["progressive"])
+        with self.lock:
+            stats = self.profiles.get(self.profile_key(format_type, proxy), {})
+            untried = [arm for arm in arms if f"{arm[0]}:{arm[1]}" not in stats]
+            if untried:
+                return untried[0]
+            if random.random() < self.epsilon:
+                return random.choice(arms)
+            return max(arms, key=lambda arm: stats[f"{arm[0]}:{arm[1]}"]["mean"])
+
+    def record(self, format_type, proxy, chunk_size, fragments, throughput):
+        """
+        记录一次成功下载的吞吐量（字节/秒）并保存。
+        参数应是实际使用的组合；不在候选列表中的组合（如分片并发被限流上限压低后）不会被 choose 选中，不记录
+        """
+        if (chunk_size, fragments) not in self.CANDIDATES.get(format_type, self.CANDIDATES["progressive"]):
+            return
+        with self.lock:
+            stats = self.profiles.setdefault(self.profile_key(format_type, proxy), {})
+            entry = stats.setdefault(f"{chunk_size}:{fragments}", {"n": 0, "mean": 0.0})
+            entry["mean"] = throughput if entry["n"] == 0 else (1 - self.alpha) * entry["mean"] + self.alpha * throughput
+            entry["n"] += 1
+            self._save()
+
+    def _save(self):
+        # 先写临时文件再替换，避免写到一半时程序退出导致文件损坏
+        tmp_path = self.state_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.profiles, f, indent=2)
+            os.replace(tmp_path, self.state_path)
+        except OSError:
+            pass
 
-        icon_button_frame = tk.Frame(custom_frame, bg="white")
-        icon_button_frame.grid(row=0, column=2, rowspan=2, padx=(10, 0), pady=(0, 10))
+# ==================== 传输参数自动调优模块结束 ====================
 
-        search_icon_path = resource_path(os.path.join("icons", "搜索1.png"))
-        search_icon = tk.PhotoImage(file=search_icon_path).subsample(12, 12)
-        self.search_icon = search_icon
+# ==================== 代理池模块 ====================
 
-        download2_icon_path = resource_path(os.path.join("icons", "下载2.png"))
-        download2_icon = tk.PhotoImage(file=download2_icon_path).subsample(12, 12)
-        self.download2_icon = download2_icon
+class ProxyPool:
+    """
+    代理池：管理配置中的 HTTP/SOCKS 代理，按健康检测结果、近期吞吐量和错误率打分，
+    为每个下载任务分配当前最优的代理；连续出错的代理会被暂时停用，后续任务自动切换到其它代理。
+    """
 
-        tk.Label(custom_frame, text="视频链接：", bg="white", font=(None, 10)).grid(row=0, column=0, sticky="e")
-        self.custom_url_entry = tk.Entry(custom_frame, width=60, bd=1, relief="solid", bg="white", highlightthickness=1, highlightbackground="#CCCCCC", fg="black", font=(None, 10))
-        self.custom_url_entry.grid(row=0, column=1, padx=5)
+    # yt-dlp 输出中代表代理本身出问题的关键字；普通的超时、连接重置可能来自目标站点，不计入代理错误
+    PROXY_ERROR_PATTERN = re.compile(
+        r"ProxyError|ProxyConnectionError|Unable to connect to proxy|Cannot connect to proxy|Tunnel connection failed|"
+        r"Proxy Authentication Required|HTTP Error 407|SOCKS\d?\w* proxy|SOCKS server",
+        re.IGNORECASE
+    )
+    HEALTH_CHECK_URL = "https://www.youtube.com/generate_204"
+    # 尚无吞吐量数据时的先验值（字节/秒），让新代理也有机会被选中
+    DEFAULT_THROUGHPUT = 1024 * 1024
+
+    def __init__(self, proxies=None, bench_seconds=120, alpha=0.3):
+        """
+        初始化代理池
+        :param proxies: 代理地址列表，如 ["http://127.0.0.1:7890", "socks5://127.0.0.1:1080"]
+        :param bench_seconds: 代理连续出错后的停用时长
+        :param alpha: 吞吐量/错误率指数滑动平均的权重
+        """
+        self.lock = threading.Lock()
+        self.bench_seconds = bench_seconds
+        self.alpha = alpha
+        self.entries = {}  # proxy -> 状态
+        self.assigned = {}  # task_id -> proxy
+        self.configure(proxies or [])
+
+    def configure(self, proxies):
+        """更新代理列表，保留仍在列表中的代理的历史状态"""
+        with self.lock:
+            proxies = [p.strip() for p in proxies if p and p.strip()]
+            self.entries = {p: self.entries.get(p) or {
+                "throughput": None,      # 近期吞吐量（字节/秒）
+                "error_rate": 0.0,       # 近期错误率 0~1
+                "latency": None,         # 最近一次健康检测的耗时（秒）
+                "consecutive_failures": 0,
+                "benched_until": 0.0,
+                "in_use": 0,
+            } for p in proxies}
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def _score(self, entry):
+        throughput = entry["throughput"] or self.DEFAULT_THROUGHPUT
+        # 正在使用同一代理的任务会分走带宽，按使用数摊薄
+        return throughput * (1.0 - entry["error_rate"]) / (1 + entry["in_use"])
+
+    def _available(self):
+        now = time.time()
+        return [(p, e) for p, e in self.entries.items() if e["benched_until"] <= now]
+
+    def best(self):
+        """返回当前得分最高的可用代理（不登记占用），代理池为空或全部停用时返回 None"""
+        with self.lock:
+            available = self._available()
+            if not available:
+                return None
+            return max(available, key=lambda item: self._score(item[1]))[0]
+
+    def acquire(self, task_id):
+        """为任务分配得分最高的可用代理并登记占用；没有可用代理时返回 None（沿用系统代理）"""
+        with self.lock:
+            available = self._available()
+            if not available:
+                return None
+            proxy, entry = max(available, key=lambda item: self._score(item[1]))
+            entry["in_use"] += 1
+            self.assigned[task_id] = proxy
+            return proxy
+
+    def release(self, task_id, success=None, throughput=None, proxy_error=False):
+        """
+        任务结束时归还代理并更新评分，重复调用无副作用
+        :param success: 任务是否成功；为 None 时只归还占用，不更新评分（例如任务在开始下载前就中止）
+        :param proxy_error: 任务是否因代理本身出错而失败
+        """
+        with self.lock:
+            proxy = self.assigned.pop(task_id, None)
+            entry = self.entries.get(proxy)
+            if entry is None:
+                return
+            entry["in_use"] = max(0, entry["in_use"] - 1)
+            if success is not None:
+                self._update(entry, not proxy_error, throughput)
+
+    def _update(self, entry, ok, throughput=None):
+        entry["error_rate"] = (1 - self.alpha) * entry["error_rate"] + self.alpha * (0.0 if ok else 1.0)
+        if ok:
+            entry["consecutive_failures"] = 0
+            if throughput:
+                previous = entry["throughput"]
+                entry["throughput"] = throughput if previous is None else (1 - self.alpha) * previous + self.alpha * throughput
+        else:
+            entry["consecutive_failures"] += 1
+            # 连续两次出错即停用一段时间，后续任务自动切换到其它代理
+            if entry["consecutive_failures"] >= 2:
+                entry["benched_until"] = time.time() + self.bench_seconds
 
-        tk.Label(custom_frame, text="格式编号：", bg="white", font=(None, 10)).grid(row=1, column=0, sticky="e")
-        self.custom_format_entry = tk.Entry(custom_frame, width=60, bd=1, relief="solid", bg="white", highlightthickness=1, highlightbackground="#CCCCCC", fg="black", font=(None, 10))
-        self.custom_format_entry.grid(row=1, column=1, padx=5, sticky="w")
+    def health_check(self, timeout=8):
+        """
+        逐个检测代理连通性并更新评分，检测通过的停用代理会恢复使用。
+        :return: {proxy: (是否可用, 耗时秒数)}，未安装 PySocks 无法检测 SOCKS 代理时结果为 (None, None)
+        """
+        results = {}
+        for proxy in list(self.entries):
+            start = time.time()
+            try:
+                resp = requests.get(self.HEALTH_CHECK_URL, proxies={"http": proxy, "https": proxy}, timeout=timeout)
+                ok = resp.status_code < 500
+            except requests.exceptions.InvalidSchema:
+                # requests 需要 PySocks 才支持 socks 代理，无法检测时保持原状态
+                results[proxy] = (None, None)
+                continue
+            except Exception:
+                ok = False
+            latency = time.time() - start
+            with self.lock:
+                entry = self.entries.get(proxy)
+                if entry is None:
+                    continue
+                entry["latency"] = latency if ok else None
+                if ok:
+                    entry["benched_until"] = 0.0
+                self._update(entry, ok)
+            results[proxy] = (ok, latency)
+        return results
+
+    def describe(self, proxy):
+        """返回用于日志显示的代理状态"""
+        with self.lock:
+            entry = self.entries.get(proxy)
+            if entry is None:
+                return "系统代理"
+            throughput = format_rate(int(entry["throughput"])) if entry["throughput"] else "暂无数据"
+            return f"{proxy}（吞吐 {throughput}，错误率 {entry['error_rate']:.0%}）"
+
+# ==================== 代理池模块结束 ====================
+
+# ==================== 多账号 Cookies 轮换模块 ====================
+
+class CookiePool:
+    """
+    多账号 Cookies 轮换：每个 cookies 文件单独检测和记录状态，
+    并发任务按“占用少、近一小时请求少”的原则分散到不同账号，每个账号有每小时请求预算；
+    出现 LOGIN_REQUIRED 或限流的账号会被自动停用一段时间。
+    """
 
-        tk.Button(icon_button_frame, image=search_icon, command=self.query_formats, relief="flat", bg="white", activebackground="white", highlightthickness=0, bd=0).pack(pady=(0, 10))
-        tk.Button(icon_button_frame, image=download2_icon, command=self.download_selected_format, relief="flat", bg="white", activebackground="white", highlightthickness=0, bd=0).pack()
+    # yt-dlp 输出中代表账号失效或被风控的关键字
+    ACCOUNT_ERROR_PATTERN = re.compile(
+        r"LOGIN_REQUIRED|Sign in to confirm|cookies are no longer valid|"
+        r"only available for registered users|HTTP Error 429|Too Many Requests",
+        re.IGNORECASE
+    )
 
-        self.format_listbox = tk.Listbox(self.custom_tab, font=(None, 10), bg="white", bd=1, relief="solid")
-        self.format_listbox.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+    def __init__(self, paths=None, hourly_budget=90, bench_seconds=1800):
+        """
+        初始化账号池
+        :param paths: cookies 文件路径列表
+        :param hourly_budget: 每个账号每小时最多发起的 yt-dlp 请求数（下载和元数据请求都计入）
+        :param bench_seconds: 账号出现登录失效/限流后的停用时长
+        """
+        self.lock = threading.Lock()
+        self.hourly_budget = max(1, int(hourly_budget))
+        self.bench_seconds = bench_seconds
+        self.entries = {}  # path -> 状态
+        self.assigned = {}  # task_id -> path
+        self.configure(paths or [])
+
+    def configure(self, paths):
+        """更新账号列表，保留仍在列表中的账号的历史状态"""
+        with self.lock:
+            paths = [p for p in dict.fromkeys(paths) if p]
+            self.entries = {p: self.entries.get(p) or {
+                "valid": None,          # None 表示尚未检测
+                "in_use": 0,
+                "requests": [],         # 近一小时内的请求时间戳
+                "benched_until": 0.0,
+            } for p in paths}
+
+    def paths(self):
+        with self.lock:
+            return list(self.entries)
+
+    def set_valid(self, path, valid):
+        """记录检测结果；检测通过的账号同时解除停用"""
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                entry["valid"] = valid
+                if valid:
+                    entry["benched_until"] = 0.0
+
+    def has_valid(self):
+        with self.lock:
+            return any(e["valid"] for e in self.entries.values())
+
+    def _select(self):
+        # 只在已检测可用、未停用、未超出每小时预算的账号中选择
+        now = time.time()
+        candidates = []
+        for path, entry in self.entries.items():
+            entry["requests"] = [t for t in entry["requests"] if now - t < 3600]
+            if entry["valid"] and entry["benched_until"] <= now and len(entry["requests"]) < self.hourly_budget:
+                candidates.append((entry["in_use"], len(entry["requests"]), path))
+        if not candidates:
+            return None
+        path = min(candidates)[2]
+        self.entries[path]["requests"].append(now)
+        return path
+
+    def pick(self):
+        """为一次短请求（标题/格式/封面）选择账号，计入预算但不登记占用；没有可用账号时返回 None"""
+        with self.lock:
+            return self._select()
+
+    def acquire(self, task_id):
+        """为下载任务分配账号并登记占用；没有可用账号时返回 None（不使用 cookies 下载）"""
+        with self.lock:
+            path = self._select()
+            if path is not None:
+                self.entries[path]["in_use"] += 1
+                self.assigned[task_id] = path
+            return path
+
+    def release(self, task_id, bench=False):
+        """
+        任务结束时归还账号，重复调用无副作用
+        :param bench: 本次任务中该账号出现了登录失效或限流，需要停用
+        """
+        with self.lock:
+            path = self.assigned.pop(task_id, None)
+            entry = self.entries.get(path)
+            if entry is None:
+                return
+            entry["in_use"] = max(0, entry["in_use"] - 1)
+            if bench:
+                entry["benched_until"] = time.time() + self.bench_seconds
 
-        # 添加下载队列选项卡
-        self.queue_tab = tk.Frame(self.main_tabs, bg="white")
-        self.main_tabs.add(self.queue_tab, text="📋 下载队列")
+    def label(self, path):
+        """用于日志显示的账号名称（序号 + 文件名）"""
+        paths = self.paths()
+        index = paths.index(path) + 1 if path in paths else 0
+        return f"账号{index}（{os.path.basename(path)}）"
 
-        self.download_queue_listbox = tk.Listbox(self.queue_tab, font=(None, 10), bg="white", bd=1, relief="solid", highlightthickness=1, highlightbackground="#CCCCCC")
-        self.download_queue_listbox.pack(fill="both", expand=True, padx=10, pady=10)
+# ==================== 多账号 Cookies 轮换模块结束 ====================
 
-        self.queue_menu = tk.Menu(self.root, tearoff=0)
-        self.queue_menu.add_command(label="重新下载", command=self.retry_download)
-        self.queue_menu.add_command(label="取消下载", command=self.cancel_download)
+# ==================== 工具链模块 ====================
 
-        self.download_queue_listbox.bind("<Button-3>", self.show_queue_menu)
+def app_dir():
+    """程序所在目录：打包的 exe 为 exe 所在目录，脚本运行时为脚本所在目录"""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
 
-        self.log_frame = tk.Frame(self.root, bg="white")
 
+class ToolStore:
+    """
+    按版本并存的工具目录：tools/<工具>/<版本>/，由 tools/<工具>/current.json 指向当前版本。
+    新版本先完整安装到临时目录，再整体改名为版本目录，最后原子替换指针文件完成切换；
+    已经启动的任务使用启动时解析出的完整路径，继续运行在旧版本上。
+    切换前的版本记录在指针中，可以一步回滚。
+    """
 
-        self.log_notebook = ttk.Notebook(self.log_frame)
-        self.log_notebook.pack(fill="both", expand=True, padx=10, pady=0)
+    # 切换版本后需要让工具链登记表重新查找的工具
+    PROVIDES = {"yt-dlp": ("yt-dlp",), "ffmpeg": ("ffmpeg", "ffprobe", "ffplay")}
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+
+    def _pointer_path(self, tool):
+        return os.path.join(self.root, tool, "current.json")
+
+    def pointer(self, tool):
+        """{"version": 当前版本, "previous": 上一个版本}；未安装时返回 None"""
+        try:
+            with open(self._pointer_path(tool), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def current_dir(self, tool):
+        """当前版本目录，未安装时返回 None"""
+        pointer = self.pointer(tool)
+        if not pointer:
+            return None
+        path = os.path.join(self.root, tool, pointer["version"])
+        return path if os.path.isdir(path) else None
+
+    def versions(self, tool):
+        try:
+            return sorted(d for d in os.listdir(os.path.join(self.root, tool))
+                          if not d.startswith(".") and os.path.isdir(os.path.join(self.root, tool, d)))
+        except OSError:
+            return []
+
+    def install(self, tool, populate):
+        """
+        安装新版本并切换为当前版本
+        :param populate: populate(临时目录) 把文件放进临时目录并返回版本号；抛出异常时临时目录被清理，当前版本不受影响
+        :return: 新版本号
+        """
+        tool_dir = os.path.join(self.root, tool)
+        os.makedirs(tool_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=tool_dir)
+        try:
+            version = re.sub(r"[^\w.\-]", "_", populate(staging) or time.strftime("%Y%m%d-%H%M%S"))
+            target = os.path.join(tool_dir, version)
+            if os.path.isdir(target):
+                shutil.rmtree(staging, ignore_errors=True)  # 相同版本已经安装过，直接切换
+            else:
+                os.rename(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.activate(tool, version)
+        return version
+
+    def activate(self, tool, version):
+        """原子地把当前版本指针切换到 version"""
+        with self.lock:
+            pointer = self.pointer(tool) or {}
+            if pointer.get("version") == version:
+                return
+            tmp_path = self._pointer_path(tool) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": version, "previous": pointer.get("version"), "time": time.time()}, f, indent=2)
+            os.replace(tmp_path, self._pointer_path(tool))
+        for name in self.PROVIDES.get(tool, (tool,)):
+            TOOLS.refresh(name)
+
+    def rollback(self, tool):
+        """切回上一个版本，返回回滚后的版本号；没有可回滚的版本时返回 None"""
+        pointer = self.pointer(tool)
+        previous = pointer.get("previous") if pointer else None
+        if not previous or not os.path.isdir(os.path.join(self.root, tool, previous)):
+            return None
+        self.activate(tool, previous)
+        return previous
+
+    @staticmethod
+    def _paths_in_use():
+        """正在运行的子进程用到的工具路径：可执行文件本身，以及 yt-dlp 的 --ffmpeg-location 指向的 ffmpeg"""
+        paths = []
+        for process in PROCESSES.running():
+            args = process.args if isinstance(process.args, list) else []
+            paths += args[:1]
+            for i, arg in enumerate(args):
+                if arg == "--ffmpeg-location" and i + 1 < len(args):
+                    paths.append(args[i + 1])
+                elif arg.startswith("--ffmpeg-location="):
+                    paths.append(arg.split("=", 1)[1])
+        return [os.path.normcase(os.path.abspath(p)) for p in paths]
+
+    def prune(self, tool, keep=3):
+        """
+        删除较旧的版本：保留当前版本、上一个版本、最近 keep 个版本，以及仍有进程在使用的版本。
+        版本目录先整体改名为隐藏的 .trash- 目录再删除：改名失败（Windows 下有文件被占用）时该版本原样保留，
+        删到一半失败的只会是不再被当作版本的 .trash- 目录，下次清理时继续删除
+        """
+        pointer = self.pointer(tool) or {}
+        tool_dir = os.path.join(self.root, tool)
+        versions = sorted(self.versions(tool), key=lambda v: os.path.getmtime(os.path.join(tool_dir, v)), reverse=True)
+        protected = {pointer.get("version"), pointer.get("previous")} | set(versions[:keep])
+        in_use = self._paths_in_use()
+        for version in versions:
+            version_dir = os.path.normcase(os.path.abspath(os.path.join(tool_dir, version)))
+            if version in protected or any(path == version_dir or path.startswith(version_dir + os.sep) for path in in_use):
+                continue
+            trash = os.path.join(tool_dir, f".trash-{version}-{int(time.time())}")
+            try:
+                os.rename(os.path.join(tool_dir, version), trash)
+            except OSError:
+                continue
+        for name in os.listdir(tool_dir) if os.path.isdir(tool_dir) else []:
+            if name.startswith(".trash-"):
+                shutil.rmtree(os.path.join(tool_dir, name), ignore_errors=True)
+
+
+STORE = ToolStore(os.path.join(CONFIG_DIR, "tools"))
+
+
+class ToolchainRegistry:
+    """
+    外部工具（yt-dlp、ffmpeg、ffprobe、ffplay、biliup）的位置、版本和能力登记表：
+    每个工具只在第一次使用时查找并运行一次版本检测，结果连同文件的修改时间和大小保存到 JSON；
+    之后每次查询只做一次 stat 校验，文件被替换或删除时立即重新查找。
+    """
+
+    # ffmpeg 能力检测只关心本程序用到的编码器和滤镜
+    FFMPEG_ENCODERS = ("pcm_s32le", "flac", "aac", "libmp3lame", "libx264")
+    FFMPEG_FILTERS = ("equalizer", "loudnorm", "ebur128", "asplit")
+
+    def __init__(self, state_path):
+        self.state_path = state_path
+        self.lock = threading.Lock()
+        self.resolving = {}  # 工具名 -> 正在检测的 Event，避免多个线程同时运行版本检测
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def candidates(self, name):
+        """按优先级列出工具可能所在的路径"""
+        exe = f"{name}.exe" if os.name == 'nt' else name
+        on_path = [shutil.which(name)] if shutil.which(name) else []
+        if name == "yt-dlp":
+            # 本程序安装的当前版本优先（旧版本直接放在配置目录），其次是 PATH 中的
+            store_dir = STORE.current_dir("yt-dlp")
+            paths = ([os.path.join(store_dir, "yt-dlp.exe")] if store_dir else []) + [os.path.join(CONFIG_DIR, "yt-dlp.exe")] + on_path
+        elif name == "biliup":
+            base = app_dir()
+            paths = [os.path.join(d, exe) for d in (base, os.path.join(base, "biliup"),
+                                                      os.path.join(base, "..", "biliup"), os.path.join(base, "..", "..", "biliup"))] + on_path
+        else:
+            # ffprobe/ffplay 优先使用与 ffmpeg 同目录的版本，避免混用不同构建
+            ffmpeg = self.entries.get("ffmpeg") if name != "ffmpeg" else None
+            store_dir = STORE.current_dir("ffmpeg")
+            paths = ([os.path.join(os.path.dirname(ffmpeg["path"]), exe)] if ffmpeg and ffmpeg["path"] else [])
+            paths += ([os.path.join(store_dir, "bin", exe)] if store_dir else []) + on_path
+            paths += [os.path.join(d, exe) for d in (r"C:\ffmpeg\bin",
+                                                      os.path.join(os.getenv("PROGRAMFILES", ""), "ffmpeg", "bin"),
+                                                      os.path.join(os.getenv("PROGRAMFILES(X86)", ""), "ffmpeg", "bin"))]
+        return [os.path.abspath(p) for p in paths]
+
+    def get(self, name):
+        """
+        返回工具信息 {"path", "mtime", "size", "version", "capabilities"}，找不到时返回 None
+        """
+        while True:
+            with self.lock:
+                entry = self.entries.get(name)
+                if entry and entry["path"] and self._still_valid(entry):
+                    return dict(entry)
+                # 上次没找到：候选文件都没有变化时直接返回，不重复运行版本检测
+                seen = self._candidate_signature(name)
+                if entry and not entry["path"] and entry.get("seen") == seen:
+                    return None
+                event = self.resolving.get(name)
+                if event is None:
+                    event = self.resolving[name] = threading.Event()
+                    break
+            event.wait()  # 另一个线程正在检测同一工具，等它登记完成后重新查询
+        # 版本和能力检测可能要运行几十秒，在锁外进行，其他工具的查询（以及所有进程启动）不受影响
+        try:
+            entry = self._resolve(name) or {"path": None, "seen": seen}
+            with self.lock:
+                self.entries[name] = entry
+                self._save()
+        finally:
+            with self.lock:
+                self.resolving.pop(name).set()
+        return dict(entry) if entry["path"] else None
+
+    def path(self, name):
+        """工具的完整路径；找不到时返回工具名本身，由系统 PATH 决定（与原先直接用名称调用一致）"""
+        entry = self.get(name)
+        return entry["path"] if entry else name
+
+    def resolve_command(self, cmd):
+        """命令的第一个参数是已登记的工具名（如 "ffmpeg"）时替换为完整路径"""
+        if cmd and isinstance(cmd, list) and cmd[0] in ("yt-dlp", "ffmpeg", "ffprobe", "ffplay", "biliup"):
+            return [self.path(cmd[0])] + cmd[1:]
+        return cmd
+
+    def refresh(self, name=None):
+        """丢弃缓存，下次查询时重新查找（name 为空时全部重新查找）"""
+        with self.lock:
+            if name:
+                self.entries.pop(name, None)
+            else:
+                self.entries = {}
+            self._save()
+
+    def _candidate_signature(self, name):
+        """现有候选文件的 [路径, 修改时间, 大小] 列表，用于判断“没找到”的结果是否仍然成立"""
+        signature = []
+        for path in self.candidates(name):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature.append([path, stat.st_mtime, stat.st_size])
+        return signature
+
+    @staticmethod
+    def _still_valid(entry):
+        try:
+            stat = os.stat(entry["path"])
+        except OSError:
+            return False
+        return stat.st_mtime == entry["mtime"] and stat.st_size == entry["size"]
+
+    def _resolve(self, name):
+        for path in self.candidates(name):
+            if not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            version = self._run(path, ["-version"] if name.startswith("ff") else ["--version"])
+            if version is None:
+                continue  # 文件存在但无法运行（损坏或架构不符），继续找下一个
+            first_line = version.strip().splitlines()[0] if version.strip() else ""
+            match = re.search(r"version\s+(\S+)", first_line)
+            entry = {"path": path, "mtime": stat.st_mtime, "size": stat.st_size,
+                     "version": match.group(1) if match else first_line, "capabilities": []}
+            if name == "ffmpeg":
+                entry["capabilities"] = self._ffmpeg_capabilities(path)
+            return entry
+        return None
+
+    @staticmethod
+    def _run(path, args):
+        creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        try:
+            result = subprocess.run([path] + args, capture_output=True, text=True, encoding='utf-8', errors='replace',
+                                    timeout=15, creationflags=creationflags)
+        except (OSError, subprocess.SubprocessError):
+            return None
+        return result.stdout if result.returncode == 0 else None
+
+    def _ffmpeg_capabilities(self, path):
+        """本程序用到的编码器和滤镜中，当前 ffmpeg 实际支持的部分"""
+        found = []
+        for args, wanted in ((["-hide_banner", "-encoders"], self.FFMPEG_ENCODERS),
+                             (["-hide_banner", "-filters"], self.FFMPEG_FILTERS)):
+            names = {line.split()[1] for line in (self._run(path, args) or "").splitlines() if len(line.split()) > 1}
+            found += [name for name in wanted if name in names]
+        return found
+
+    def _save(self):
+        # 先写临时文件再替换，避免写到一半退出导致文件损坏
+        tmp_path = self.state_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.state_path)
+        except OSError:
+            pass
+
+
+TOOLS = ToolchainRegistry(os.path.join(CONFIG_DIR, "toolchain.json"))
+
+
+YT_DLP_URL = "https://github.com/yt-dlp/yt-dlp/releases/latest/download/yt-dlp.exe"
+FFMPEG_URL = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"  # Gyan.dev 的 essentials 构建
+
+
+def download_file(url, path, on_progress=None, timeout=60):
+    """
+    流式下载文件
+    :param on_progress: 可选回调 on_progress(已下载字节数, 总字节数)，总字节数未知时为 0
+    """
+    response = requests.get(url, stream=True, timeout=timeout)
+    response.raise_for_status()
+    total_size = int(response.headers.get('content-length', 0))
+    downloaded = 0
+    with open(path, "wb") as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            if chunk:
+                f.write(chunk)
+                downloaded += len(chunk)
+                if on_progress:
+                    on_progress(downloaded, total_size)
+
+
+def install_yt_dlp(on_progress=None):
+    """下载最新的 yt-dlp.exe 装入版本目录并切换为当前版本，返回版本号"""
+    def populate(folder):
+        exe = os.path.join(folder, "yt-dlp.exe")
+        download_file(YT_DLP_URL, exe, on_progress)
+        output = ToolchainRegistry._run(exe, ["--version"])
+        return output.strip().splitlines()[0] if output and output.strip() else None
+
+    version = STORE.install("yt-dlp", populate)
+    # 同步一份到配置目录（该目录在用户 PATH 中，命令行里也能用）；旧文件正被占用时跳过，不影响本程序
+    legacy_path = os.path.join(CONFIG_DIR, "yt-dlp.exe")
+    try:
+        shutil.copy2(os.path.join(STORE.current_dir("yt-dlp"), "yt-dlp.exe"), legacy_path + ".tmp")
+        os.replace(legacy_path + ".tmp", legacy_path)
+    except OSError:
+        pass
+    STORE.prune("yt-dlp")
+    return version
+
+
+def install_ffmpeg(on_progress=None):
+    """下载 ffmpeg 构建，解压后装入版本目录（含 bin/ffmpeg.exe）并切换为当前版本，返回版本号"""
+    def populate(folder):
+        temp_zip = os.path.join(folder, "ffmpeg.zip")
+        temp_extract = os.path.join(folder, "extract")
+        download_file(FFMPEG_URL, temp_zip, on_progress)
+        with zipfile.ZipFile(temp_zip, 'r') as zip_ref:
+            zip_ref.extractall(temp_extract)
+        # 解压后的文件夹通常是 ffmpeg-x.x.x-essentials_build
+        extracted_dirs = [d for d in os.listdir(temp_extract)
+                          if os.path.isdir(os.path.join(temp_extract, d)) and d.startswith("ffmpeg")]
+        if not extracted_dirs:
+            raise RuntimeError("解压后未找到 ffmpeg 文件夹")
+        source_dir = os.path.join(temp_extract, extracted_dirs[0])
+        for entry in os.listdir(source_dir):
+            shutil.move(os.path.join(source_dir, entry), os.path.join(folder, entry))
+        shutil.rmtree(temp_extract, ignore_errors=True)
+        os.remove(temp_zip)
+        if not os.path.exists(os.path.join(folder, "bin", "ffmpeg.exe")):
+            raise RuntimeError("安装包中未找到 ffmpeg.exe")
+        return extracted_dirs[0][len("ffmpeg-"):] if extracted_dirs[0].startswith("ffmpeg-") else extracted_dirs[0]
+
+    version = STORE.install("ffmpeg", populate)
+    STORE.prune("ffmpeg")
+    return version
+
+# ==================== 工具链模块结束 ====================
+
+# ==================== 子进程管理模块 ====================
+
+class ProcessManager:
+    """
+    统一启动和清理外部进程（yt-dlp、ffmpeg、biliup、ffplay）：
+    - 每个进程显式指定工作目录，不再修改本程序的当前目录，并行任务互不影响
+    - 每个进程独立成组：POSIX 下为新会话/进程组，Windows 下放入单独的 Job Object（关闭句柄即结束其中所有进程）
+    - 记录所有仍在运行的进程，取消时结束整棵进程树，程序退出时全部清理，不留孤儿进程
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processes = {}  # pid -> (Popen, Windows Job 句柄或 None)
+
+    def popen(self, cmd, cwd=None, **kwargs):
+        """
+        启动进程并登记（参数同 subprocess.Popen，creationflags 由本方法设置）；
+        命令名为 ffmpeg/yt-dlp 等工具名时按工具链登记表替换为完整路径
+        :param cwd: 子进程的工作目录，None 表示继承本程序的目录
+        """
+        if os.name == 'nt':
+            # 以挂起状态创建，先放入 Job Object 再恢复运行，子进程在此之前派生的孙进程也不会漏出 Job
+            kwargs["creationflags"] = (subprocess.CREATE_NO_WINDOW | subprocess.CREATE_NEW_PROCESS_GROUP |
+                                       0x00000004)  # CREATE_SUSPENDED
+        else:
+            kwargs["start_new_session"] = True
+        process = subprocess.Popen(TOOLS.resolve_command(cmd), cwd=cwd, **kwargs)
+        job = None
+        if os.name == 'nt':
+            job = self._create_job(process)
+            # Popen 不保留主线程句柄，用 NtResumeProcess 恢复整个进程
+            if ctypes.windll.ntdll.NtResumeProcess(int(process._handle)) != 0:
+                process.kill()
+                if job:
+                    ctypes.windll.kernel32.CloseHandle(job)
+                raise OSError(f"无法恢复挂起的进程: {cmd[0]}")
+        with self.lock:
+            self._prune()
+            self.processes[process.pid] = (process, job)
+        return process
+
+    def run(self, cmd, input=None, timeout=None, capture_output=False, **kwargs):
+        """
+        与 subprocess.run 相同的用法，但进程经 popen 启动；超时或被中断时结束整棵进程树
+        :return: subprocess.CompletedProcess；超时抛出 subprocess.TimeoutExpired
+        """
+        if capture_output:
+            kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+        if input is not None:
+            kwargs["stdin"] = subprocess.PIPE
+        process = self.popen(cmd, **kwargs)
+        try:
+            stdout, stderr = process.communicate(input, timeout=timeout)
+        except BaseException:
+            self.kill(process)
+            process.communicate()
+            raise
+        finally:
+            self.forget(process)
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+    def terminate(self, process):
+        """请求进程组退出（POSIX 发送 SIGTERM；Windows 没有温和的方式，等同 kill）"""
+        if os.name == 'nt':
+            self.kill(process)
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except OSError:
+            pass  # ESRCH：组内已没有进程
+
+    def kill(self, process):
+        """强制结束进程及其全部子进程"""
+        with self.lock:
+            job = self.processes.get(process.pid, (None, None))[1]
+        if os.name == 'nt' and process.poll() is not None and not job:
+            return  # 已经退出（PID 可能已被复用），不再按 PID 结束进程树；Job 句柄不存在复用问题
+        try:
+            if os.name != 'nt':
+                # 组长已退出时组内可能还有子进程（如 yt-dlp 派生的 ffmpeg），仍按进程组号结束；
+                # 组内还有进程时进程组号不会被复用，组已空时 killpg 返回 ESRCH
+                os.killpg(process.pid, signal.SIGKILL)
+            elif job:
+                ctypes.windll.kernel32.TerminateJobObject(job, 1)
+            else:
+                # 没能放入 Job Object 时退回按 PID 结束进程树
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True, timeout=5,
+                               creationflags=subprocess.CREATE_NO_WINDOW)
+        except (OSError, subprocess.SubprocessError):
+            pass
+        if process.poll() is None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+    def forget(self, process):
+        """进程结束后注销，并结束其进程组/Job 中残留的子进程"""
+        with self.lock:
+            entry = self.processes.pop(process.pid, None)
+        if entry:
+            self._release_group(process.pid, entry[1])
+
+    def running(self):
+        """当前仍在运行的进程列表"""
+        with self.lock:
+            return [p for p, _ in self.processes.values() if p.poll() is None]
+
+    def kill_all(self):
+        """结束所有登记的进程树，程序退出时调用"""
+        with self.lock:
+            processes = [p for p, _ in self.processes.values()]
+        for process in processes:
+            self.kill(process)
+            self.forget(process)
+
+    def _prune(self):
+        # 调用方持有锁：注销已经结束的进程，组内残留的子进程随之结束
+        for pid, (process, job) in list(self.processes.items()):
+            if process.poll() is not None:
+                self._release_group(pid, job)
+                del self.processes[pid]
+
+    @staticmethod
+    def _release_group(pid, job):
+        """结束已注销进程的进程组中残留的进程：Windows 关闭 Job 句柄（KILL_ON_JOB_CLOSE），POSIX 按进程组号发 SIGKILL"""
+        if os.name == 'nt':
+            if job:
+                ctypes.windll.kernel32.CloseHandle(job)
+            return
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass  # ESRCH：组内已没有进程
+
+    @staticmethod
+    def _create_job(process):
+        """创建设置了 KILL_ON_JOB_CLOSE 的 Job Object 并把进程放入；失败时返回 None"""
+        from ctypes import wintypes
+
+        class IoCounters(ctypes.Structure):
+            _fields_ = [(name, ctypes.c_ulonglong) for name in
+                        ("ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+                         "ReadTransferCount", "WriteTransferCount", "OtherTransferCount")]
+
+        class BasicLimits(ctypes.Structure):
+            _fields_ = [("PerProcessUserTimeLimit", ctypes.c_int64), ("PerJobUserTimeLimit", ctypes.c_int64),
+                        ("LimitFlags", wintypes.DWORD), ("MinimumWorkingSetSize", ctypes.c_size_t),
+                        ("MaximumWorkingSetSize", ctypes.c_size_t), ("ActiveProcessLimit", wintypes.DWORD),
+                        ("Affinity", ctypes.c_size_t), ("PriorityClass", wintypes.DWORD), ("SchedulingClass", wintypes.DWORD)]
+
+        class ExtendedLimits(ctypes.Structure):
+            _fields_ = [("BasicLimitInformation", BasicLimits), ("IoInfo", IoCounters),
+                        ("ProcessMemoryLimit", ctypes.c_size_t), ("JobMemoryLimit", ctypes.c_size_t),
+                        ("PeakProcessMemoryUsed", ctypes.c_size_t), ("PeakJobMemoryUsed", ctypes.c_size_t)]
+
+        kernel32 = ctypes.windll.kernel32
+        kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+        job = kernel32.CreateJobObjectW(None, None)
+        if not job:
+            return None
+        limits = ExtendedLimits()
+        limits.BasicLimitInformation.LimitFlags = 0x2000  # JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE
+        ok = kernel32.SetInformationJobObject(job, 9, ctypes.byref(limits), ctypes.sizeof(limits)) and \
+            kernel32.AssignProcessToJobObject(job, wintypes.HANDLE(int(process._handle)))
+        if not ok:
+            kernel32.CloseHandle(job)
+            return None
+        return job
+
+
+PROCESSES = ProcessManager()
+atexit.register(PROCESSES.kill_all)
+
+# ==================== 子进程管理模块结束 ====================
+
+# ==================== ffmpeg 任务模块 ====================
+
+class FFmpegJob:
+    """
+    单个 ffmpeg 进程：解析 -progress 输出回调进度，保留 stderr 末尾若干行用于诊断，支持取消。
+    通过 FFmpegRunner.start() 创建，结束时自动归还线程预算。
+    """
+
+    def __init__(self, runner, cmd, threads, on_progress=None, duration=None, stdin=None):
+        self.runner = runner
+        self.threads = threads
+        self.on_progress = on_progress
+        self.duration = duration  # 源时长（秒），已知时进度回调会带百分比
+        self.cancelled = False
+        self.stderr_tail = collections.deque(maxlen=20)
+        self.released = False
+        self.key = None  # FFmpegRunner 登记的任务键
+        self.process = PROCESSES.popen(cmd, stdin=stdin if stdin is not None else subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.progress_thread = threading.Thread(target=self._read_progress, daemon=True)
+        self.stderr_thread = threading.Thread(target=self._read_stderr, daemon=True)
+        self.progress_thread.start()
+        self.stderr_thread.start()
+
+    def _read_progress(self):
+        # -progress 每个统计块由若干 key=value 行组成，以 progress=continue/end 结束
+        block = {}
+        for raw in self.process.stdout:
+            key, _, value = raw.decode("utf-8", errors="replace").strip().partition("=")
+            block[key] = value
+            if key != "progress":
+                continue
+            if self.on_progress:
+                info = {"time": None, "speed": None, "fps": None, "percent": None, "done": value == "end"}
+                try:
+                    # out_time_us 是较新版本的字段名；旧版本只有（同样以微秒计的）out_time_ms
+                    info["time"] = int(block.get("out_time_us") or block.get("out_time_ms")) / 1000000
+                except (TypeError, ValueError):
+                    pass
+                try:
+                    info["speed"] = float(block.get("speed", "").rstrip("x"))
+                except ValueError:
+                    pass
+                try:
+                    info["fps"] = float(block.get("fps", ""))
+                except ValueError:
+                    pass
+                if self.duration and info["time"] is not None:
+                    info["percent"] = min(100.0, info["time"] / self.duration * 100)
+                try:
+                    self.on_progress(info)
+                except Exception:
+                    pass
+            block = {}
+
+    def _read_stderr(self):
+        for raw in self.process.stderr:
+            line = raw.decode("utf-8", errors="replace").strip()
+            if line:
+                self.stderr_tail.append(line)
+
+    def wait(self):
+        """等待结束并归还线程预算，返回退出码"""
+        returncode = self.process.wait()
+        self.progress_thread.join()
+        self.stderr_thread.join()
+        if not self.released:
+            self.released = True
+            self.runner.release(self.threads)
+        return returncode
+
+    def cancel(self):
+        self.cancelled = True
+        PROCESSES.terminate(self.process)
+
+    def error_summary(self, lines=2):
+        """stderr 的最后几行，用于失败时的日志"""
+        return " ".join(list(self.stderr_tail)[-lines:]) or "未知错误"
+
+
+class FFmpegRunner:
+    """
+    共享的 ffmpeg 任务执行器：
+    - 不经过 shell，直接以参数列表启动（跨平台）
+    - 自动追加 -progress pipe:1，把结构化进度（时间/速度/fps）交给回调
+    - 所有并发任务共享一份 CPU 线程预算，每个任务以 -threads/-filter_threads 限制占用，预算用完时新任务排队等待
+    - 记录正在运行的任务，可按任务键取消
+    """
+
+    def __init__(self, thread_budget=None):
+        self.thread_budget = thread_budget or os.cpu_count() or 1
+        self.available = self.thread_budget
+        self.condition = threading.Condition()
+        self.jobs = {}  # 任务键 -> [FFmpegJob, ...]
+
+    def configure(self, thread_budget):
+        with self.condition:
+            self.available += thread_budget - self.thread_budget
+            self.thread_budget = thread_budget
+            self.condition.notify_all()
+
+    def acquire(self, want):
+        """领取线程预算：没有任务在运行时总能拿到（至多整个预算），否则等到够用为止"""
+        want = max(1, min(want, self.thread_budget))
+        with self.condition:
+            while self.available < want and self.available < self.thread_budget:
+                self.condition.wait()
+            granted = min(want, max(self.available, 1))
+            self.available -= granted
+            return granted
+
+    def release(self, threads):
+        with self.condition:
+            self.available += threads
+            self.condition.notify_all()
+
+    @staticmethod
+    def prepare(cmd, threads):
+        """
+        插入进度输出和线程限制参数：-progress 等全局参数放在 ffmpeg 之后，
+        -threads 放在每个输出（以 -y 开头）之前，使其作用于该输出的编码器
+        """
+        prepared = [cmd[0], "-hide_banner", "-nostats", "-progress", "pipe:1", "-filter_threads", str(threads)]
+        for arg in cmd[1:]:
+            if arg == "-y":
+                prepared += ["-threads", str(threads)]
+            prepared.append(arg)
+        return prepared
+
+    def start(self, cmd, key=None, threads=None, on_progress=None, duration=None, stdin=None):
+        """
+        启动 ffmpeg 任务（可能因线程预算不足而阻塞）
+        :param key: 任务键，用于 cancel()；同一键下可以有多个任务
+        :param threads: 希望使用的线程数，默认取预算的一半
+        """
+        granted = self.acquire(threads or max(1, self.thread_budget // 2))
+        try:
+            job = FFmpegJob(self, self.prepare(cmd, granted), granted, on_progress, duration, stdin)
+        except Exception:
+            self.release(granted)
+            raise
+        job.key = key
+        if key is not None:
+            with self.condition:
+                self.jobs.setdefault(key, []).append(job)
+        return job
+
+    def finish(self, job):
+        """等待任务结束并注销，返回退出码"""
+        try:
+            return job.wait()
+        finally:
+            with self.condition:
+                jobs = self.jobs.get(job.key, [])
+                if job in jobs:
+                    jobs.remove(job)
+                if not jobs:
+                    self.jobs.pop(job.key, None)
+
+    def run(self, cmd, key=None, threads=None, on_progress=None, duration=None):
+        """同步执行，返回已结束的 FFmpegJob（returncode 见 job.process.returncode）"""
+        job = self.start(cmd, key, threads, on_progress, duration)
+        self.finish(job)
+        return job
+
+    def cancel(self, key):
+        """取消某个任务键下所有正在运行的 ffmpeg，返回取消的数量"""
+        with self.condition:
+            jobs = list(self.jobs.get(key, []))
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+
+def probe_duration(path):
+    """用 ffprobe 读取媒体时长（秒），失败时返回 0.0"""
+    creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    try:
+        result = subprocess.run([TOOLS.path("ffprobe"), "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+                                capture_output=True, text=True, creationflags=creationflags)
+        return float(result.stdout.strip())
+    except (OSError, ValueError):
+        return 0.0
+
+
+def probe_audio_codec(path):
+    """用 ffprobe 读取第一条音轨的编码名（如 pcm_s32le、aac），失败或没有音轨时返回空字符串"""
+    creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    try:
+        result = subprocess.run([TOOLS.path("ffprobe"), "-v", "error", "-select_streams", "a:0", "-show_entries", "stream=codec_name",
+                                 "-of", "csv=p=0", path], capture_output=True, text=True, creationflags=creationflags)
+        return result.stdout.strip().splitlines()[0] if result.stdout.strip() else ""
+    except OSError:
+        return ""
+
+
+def probe_has_audio(path):
+    """源文件是否带音轨；ffprobe 无法运行或读取失败时按有音轨处理（与原先的行为一致）"""
+    creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    try:
+        result = subprocess.run([TOOLS.path("ffprobe"), "-v", "error", "-select_streams", "a", "-show_entries", "stream=index",
+                                 "-of", "csv=p=0", path], capture_output=True, text=True, creationflags=creationflags)
+    except OSError:
+        return True
+    return result.returncode != 0 or bool(result.stdout.strip())
+
+# ==================== ffmpeg 任务模块结束 ====================
+
+# ==================== B站上传队列模块 ====================
+
+# 未单独指定时使用的投稿参数（与原先写死在命令中的值一致）
+BILI_DEFAULT_TAGS = "电音节,LIVE,DJ,电子音乐,电音"
+BILI_DEFAULT_TID = 29
+BILI_DEFAULT_COPYRIGHT = 2  # 1=自制，2=转载
+BILI_DEFAULT_SOURCE = "yt"
+
+
+def find_cover_near(video_path):
+    """在视频所在目录查找封面：优先 JPG/JPEG，其次 PNG；找不到返回 None"""
+    video_dir = os.path.dirname(video_path)
+    try:
+        files = sorted(os.listdir(video_dir))
+    except OSError:
+        return None
+    for exts in ((".jpg", ".jpeg"), (".png",)):
+        for file in files:
+            if file.lower().endswith(exts):
+                return os.path.join(video_dir, file)
+    return None
+
+
+def build_biliup_command(biliup_exe, item):
+    """
+    根据上传队列中的一项构造 biliup 命令
+    :param item: UploadQueue 中的条目（path/title/cover/tags/tid/copyright/source，可选 line/limit）
+    """
+    cmd = [
+        biliup_exe, "upload",
+        "--title", item["title"],
+        "--tag", item.get("tags") or BILI_DEFAULT_TAGS,
+        "--tid", str(item.get("tid") or BILI_DEFAULT_TID),
+        "--copyright", str(item.get("copyright") or BILI_DEFAULT_COPYRIGHT),
+        "--source", item.get("source") or BILI_DEFAULT_SOURCE,
+        "--hires", "1"
+    ]
+    if item.get("cover") and os.path.exists(item["cover"]):
+        cmd.extend(["--cover", item["cover"]])
+    if item.get("line"):
+        cmd.extend(["--line", item["line"]])
+    if item.get("limit"):
+        cmd.extend(["--limit", str(item["limit"])])
+    cmd.append(item["path"])
+    return cmd
+
+
+# 上传前转码方案：键 -> (显示名称, 文件名后缀, 编码参数)；视频流一律直接复制，只压缩 PCM 音轨
+UPLOAD_PROFILES = {
+    "flac": ("FLAC 无损", "_upload.mkv",
+             ["-c:v", "copy", "-c:a", "flac", "-compression_level", "5", "-ar", "48000", "-ac", "2", "-sample_fmt", "s32"]),
+    "aac": ("AAC 320k", "_upload.mp4",
+            ["-c:v", "copy", "-c:a", "aac", "-b:a", "320k", "-ar", "48000", "-ac", "2", "-movflags", "+faststart"]),
+    "raw": ("不转码（原文件）", None, None),
+}
+
+
+def format_size(num_bytes):
+    """把字节数格式化为便于阅读的文本"""
+    for unit, size in (("G", 1024 ** 3), ("M", 1024 ** 2), ("K", 1024)):
+        if num_bytes >= size:
+            return f"{num_bytes / size:.1f}{unit}B"
+    return f"{int(num_bytes)}B"
+
+
+def build_upload_command(src, profile):
+    """
+    构造上传前转码命令，输出放在源文件旁边，重复上传时直接复用
+    :param profile: UPLOAD_PROFILES 的键
+    :return: (ffmpeg 命令, 输出路径)；输出已存在且不旧于源文件时命令为 None；"raw" 方案返回 None。
+             命令先写到 命令[-1] 的临时文件，成功后再替换为输出路径，避免中断时留下半个文件被当作缓存
+    """
+    _, suffix, args = UPLOAD_PROFILES.get(profile, UPLOAD_PROFILES["raw"])
+    if suffix is None:
+        return None
+    out_path = os.path.splitext(src)[0] + suffix
+    try:
+        if os.path.getsize(out_path) > 0 and os.path.getmtime(out_path) >= os.path.getmtime(src):
+            return None, out_path
+    except OSError:
+        pass
+    base, ext = os.path.splitext(out_path)
+    cmd = ["ffmpeg", "-loglevel", "info", "-i", src, "-map", "0:v:0?", "-map", "0:a:0"] + args + ["-y", f"{base}.part{ext}"]
+    return cmd, out_path
+
+
+def parse_size(value, unit):
+    """把 "12.5" + "MiB" 这类数值和单位换算为字节数；KB/MB 按 1000 进位，KiB/MiB 按 1024 进位"""
+    units = {"B": 1, "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3, "TB": 1000 ** 4,
+             "KIB": 1024, "MIB": 1024 ** 2, "GIB": 1024 ** 3, "TIB": 1024 ** 4}
+    return float(value) * units.get(unit.upper(), 1)
+
+
+class UploadProgress:
+    """
+    解析 biliup 的输出，得到结构化的上传进度：已发送字节、速率、剩余时间、分片数和重试次数。
+    进度条行形如 "[00:01:02] [####>---] 120.50 MiB/1.20 GiB (3.20 MiB/s, 5m)"；
+    字节数长时间不增长视为停滞，便于对比不同上传线路、发现卡住的上传。
+    """
+
+    BYTES_PATTERN = re.compile(r"([\d.]+)\s*([KMGT]?i?B)\s*/\s*([\d.]+)\s*([KMGT]?i?B)(?!/s)")
+    RATE_PATTERN = re.compile(r"([\d.]+)\s*([KMGT]?i?B)/s")
+    ETA_PATTERN = re.compile(r"/s,\s*([\dhmsd ]+)\)")
+    CHUNK_PATTERN = re.compile(r"(?:chunk|分片|part)\D{0,12}?(\d+)\s*/\s*(\d+)", re.IGNORECASE)
+    RETRY_PATTERN = re.compile(r"retry|retrying|重试", re.IGNORECASE)
+    STALL_SECONDS = 30
+
+    def __init__(self):
+        self.started = time.time()
+        self.sent = 0.0
+        self.total = 0.0
+        self.rate = 0.0
+        self.peak_rate = 0.0
+        self.eta = ""
+        self.chunks_done = 0
+        self.chunks_total = 0
+        self.retries = 0
+        self.stalls = 0
+        self.last_advance = self.started
+        self.stall_reported = False
+
+    def feed(self, line):
+        """
+        解析一行输出
+        :return: 是进度条行时返回 True（调用方不必写入日志），否则返回 False
+        """
+        chunk = self.CHUNK_PATTERN.search(line)
+        if chunk:
+            self.chunks_done = max(self.chunks_done, int(chunk.group(1)))
+            self.chunks_total = int(chunk.group(2))
+        if self.RETRY_PATTERN.search(line):
+            self.retries += 1
+        rate = self.RATE_PATTERN.search(line)
+        if not rate:
+            return False
+        self.rate = parse_size(*rate.groups())
+        self.peak_rate = max(self.peak_rate, self.rate)
+        sizes = self.BYTES_PATTERN.search(line)
+        if sizes:
+            sent = parse_size(sizes.group(1), sizes.group(2))
+            self.total = parse_size(sizes.group(3), sizes.group(4))
+            if sent > self.sent:
+                self.sent = sent
+                self.last_advance = time.time()
+                self.stall_reported = False
+        eta = self.ETA_PATTERN.search(line)
+        self.eta = eta.group(1).strip() if eta else ""
+        return True
+
+    def idle_seconds(self, now=None):
+        """字节数超过 STALL_SECONDS 秒没有增长时返回停滞秒数，否则返回 0"""
+        idle = (now or time.time()) - self.last_advance
+        return int(idle) if idle >= self.STALL_SECONDS else 0
+
+    def check_stall(self, now=None):
+        """检测到新的停滞时计数并返回 True（同一次停滞只返回一次）"""
+        if self.stall_reported or not self.idle_seconds(now):
+            return False
+        self.stall_reported = True
+        self.stalls += 1
+        return True
+
+    def describe(self, now=None):
+        """队列列表中显示的一行进度"""
+        parts = []
+        if self.total:
+            parts.append(f"{self.sent / self.total * 100:.0f}% {format_size(self.sent)}/{format_size(self.total)}")
+        if self.rate:
+            parts.append(f"{format_size(self.rate)}/s")
+        if self.eta:
+            parts.append(f"剩余 {self.eta}")
+        if self.chunks_total:
+            parts.append(f"分片 {self.chunks_done}/{self.chunks_total}")
+        if self.retries:
+            parts.append(f"重试 {self.retries}")
+        idle = self.idle_seconds(now)
+        if idle:
+            parts.append(f"⚠️ 停滞 {idle}s")
+        return " ".join(parts) or "连接中..."
+
+    def summary(self):
+        """上传结束后记录的统计信息"""
+        elapsed = max(time.time() - self.started, 0.001)
+        return {
+            "bytes": int(self.sent),
+            "total": int(self.total),
+            "seconds": round(elapsed, 1),
+            "avg_rate": int(self.sent / elapsed),
+            "peak_rate": int(self.peak_rate),
+            "chunks": self.chunks_done,
+            "retries": self.retries,
+            "stalls": self.stalls,
+        }
+
+
+class UploadHistory:
+    """每次上传的统计记录（线路、速率、重试、停滞等），保存为 JSON，最多保留 limit 条"""
+
+    def __init__(self, state_path, limit=200):
+        self.state_path = state_path
+        self.limit = limit
+        self.lock = threading.Lock()
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.records = json.load(f)
+        except (OSError, ValueError):
+            self.records = []
+
+    def append(self, record):
+        with self.lock:
+            self.records = (self.records + [record])[-self.limit:]
+            # 先写临时文件再替换，避免写到一半退出导致文件损坏
+            tmp_path = self.state_path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.records, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.state_path)
+            except OSError:
+                pass
+
+    def snapshot(self):
+        with self.lock:
+            return [dict(r) for r in self.records]
+
+
+# biliup 支持的上传线路（--line）及其 upos 上传节点
+BILI_UPLOAD_LINES = {
+    "bda2": "https://upos-cs-upcdnbda2.bilivideo.com",
+    "bda": "https://upos-cs-upcdnbda.bilivideo.com",
+    "bldsa": "https://upos-cs-upcdnbldsa.bilivideo.com",
+    "qn": "https://upos-cs-upcdnqn.bilivideo.com",
+    "ws": "https://upos-cs-upcdnws.bilivideo.com",
+    "tx": "https://upos-cs-upcdntx.bilivideo.com",
+    "txa": "https://upos-cs-upcdntxa.bilivideo.com",
+}
+
+
+class UploadLineTuner:
+    """
+    上传线路测速：按 upos 分片上传的方式向各线路节点 PUT 一小段探测数据，
+    先在默认并发下比较各线路，再在最快线路上比较不同分片并发数（biliup 的 --limit），
+    结果带有效期缓存，过期前的上传直接复用；测速失败也会短暂缓存，避免每个上传任务都重新测一遍。
+    """
+
+    LIMIT_CANDIDATES = (1, 3, 6)
+    DEFAULT_LIMIT = 3
+    FAILURE_TTL = 600  # 测速失败后这段时间内不再自动重测（秒）
+
+    def __init__(self, state_path, ttl=6 * 3600, endpoints=None, probe_bytes=4 * 1024 * 1024, chunk_bytes=1024 * 1024):
+        """
+        :param state_path: 测速结果缓存文件
+        :param ttl: 缓存有效期（秒）
+        :param endpoints: {线路: 上传节点地址}，默认为 BILI_UPLOAD_LINES；可指向本地模拟节点做测试
+        :param probe_bytes: 每次探测上传的总字节数
+        :param chunk_bytes: 每个分片的大小
+        """
+        self.state_path = state_path
+        self.ttl = ttl
+        self.endpoints = endpoints or BILI_UPLOAD_LINES
+        self.probe_bytes = probe_bytes
+        self.chunk_bytes = chunk_bytes
+        self.lock = threading.Lock()  # 同一时间只跑一次测速
+        self.failed_at = 0.0  # 最近一次测速全部失败的时间
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.result = json.load(f)
+        except (OSError, ValueError):
+            self.result = None
+
+    def cached(self):
+        """返回未过期的测速结果 {"line", "limit", "rates", "time"}，没有则返回 None"""
+        result = self.result
+        if result and result.get("line") in self.endpoints and time.time() - result.get("time", 0) < self.ttl:
+            return result
+        return None
+
+    def recently_failed(self):
+        """最近一次测速是否全部失败且仍在失败缓存期内"""
+        return time.time() - self.failed_at < self.FAILURE_TTL
+
+    def probe(self, endpoint, limit, timeout=20):
+        """
+        以 limit 个并发分片向 endpoint 上传探测数据。
+        未授权的探测请求会被节点以 4xx 拒绝，但节点读完整个分片后才回应，耗时同样反映线路的上行速度，
+        因此分片完整发出后的 4xx 计为有效样本；数据没发完就返回的拒绝和 5xx 不代表上行速度，整次探测作废。
+        分片较小时会整块进入套接字缓冲区，"发完"不代表节点读完；没读请求体就回应的节点必须关闭连接（RFC 9112），
+        因此带 Connection: close 的 4xx 同样视为提前拒绝
+        :return: 吞吐量（字节/秒）；连接失败或样本无效时返回 0
+        """
+        chunks = max(1, self.probe_bytes // self.chunk_bytes)
+        payload = os.urandom(self.chunk_bytes)
+        total = chunks * self.chunk_bytes
+        upload_id = f"ytb-probe-{random.randint(0, 999999):06d}"
+
+        class ChunkBody:
+            """按块交给连接的分片数据，记录实际发出的字节数"""
+
+            def __init__(self):
+                self.sent = 0
+
+            def __len__(self):
+                return len(payload)
+
+            def read(self, size=-1):
+                end = len(payload) if size is None or size < 0 else min(len(payload), self.sent + size)
+                data = payload[self.sent:end]
+                self.sent = end
+                return data
+
+        def put_chunk(index):
+            start = index * self.chunk_bytes
+            params = {"partNumber": index + 1, "uploadId": upload_id, "chunk": index, "chunks": chunks,
+                      "size": self.chunk_bytes, "start": start, "end": start + self.chunk_bytes, "total": total}
+            body = ChunkBody()
+            response = requests.put(f"{endpoint}/ytb-probe", params=params, data=body, timeout=timeout)
+            early = body.sent < len(payload) or "close" in response.headers.get("Connection", "").lower()
+            if response.status_code >= 500 or (response.status_code >= 400 and early):
+                raise RuntimeError(f"探测分片无效：HTTP {response.status_code}，已发送 {body.sent}/{len(payload)} 字节")
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=limit) as pool:
+                list(pool.map(put_chunk, range(chunks)))
+        except Exception:
+            return 0.0
+        return total / max(time.perf_counter() - started, 1e-6)
+
+    def benchmark(self, progress=None, force=False):
+        """
+        测速并保存结果
+        :param progress: 可选回调，每完成一次探测调用 progress(说明文本)
+        :param force: 为 False 时，若等锁期间其它线程已测出结果或最近刚失败过，直接返回缓存而不重测
+        :return: 测速结果；所有线路都不可用时返回 None
+        """
+        with self.lock:
+            if not force:
+                result = self.cached()
+                if result or self.recently_failed():
+                    return result
+            rates = {}
+            for line, endpoint in self.endpoints.items():
+                rates[line] = self.probe(endpoint, self.DEFAULT_LIMIT)
+                if progress:
+                    progress(f"线路 {line}: {format_size(rates[line])}/s" if rates[line] else f"线路 {line}: 不可用")
+            best_line = max(rates, key=rates.get) if rates else None
+            if not best_line or not rates[best_line]:
+                self.failed_at = time.time()
+                return None
+            self.failed_at = 0.0
+            limits = {self.DEFAULT_LIMIT: rates[best_line]}
+            for limit in self.LIMIT_CANDIDATES:
+                if limit not in limits:
+                    limits[limit] = self.probe(self.endpoints[best_line], limit)
+                    if progress:
+                        progress(f"线路 {best_line} 并发 {limit}: {format_size(limits[limit])}/s")
+            best_limit = max(limits, key=limits.get)
+            self.result = {"line": best_line, "limit": best_limit, "rates": rates, "time": time.time()}
+            tmp_path = self.state_path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.result, f, indent=2)
+                os.replace(tmp_path, self.state_path)
+            except OSError:
+                pass
+            return self.result
+
+    def best(self, progress=None):
+        """返回缓存的测速结果，过期或没有时重新测速"""
+        return self.cached() or self.benchmark(progress)
+
+
+class BiliAccountCache:
+    """
+    B站账号信息（用户名、UID、空间地址）缓存：按 cookies.json 内容的指纹保存，
+    指纹不变且未过期时直接返回，不访问网络；过期时先返回旧值再在后台刷新；
+    cookies 变化时立即返回可从 cookies 本地推出的信息，昵称由后台调用 nav 接口补全。
+    nav 请求使用同一个 requests.Session，复用连接。
+    """
+
+    NAV_URL = "https://api.bilibili.com/x/web-interface/nav"
+
+    def __init__(self, state_path, ttl=24 * 3600):
+        self.state_path = state_path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.refreshing = set()  # 正在后台刷新的指纹
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+            "Referer": "https://www.bilibili.com/",
+        })
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.entry = json.load(f)
+        except (OSError, ValueError):
+            self.entry = None
+
+    @staticmethod
+    def parse_cookies(data):
+        """
+        从 biliup 的 cookies.json 还原 cookies 字典，兼容列表、cookie_info、{"cookies": [...]} 和顶层键值对几种格式
+        :return: (cookies 字典, token_info 中的 mid 或 None)
+        """
+        def collect(items):
+            return {c["name"]: c["value"] for c in items if isinstance(c, dict) and c.get("name") and c.get("value")}
+
+        cookies = {}
+        mid = None
+        if isinstance(data, list):
+            cookies = collect(data)
+        elif isinstance(data, dict):
+            cookie_info = data.get("cookie_info")
+            if isinstance(cookie_info, dict) and isinstance(cookie_info.get("cookies"), list):
+                cookies = collect(cookie_info["cookies"])
+            if not cookies and isinstance(data.get("cookies"), list):
+                cookies = collect(data["cookies"])
+            if not cookies:
+                cookies = {k: v for k, v in data.items() if isinstance(v, str)}
+            if isinstance(data.get("token_info"), dict):
+                mid = data["token_info"].get("mid")
+        return cookies, mid
+
+    def lookup(self, cookies_path, on_update=None):
+        """
+        返回 (用户名, 空间URL)，不会阻塞在网络请求上；拿不到的部分为“未知”
+        :param on_update: 后台刷新得到新信息时调用 on_update(用户名, 空间URL)（在后台线程中）
+        """
+        try:
+            with open(cookies_path, "rb") as f:
+                raw = f.read()
+        except (OSError, TypeError):
+            return "未知", "未知"
+        fingerprint = hashlib.sha1(raw).hexdigest()
+        with self.lock:
+            entry = self.entry if self.entry and self.entry.get("fingerprint") == fingerprint else None
+        if entry is None:
+            try:
+                cookies, mid = self.parse_cookies(json.loads(raw.decode("utf-8")))
+            except ValueError:
+                return "未知", "未知"
+            if not cookies:
+                return "未知", "未知"
+            # 本地能推出的 UID：token_info.mid，其次 cookies 中的 DedeUserID
+            uid = mid or next((v for k, v in cookies.items() if k.lower() == "dedeuserid" and v), None)
+            entry = {"fingerprint": fingerprint, "username": "未知", "uid": uid, "time": 0}
+            with self.lock:
+                self.entry = entry
+        if time.time() - entry["time"] >= self.ttl:
+            self._refresh_in_background(fingerprint, raw, on_update)
+        return entry["username"], self.space_url(entry["uid"])
+
+    @staticmethod
+    def space_url(uid):
+        return f"https://space.bilibili.com/{uid}" if uid else "未知"
+
+    def _refresh_in_background(self, fingerprint, raw, on_update):
+        with self.lock:
+            if fingerprint in self.refreshing:
+                return
+            self.refreshing.add(fingerprint)
+
+        def run():
+            try:
+                cookies, _ = self.parse_cookies(json.loads(raw.decode("utf-8")))
+                resp = self.session.get(self.NAV_URL, cookies=cookies, timeout=5)
+                data = resp.json().get("data") if resp.status_code == 200 else None
+                if resp.status_code != 200 or resp.json().get("code") != 0 or not data:
+                    return
+                with self.lock:
+                    if not self.entry or self.entry["fingerprint"] != fingerprint:
+                        return  # 刷新期间 cookies 已经变化
+                    # data.uname 是当前登录账号昵称
+                    self.entry = dict(self.entry, username=data.get("uname") or data.get("username") or self.entry["username"],
+                                      uid=data.get("mid") or data.get("uid") or self.entry["uid"], time=time.time())
+                    entry = dict(self.entry)
+                    self._save()
+                if on_update:
+                    on_update(entry["username"], self.space_url(entry["uid"]))
+            except Exception:
+                # 网络请求失败则保留已有信息，下次查询时再试
+                pass
+            finally:
+                with self.lock:
+                    self.refreshing.discard(fingerprint)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _save(self):
+        # 调用方持有锁；先写临时文件再替换
+        tmp_path = self.state_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entry, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.state_path)
+        except OSError:
+            pass
+
+
+class UploadQueue:
+    """
+    持久化的B站上传队列：每个视频带有自己的标题、封面、标签等投稿信息，
+    每次变更都写回 JSON 文件，程序重启后未完成的任务会重新排队。
+    状态：pending（排队）/ uploading（上传中）/ done（成功）/ failed（失败）/ cancelled（已取消）
+    """
+
+    def __init__(self, state_path):
+        self.state_path = state_path
+        self.lock = threading.Lock()
+        self.items = []
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.items = json.load(f)
+        except (OSError, ValueError):
+            pass
+        # 上次退出时仍在上传的任务没有完成，重新排队
+        for item in self.items:
+            if item.get("status") == "uploading":
+                item["status"] = "pending"
+        self._save()
+
+    def _save(self):
+        # 先写临时文件再替换，避免写到一半退出导致队列文件损坏
+        tmp_path = self.state_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.items, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.state_path)
+        except OSError:
+            pass
+
+    def add(self, path, title=None, cover=None, tags=None, tid=None, copyright=None, source=None):
+        """加入一个待上传视频，返回条目 id"""
+        item = {
+            "id": f"{int(time.time() * 1000)}-{random.randint(0, 9999):04d}",
+            "path": path,
+            "title": title or os.path.splitext(os.path.basename(path))[0],
+            "cover": cover or "",
+            "tags": tags or BILI_DEFAULT_TAGS,
+            "tid": tid or BILI_DEFAULT_TID,
+            "copyright": copyright or BILI_DEFAULT_COPYRIGHT,
+            "source": source or BILI_DEFAULT_SOURCE,
+            "status": "pending",
+            "error": "",
+        }
+        with self.lock:
+            self.items.append(item)
+            self._save()
+        return item["id"]
+
+    def get(self, item_id):
+        with self.lock:
+            item = next((i for i in self.items if i["id"] == item_id), None)
+            return dict(item) if item else None
+
+    def update(self, item_id, **fields):
+        with self.lock:
+            for item in self.items:
+                if item["id"] == item_id:
+                    item.update(fields)
+                    self._save()
+                    return True
+        return False
+
+    def remove(self, item_id):
+        with self.lock:
+            self.items = [i for i in self.items if i["id"] != item_id]
+            self._save()
+
+    def clear_finished(self):
+        """移除已成功/已取消的条目"""
+        with self.lock:
+            self.items = [i for i in self.items if i["status"] not in ("done", "cancelled")]
+            self._save()
+
+    def claim_next(self):
+        """取出最早的排队条目并标记为上传中，没有则返回 None"""
+        with self.lock:
+            for item in self.items:
+                if item["status"] == "pending":
+                    item["status"] = "uploading"
+                    item["error"] = ""
+                    self._save()
+                    return dict(item)
+        return None
+
+    def snapshot(self):
+        with self.lock:
+            return [dict(i) for i in self.items]
+
+    def counts(self, ids=None):
+        """按状态统计条目数；给出 ids 时只统计这些条目"""
+        with self.lock:
+            result = {}
+            for item in self.items:
+                if ids is None or item["id"] in ids:
+                    result[item["status"]] = result.get(item["status"], 0) + 1
+            return result
+
+# ==================== B站上传队列模块结束 ====================
+
+# ==================== 多输出转码模块 ====================
+
+# 下载后可生成的交付文件：键 -> (显示名称, 文件名后缀, 是否包含视频, 该输出的编码参数)
+DELIVERABLES = {
+    "pcm_mkv": ("PCM MKV", ".mkv", True,
+                ["-c:v", "copy", "-c:a", "pcm_s32le", "-ar", "48000", "-ac", "2", "-fflags", "+genpts"]),
+    "mp3": ("MP3", ".mp3", False,
+            ["-c:a", "libmp3lame", "-b:a", "320k", "-ar", "48000", "-ac", "2"]),
+    "aac": ("AAC(M4A)", ".m4a", False,
+            ["-c:a", "aac", "-b:a", "256k", "-ar", "48000", "-ac", "2", "-movflags", "+faststart"]),
+    "upload_mp4": ("上传用MP4", "_upload.mp4", True,
+                   ["-c:v", "libx264", "-preset", "medium", "-crf", "20", "-pix_fmt", "yuv420p",
+                    "-c:a", "aac", "-b:a", "320k", "-ar", "48000", "-ac", "2", "-movflags", "+faststart"]),
+}
+
+
+def build_transcode_command(src, base_path, outputs, eq_filter=None, has_audio=True):
+    """
+    构造一次性生成多个交付文件的 ffmpeg 命令：源文件只解复用、解码一次，
+    音频经（可选的）EQ 后用 asplit 分给每个输出，视频按输出各自复制或编码。
+    :param src: 下载得到的源文件
+    :param base_path: 输出路径前缀（不含扩展名），各输出在其后追加 DELIVERABLES 中的后缀
+    :param outputs: DELIVERABLES 的键列表
+    :param eq_filter: 可选的音频滤镜链
+    :param has_audio: 源文件是否带音轨；为 False 时（如 137 这类纯视频格式）只转封装视频，跳过纯音频输出
+    :return: (命令列表, {键: 输出路径})
+    """
+    outputs = [key for key in DELIVERABLES if key in outputs]
+    cmd = ["ffmpeg", "-loglevel", "info", "-i", src]
+    if not has_audio:
+        paths = {}
+        for key in outputs:
+            _, suffix, with_video, args = DELIVERABLES[key]
+            if with_video:
+                paths[key] = f"{base_path}{suffix}"
+                cmd += ["-map", "0:v:0"] + args + ["-y", paths[key]]
+        return cmd, paths
+    if len(outputs) > 1 or eq_filter:
+        chain = f"{eq_filter}," if eq_filter else ""
+        labels = "".join(f"[a{i}]" for i in range(len(outputs)))
+        cmd += ["-filter_complex", f"[0:a:0]{chain}asplit={len(outputs)}{labels}"]
+        audio_maps = [f"[a{i}]" for i in range(len(outputs))]
+    else:
+        audio_maps = ["0:a:0?"]
+    paths = {}
+    for key, audio in zip(outputs, audio_maps):
+        _, suffix, with_video, args = DELIVERABLES[key]
+        paths[key] = f"{base_path}{suffix}"
+        cmd += (["-map", "0:v:0?"] if with_video else []) + ["-map", audio] + args + ["-y", paths[key]]
+    return cmd, paths
+
+# ==================== 多输出转码模块结束 ====================
+
+# ==================== 均衡器 DSP 模块 ====================
+
+def build_eq_filter(bands, volume_db):
+    """
+    根据各频段增益构造 ffmpeg equalizer 滤镜链（仅包含非 0dB 的频段）
+    :param bands: [(中心频率Hz, 增益dB), ...]
+    :param volume_db: 总音量调节（dB）
+    :return: 滤镜字符串；所有增益均为 0 时返回 None
+    """
+    filters = [f"equalizer=f={float(f)}:t=o:w=1:g={g}" for f, g in bands if g != 0.0]
+    if volume_db != 0.0:
+        filters.append(f"volume={volume_db}dB")
+    if not filters:
+        return None
+    return ",".join(filters)
+
+
+def build_eq_command(path, eq_filter):
+    """
+    构造单个文件的 EQ 处理命令。输出名保留源扩展名（a.mp3 -> a_mp3_EQ.wav），
+    同名不同格式的源文件不会写到同一个输出；命令先写到 eq_part_path(输出路径)，
+    成功后由 finish_eq_output 替换为正式输出，避免中断时留下半个文件被当作已完成
+    :return: (ffmpeg 命令, 输出路径, "音频"/"视频")；不支持的文件类型返回 None
+    """
+    base, ext = os.path.splitext(path)
+    ext_lower = ext.lower()
+    if ext_lower in EQ_AUDIO_EXTS:
+        out_path = f"{base}_{ext_lower[1:]}_EQ.wav"
+        cmd = [
+            "ffmpeg", "-loglevel", "info",
+            "-i", path,
+            "-af", eq_filter,
+            "-ar", "48000", "-ac", "2",
+            "-c:a", "pcm_s32le",
+            "-y", eq_part_path(out_path)
+        ]
+        return cmd, out_path, "音频"
+    if ext_lower in EQ_VIDEO_EXTS:
+        out_path = f"{base}_{ext_lower[1:]}_EQ.mkv"
+        cmd = [
+            "ffmpeg", "-loglevel", "info",
+            "-i", path,
+            "-c:v", "copy",
+            "-af", eq_filter,
+            "-ar", "48000", "-ac", "2",
+            "-c:a", "pcm_s32le",
+            "-y", eq_part_path(out_path)
+        ]
+        return cmd, out_path, "视频"
+    return None
+
+
+def eq_part_path(out_path):
+    """EQ 输出的临时文件路径（保留扩展名，ffmpeg 据此选择封装格式）"""
+    base, ext = os.path.splitext(out_path)
+    return f"{base}.part{ext}"
+
+
+def eq_settings_stamp(eq_filter, loudnorm=None):
+    """EQ 设置的指纹，记录在输出旁的 .eq 文件中；设置改变后旧输出不再视为最新"""
+    return hashlib.sha1(json.dumps([eq_filter, loudnorm]).encode("utf-8")).hexdigest()
+
+
+def eq_output_fresh(path, out_path, stamp):
+    """输出已存在、不旧于源文件且由相同的 EQ 设置生成时返回 True"""
+    try:
+        if os.path.getmtime(out_path) < os.path.getmtime(path):
+            return False
+        with open(f"{out_path}.eq", "r", encoding="utf-8") as f:
+            return f.read().strip() == stamp
+    except OSError:
+        return False
+
+
+def finish_eq_output(out_path, ok, stamp=None):
+    """
+    结束一次 EQ 处理：成功时把临时文件替换为正式输出并记录设置指纹，失败或取消时删除临时文件
+    """
+    part_path = eq_part_path(out_path)
+    if not ok:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        return
+    os.replace(part_path, out_path)
+    if stamp:
+        with open(f"{out_path}.eq", "w", encoding="utf-8") as f:
+            f.write(stamp)
+
+
+def wav_memmap(path):
+    """
+    把 PCM/浮点 WAV 的数据块映射为 (帧数, 声道数) 的只读数组，不把整个文件读入内存
+    :return: (数组, 采样率, 归一化系数)；不是可直接映射的 WAV（如 24bit、压缩格式）时返回 None
+    """
+    if np is None:
+        return None
+    dtypes = {(1, 16): ("<i2", 1 / 32768), (1, 32): ("<i4", 1 / 2147483648),
+              (3, 32): ("<f4", 1.0), (3, 64): ("<f8", 1.0)}
+    try:
+        with open(path, "rb") as f:
+            header = f.read(12)
+            if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+                return None
+            fmt = None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+                if chunk_id == b"fmt ":
+                    data = f.read(size + (size & 1))
+                    tag, channels, sample_rate = struct.unpack("<HHI", data[:8])
+                    bits = struct.unpack("<H", data[14:16])[0]
+                    if tag == 0xFFFE and size >= 26:  # WAVE_FORMAT_EXTENSIBLE，真实格式在子格式 GUID 的前两个字节
+                        tag = struct.unpack("<H", data[24:26])[0]
+                    fmt = (tag, channels, sample_rate, bits)
+                elif chunk_id == b"data":
+                    if fmt is None or (fmt[0], fmt[3]) not in dtypes:
+                        return None
+                    offset = f.tell()
+                    break
+                else:
+                    f.seek(size + (size & 1), 1)
+        tag, channels, sample_rate, bits = fmt
+        dtype, scale = dtypes[(tag, bits)]
+        # 流式写出的 WAV 可能把 data 大小写成 0xFFFFFFFF，以实际文件大小为准
+        frame_bytes = channels * bits // 8
+        frames = (min(size, os.path.getsize(path) - offset)) // frame_bytes
+        data = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(frames, channels))
+        return data, sample_rate, scale
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+class NumpyEQEngine:
+    """
+    进程内均衡器：用 NumPy/SciPy 的级联二阶节（SOS）实现与 ffmpeg equalizer（t=o:w=1）相同的峰值滤波器，
+    按块流式处理 PCM（WAV 直接内存映射，其它格式由 ffmpeg 解码成 f64le 管道输入），处理后交给 ffmpeg
+    重采样为 48kHz/2ch 的 pcm_s32le，与 ffmpeg 滤镜链的处理顺序（先滤波、后重采样）一致。
+    """
+
+    BLOCK_FRAMES = 1 << 16  # 每块帧数，内存占用与文件长度无关
+
+    def __init__(self, bands, volume_db=0.0, width=1.0):
+        """
+        :param bands: [(中心频率Hz, 增益dB), ...]，0dB 的频段会被跳过
+        :param volume_db: 总音量调节（dB）
+        :param width: 带宽（倍频程），与 ffmpeg 的 t=o:w=1 对应
+        """
+        self.bands = [(float(f), float(g)) for f, g in bands if g != 0.0]
+        self.volume_db = float(volume_db)
+        self.width = float(width)
+
+    @staticmethod
+    def available():
+        """NumPy 和 SciPy 均已安装时可用"""
+        return np is not None and scipy_signal is not None
+
+    def design(self, sample_rate):
+        """按 ffmpeg af_biquads 的 peaking 公式计算各频段系数，返回 (频段数, 6) 的 SOS 矩阵"""
+        rows = []
+        for freq, gain in self.bands:
+            w0 = 2 * math.pi * freq / sample_rate
+            if w0 >= math.pi:
+                # ffmpeg 同样会拒绝高于奈奎斯特频率的中心频率
+                raise ValueError(f"频率 {freq:g}Hz 超过采样率 {sample_rate}Hz 的一半")
+            a = 10 ** (gain / 40)
+            alpha = math.sin(w0) * math.sinh(math.log(2) / 2 * self.width * w0 / math.sin(w0))
+            cos_w0 = math.cos(w0)
+            a0 = 1 + alpha / a
+            rows.append([(1 + alpha * a) / a0, -2 * cos_w0 / a0, (1 - alpha * a) / a0,
+                         1.0, -2 * cos_w0 / a0, (1 - alpha / a) / a0])
+        return np.array(rows, dtype=np.float64).reshape(-1, 6)
+
+    def process_blocks(self, blocks, sample_rate, channels):
+        """对 (帧数, 声道数) 的 float64 块序列逐块滤波，块之间保留滤波器状态，结果与整段处理一致"""
+        sos = self.design(sample_rate)
+        gain = 10 ** (self.volume_db / 20)
+        zi = np.zeros((len(sos), 2, channels))
+        for block in blocks:
+            if len(sos):
+                block, zi = scipy_signal.sosfilt(sos, block, axis=0, zi=zi)
+            if gain != 1.0:
+                block = block * gain
+            yield block
+
+    @staticmethod
+    def probe_audio(path):
+        """用 ffprobe 读取首个音频流的采样率和声道数"""
+        cmd = [TOOLS.path("ffprobe"), "-v", "error", "-select_streams", "a:0",
+               "-show_entries", "stream=sample_rate,channels", "-of", "json", path]
+        creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', creationflags=creationflags)
+        stream = json.loads(result.stdout or "{}").get("streams", [{}])[0]
+        if not stream.get("sample_rate"):
+            raise RuntimeError(f"无法读取音频流信息: {result.stderr.strip()}")
+        return int(stream["sample_rate"]), int(stream["channels"])
+
+    def _source_blocks(self, path):
+        """
+        按块读取源文件 PCM：可映射的 WAV 直接切片，其它格式经 ffmpeg 解码为 f64le 管道
+        :return: (块迭代器, 采样率, 声道数, 解码进程或 None)；解码进程的 stderr 写入临时文件 decoder.error_log
+        """
+        mapped = wav_memmap(path)
+        if mapped is not None:
+            data, sample_rate, scale = mapped
+
+            def mapped_blocks():
+                for start in range(0, len(data), self.BLOCK_FRAMES):
+                    yield data[start:start + self.BLOCK_FRAMES].astype(np.float64) * scale
+            return mapped_blocks(), sample_rate, data.shape[1], None
+
+        sample_rate, channels = self.probe_audio(path)
+        # stderr 写临时文件而不是管道：读取 stdout 期间不会因 stderr 写满而互相阻塞
+        error_log = tempfile.TemporaryFile()
+        decoder = PROCESSES.popen(
+            ["ffmpeg", "-loglevel", "error", "-i", path, "-vn", "-map", "0:a:0", "-f", "f64le", "-acodec", "pcm_f64le", "-"],
+            stdout=subprocess.PIPE, stderr=error_log
+        )
+        decoder.error_log = error_log
+        block_bytes = self.BLOCK_FRAMES * channels * 8
+
+        def decoded_blocks():
+            pending = b""
+            while True:
+                chunk = decoder.stdout.read(block_bytes - len(pending))
+                if not chunk:
+                    break
+                pending += chunk
+                if len(pending) == block_bytes:
+                    yield np.frombuffer(pending, dtype="<f8").reshape(-1, channels)
+                    pending = b""
+            usable = len(pending) - len(pending) % (channels * 8)
+            if usable:
+                yield np.frombuffer(pending[:usable], dtype="<f8").reshape(-1, channels)
+        return decoded_blocks(), sample_rate, channels, decoder
+
+    def process_file(self, path, out_path, stop=None):
+        """
+        处理单个音频文件并输出 48kHz/2ch pcm_s32le WAV（与 ffmpeg 路径的输出格式相同）
+        :param stop: 可选 threading.Event，被设置时在下一块之前中止并删除输出，抛出 RuntimeError
+        :return: 处理的帧数
+        """
+        blocks, sample_rate, channels, decoder = self._source_blocks(path)
+        encoder = PROCESSES.popen(
+            ["ffmpeg", "-loglevel", "error", "-f", "f64le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "-",
+             "-ar", "48000", "-ac", "2", "-c:a", "pcm_s32le", "-y", out_path],
+            stdin=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        frames = 0
+        decoder_error = None
+        try:
+            try:
+                for block in self.process_blocks(blocks, sample_rate, channels):
+                    if stop is not None and stop.is_set():
+                        raise RuntimeError("已取消")
+                    encoder.stdin.write(np.ascontiguousarray(block, dtype="<f8").tobytes())
+                    frames += len(block)
+            finally:
+                encoder.stdin.close()
+                if decoder is not None:
+                    decoder.stdout.close()
+                    if decoder.wait() != 0:
+                        decoder.error_log.seek(0)
+                        decoder_error = decoder.error_log.read().decode("utf-8", errors="replace").strip()
+                    decoder.error_log.close()
+            stderr = encoder.stderr.read().decode("utf-8", errors="replace")
+            if encoder.wait() != 0:
+                raise RuntimeError(f"ffmpeg 编码失败: {stderr.strip()}")
+            # 解码中途出错时管道提前结束，编码器照常收尾，输出只是被截断的一部分
+            if decoder_error is not None:
+                raise RuntimeError(f"ffmpeg 解码失败: {decoder_error or f'退出码 {decoder.returncode}'}")
+        except BaseException:
+            encoder.wait()
+            try:
+                os.remove(out_path)
+            except OSError:
+                pass
+            raise
+        return frames
+
+# ==================== 均衡器 DSP 模块结束 ====================
+
+# ==================== EQ 试听模块 ====================
+
+class EQPreview:
+    """
+    EQ 试听：把选定时间窗解码一次并以 PCM 缓存在内存中，之后每次调整增益只需把这段缓存
+    通过管道交给 ffmpeg 重新套用滤镜（几十秒的片段通常在 1 秒内完成）；
+    原声与各滤镜结果都会写成 WAV 缓存，A/B 切换只是换一个文件播放。
+    """
+
+    SAMPLE_RATE = 48000
+    CHANNELS = 2
+    MAX_SEGMENTS = 4  # 内存中保留的解码片段数
+    MAX_RENDERS = 16  # 每个片段保留的滤镜结果数
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.folder = tempfile.mkdtemp(prefix="eq_preview_")
+        self.segments = {}  # (路径, 修改时间, 起点, 时长) -> {"pcm": bytes, "dry": wav路径, "renders": {滤镜: wav路径}}
+        self.current = None
+        self.player = None  # 非 Windows 平台下的 ffplay 进程
+        self.counter = 0  # 缓存文件编号
+
+    def load(self, path, start, duration):
+        """
+        解码 [start, start+duration) 秒为 48kHz/2ch s16le PCM；同一文件同一时间窗只解码一次
+        :return: 原声 WAV 路径
+        """
+        key = (os.path.abspath(path), os.path.getmtime(path), float(start), float(duration))
+        with self.lock:
+            if key in self.segments:
+                self.segments[key] = self.segments.pop(key)  # 标记为最近使用
+                self.current = key
+                return self.segments[key]["dry"]
+        cmd = ["ffmpeg", "-loglevel", "error", "-ss", str(start), "-t", str(duration), "-i", path,
+               "-vn", "-f", "s16le", "-ar", str(self.SAMPLE_RATE), "-ac", str(self.CHANNELS), "-"]
+        result = PROCESSES.run(cmd, capture_output=True)
+        if result.returncode != 0 or not result.stdout:
+            raise RuntimeError(result.stderr.decode("utf-8", errors="replace").strip() or "所选时间窗没有音频")
+        with self.lock:
+            self.counter += 1
+            dry = os.path.join(self.folder, f"dry_{self.counter}.wav")
+            self._write_wav(dry, result.stdout)
+            self.segments[key] = {"pcm": result.stdout, "dry": dry, "renders": {}}
+            while len(self.segments) > self.MAX_SEGMENTS:
+                self._drop(self.segments.pop(next(iter(self.segments))))
+            self.current = key
+            return dry
+
+    def render(self, eq_filter):
+        """
+        对当前片段套用滤镜并返回结果 WAV 路径；相同滤镜直接返回缓存，未设置增益时返回原声
+        """
+        with self.lock:
+            segment = self.segments[self.current]
+            if not eq_filter:
+                return segment["dry"]
+            if eq_filter in segment["renders"]:
+                return segment["renders"][eq_filter]
+            pcm = segment["pcm"]
+        fmt = ["-f", "s16le", "-ar", str(self.SAMPLE_RATE), "-ac", str(self.CHANNELS)]
+        result = PROCESSES.run(["ffmpeg", "-loglevel", "error"] + fmt + ["-i", "-", "-af", eq_filter] + fmt + ["-"],
+                               input=pcm, capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode("utf-8", errors="replace").strip())
+        with self.lock:
+            self.counter += 1
+            wet = os.path.join(self.folder, f"wet_{self.counter}.wav")
+            self._write_wav(wet, result.stdout)
+            renders = segment["renders"]
+            renders[eq_filter] = wet
+            while len(renders) > self.MAX_RENDERS:
+                old = renders.pop(next(iter(renders)))
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass  # 可能仍在播放，留给 close() 清理
+            return wet
+
+    def play(self, wav_path):
+        """循环播放指定 WAV（会先停止正在播放的内容）"""
+        self.stop()
+        if winsound:
+            winsound.PlaySound(wav_path, winsound.SND_FILENAME | winsound.SND_ASYNC | winsound.SND_LOOP)
+        else:
+            self.player = PROCESSES.popen(["ffplay", "-nodisp", "-loglevel", "quiet", "-loop", "0", wav_path],
+                                         stdin=subprocess.DEVNULL)
+
+    def stop(self):
+        if winsound:
+            winsound.PlaySound(None, winsound.SND_PURGE)
+        elif self.player:
+            PROCESSES.terminate(self.player)
+        self.player = None
+
+    def close(self):
+        """停止播放并删除所有缓存文件"""
+        self.stop()
+        with self.lock:
+            self.segments.clear()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def _write_wav(self, path, pcm):
+        with wave.open(path, "wb") as w:
+            w.setnchannels(self.CHANNELS)
+            w.setsampwidth(2)
+            w.setframerate(self.SAMPLE_RATE)
+            w.writeframes(pcm)
+
+    @staticmethod
+    def _drop(segment):
+        for wav_path in [segment["dry"]] + list(segment["renders"].values()):
+            try:
+                os.remove(wav_path)
+            except OSError:
+                pass
+
+# ==================== EQ 试听模块结束 ====================
+
+# ==================== 音频分析模块 ====================
+
+def file_fingerprint(path, sample_bytes=1024 * 1024):
+    """
+    文件内容指纹：文件大小 + 开头/中间/结尾各 1MB 的 SHA-1。
+    对几十 GB 的演唱会录像也只读 3MB，足以区分不同文件；文件被重新编码或剪辑后指纹会变化。
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        for offset in sorted({0, max(size // 2 - sample_bytes // 2, 0), max(size - sample_bytes, 0)}):
+            f.seek(offset)
+            digest.update(f.read(sample_bytes))
+    return digest.hexdigest()
+
+
+def parse_ebur128_summary(text):
+    """
+    解析 ffmpeg ebur128 滤镜结束时输出的汇总
+    :return: {"integrated": LUFS, "lra": LU, "true_peak": dBTP}，缺失的项为 None
+    """
+    def last(pattern):
+        found = re.findall(pattern, text)
+        if not found:
+            return None
+        return float("-inf") if found[-1] == "-inf" else float(found[-1])
+    return {
+        "integrated": last(r"I:\s+(-?[\d.]+|-inf) LUFS"),
+        "lra": last(r"LRA:\s+(-?[\d.]+) LU\b"),
+        "true_peak": last(r"Peak:\s+(-?[\d.]+|-inf) dBFS"),
+    }
+
+
+class AudioAnalyzer:
+    """
+    音频分析：一次解码同时得到
+    - 各 EQ 频段的平均频谱能量（NumPy 分批加窗 FFT，长文件按间隔抽取数据块，FFT 总量有上限）
+    - 积分响度、响度范围（LRA）和真峰值（ffmpeg ebur128 滤镜）
+    结果按文件指纹缓存到磁盘，再次打开同一文件时直接读取。
+    """
+
+    SAMPLE_RATE = 48000
+    FFT_SIZE = 8192
+    BATCH = 64  # 每次向量化计算的帧数
+    MAX_FRAMES = 4096  # 每个文件最多分析的帧数，超过后按间隔抽取
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_path(self, fingerprint):
+        return os.path.join(self.cache_dir, f"{fingerprint}.json")
+
+    def cached(self, fingerprint, bands):
+        """返回已缓存的分析结果（频段须一致），没有则返回 None"""
+        try:
+            with open(self.cache_path(fingerprint), "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if result.get("bands") != [float(b) for b in bands] or (result.get("spectrum") is None and np is not None):
+            return None  # 频段变了，或上次因缺少 NumPy 没有计算频谱
+        return result
+
+    @staticmethod
+    def band_edges(bands):
+        """以相邻中心频率的几何平均作为频段分界，首尾各向外延伸半个倍频程"""
+        centers = [float(b) for b in bands]
+        edges = [centers[0] / math.sqrt(2)]
+        edges += [math.sqrt(a * b) for a, b in zip(centers, centers[1:])]
+        edges.append(centers[-1] * math.sqrt(2))
+        return edges
+
+    def analyze(self, path, bands, progress=None):
+        """
+        分析文件（优先使用缓存）
+        :param bands: EQ 频段中心频率列表
+        :param progress: 可选回调 progress(已处理秒数, 总秒数)
+        :return: {"bands", "spectrum": 各频段相对平均能量的 dB（无 NumPy 时为 None）,
+                  "integrated", "lra", "true_peak", "duration", "analyzed_frames"}
+        """
+        fingerprint = file_fingerprint(path)
+        result = self.cached(fingerprint, bands)
+        if result is not None:
+            result["from_cache"] = True
+            return result
+        duration = probe_duration(path)
+        total_frames = int(duration * self.SAMPLE_RATE) // self.FFT_SIZE if duration else 0
+        stride = max(1, -(-total_frames // self.MAX_FRAMES))  # 向上取整，保证分析帧数不超过上限
+
+        proc = PROCESSES.popen(
+            ["ffmpeg", "-nostats", "-i", path, "-vn", "-map", "0:a:0",
+             "-af", "ebur128=peak=true:framelog=quiet", "-ac", "1", "-ar", str(self.SAMPLE_RATE), "-f", "f32le", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        stderr_chunks = []
+        reader = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+        reader.start()
+
+        power, frames = self._accumulate_spectrum(proc.stdout, stride, total_frames, progress)
+        proc.wait()
+        reader.join()
+        stderr = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+        if proc.returncode != 0:
+            raise RuntimeError(stderr.strip().splitlines()[-1] if stderr.strip() else "ffmpeg 分析失败")
+
+        result = {"bands": [float(b) for b in bands], "spectrum": None, "duration": duration, "analyzed_frames": frames}
+        result.update(parse_ebur128_summary(stderr))
+        if power is not None and frames:
+            freqs = np.fft.rfftfreq(self.FFT_SIZE, 1 / self.SAMPLE_RATE)
+            edges = self.band_edges(bands)
+            band_power = [float(power[(freqs >= lo) & (freqs < hi)].mean()) for lo, hi in zip(edges, edges[1:])]
+            mean_power = sum(band_power) / len(band_power)
+            result["spectrum"] = [10 * math.log10(p / mean_power) if p > 0 and mean_power > 0 else None for p in band_power]
+        try:
+            with open(self.cache_path(fingerprint), "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+        except OSError:
+            pass
+        result["from_cache"] = False
+        return result
+
+    def _accumulate_spectrum(self, stream, stride, total_frames, progress):
+        """
+        从 f32le 管道按帧读取，每 stride 帧取 1 帧，凑满 BATCH 帧后一次性加窗 FFT 并累加功率谱。
+        没有 NumPy 时只把数据读完（响度由 ffmpeg 计算），返回 (None, 0)。
+        """
+        frame_bytes = self.FFT_SIZE * 4
+        if np is None:
+            while stream.read(frame_bytes * self.BATCH):
+                pass
+            return None, 0
+        window = np.hanning(self.FFT_SIZE).astype(np.float32)
+        power = np.zeros(self.FFT_SIZE // 2 + 1)
+        batch = []
+        analyzed = 0
+        index = 0
+        while True:
+            chunk = stream.read(frame_bytes)
+            if len(chunk) < frame_bytes:
+                break  # 末尾不足一帧的数据忽略
+            if index % stride == 0:
+                batch.append(chunk)
+            index += 1
+            if len(batch) == self.BATCH:
+                power += self._batch_power(batch, window)
+                analyzed += len(batch)
+                batch = []
+                if progress and total_frames:
+                    progress(index * self.FFT_SIZE / self.SAMPLE_RATE, total_frames * self.FFT_SIZE / self.SAMPLE_RATE)
+        if batch:
+            power += self._batch_power(batch, window)
+            analyzed += len(batch)
+        return (power / analyzed if analyzed else None), analyzed
+
+    def _batch_power(self, batch, window):
+        frames = np.frombuffer(b"".join(batch), dtype="<f4").reshape(len(batch), self.FFT_SIZE)
+        spectrum = np.fft.rfft(frames * window, axis=1)
+        return (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=0)
+
+class LoudnessNormalizer:
+    """
+    两遍响度标准化（ffmpeg loudnorm）：
+    第一遍测量经过 EQ 后的积分响度/真峰值/LRA/门限，按（文件指纹, EQ 设置）缓存到磁盘；
+    第二遍以 EQ → loudnorm（linear=true）的顺序渲染，loudnorm 位于链尾，
+    EQ 与音量调节造成的响度变化被计入测量值，输出的积分响度和真峰值都以 loudnorm 为准。
+    测量与目标响度无关，因此只修改目标响度/真峰值上限后重新渲染不会再跑第一遍。
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.pending = {}  # 缓存键 -> 正在测量的 Event，避免批量处理时重复测量同一文件
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def measure(self, path, eq_filter=None, stop=None):
+        """
+        返回源文件经过 eq_filter 后的第一遍测量值（优先读缓存）
+        :param eq_filter: 第二遍中位于 loudnorm 之前的滤镜链，None 表示直接测量源文件
+        :param stop: 可选 threading.Event，测量期间被设置时结束 ffmpeg 并抛出 RuntimeError
+        :return: {"input_i", "input_tp", "input_lra", "input_thresh"}（字符串，原样传回 loudnorm）
+        """
+        key = f"{file_fingerprint(path)}_{eq_settings_stamp(eq_filter or 'anull')[:12]}"
+        cache_path = os.path.join(self.cache_dir, f"{key}.json")
+        while True:
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+            with self.lock:
+                event = self.pending.get(key)
+                if event is None:
+                    event = self.pending[key] = threading.Event()
+                    break
+            event.wait()  # 另一个线程正在测量同一文件，等它写完缓存后重读
+            if not os.path.exists(cache_path):
+                raise RuntimeError("响度测量失败")
+        try:
+            measured = self._first_pass(path, eq_filter, stop)
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump(measured, f, indent=2)
+            return measured
+        finally:
+            with self.lock:
+                self.pending.pop(key).set()
+
+    @staticmethod
+    def _first_pass(path, eq_filter=None, stop=None):
+        chain = f"{eq_filter},loudnorm=print_format=json" if eq_filter else "loudnorm=print_format=json"
+        cmd = ["ffmpeg", "-hide_banner", "-nostats", "-i", path, "-vn", "-map", "0:a:0",
+               "-af", chain, "-f", "null", "-"]
+        process = PROCESSES.popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                  text=True, encoding='utf-8', errors='replace')
+        try:
+            while True:
+                try:
+                    stderr = process.communicate(timeout=0.5)[1] or ""
+                    break
+                except subprocess.TimeoutExpired:
+                    if stop is not None and stop.is_set():
+                        PROCESSES.kill(process)
+                        process.communicate()
+                        raise RuntimeError("已取消")
+        finally:
+            PROCESSES.forget(process)
+        match = re.search(r"\{[^{}]*\"input_i\"[^{}]*\}", stderr)
+        if process.returncode != 0 or not match:
+            lines = stderr.strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else "响度测量失败")
+        data = json.loads(match.group(0))
+        # target_offset 取决于第一遍所用的目标值，这里只缓存与目标无关的测量值
+        return {key: data[key] for key in ("input_i", "input_tp", "input_lra", "input_thresh")}
+
+    def build_filter(self, path, eq_filter, target_i=-14.0, true_peak=-1.0, lra=11.0, stop=None):
+        """
+        构造第二遍的完整滤镜链：EQ → loudnorm（使用 EQ 后的测量值）。
+        loudnorm 必须在链尾：放在 EQ 之前时，EQ 提升/衰减和音量调节会让输出偏离目标响度；
+        它自带真峰值检测，线性增益会超出真峰值上限时自动改用动态模式，因此不再需要额外的限幅器。
+        """
+        m = self.measure(path, eq_filter, stop)
+        loudnorm = (f"loudnorm=I={target_i}:TP={true_peak}:LRA={lra}"
+                    f":measured_I={m['input_i']}:measured_TP={m['input_tp']}:measured_LRA={m['input_lra']}"
+                    f":measured_thresh={m['input_thresh']}:linear=true")
+        return f"{eq_filter},{loudnorm}" if eq_filter else loudnorm
+
+# ==================== 音频分析模块结束 ====================
+
+class SimpleDownloader:  # 创建下载器类
+    def __init__(self, root):
+        self.root = root
+        self.root.geometry("1500x800")
+        self.root.configure(bg="white")
+
+        # 获取屏幕宽度和高度
+        screen_width = self.root.winfo_screenwidth()
+        screen_height = self.root.winfo_screenheight()
+
+        # 窗口宽度和高度
+        window_width = 1500
+        window_height = 800
+
+        # 计算窗口左上角坐标
+        x = (screen_width - window_width) // 2
+        y = (screen_height - window_height) // 2
+
+        # 设置窗口几何形状
+        self.root.geometry(f"{window_width}x{window_height}+{x}+{y}")
+
+        config = load_config()
+        # 统一规范为 Windows 风格路径显示（使用反斜杠）
+        self.save_path = os.path.normpath(config.get("save_path", os.getcwd()))
+        self.cookies_path = os.path.normpath(config.get("cookies_path", "")) if config.get("cookies_path") else ""
+        # 检查是否以管理员身份运行
+        try:
+            is_admin = ctypes.windll.shell32.IsUserAnAdmin()
+        except:
+            is_admin = False
+
+        # 更新窗口标题
+        admin_status = "以管理员身份运行" if is_admin else "非管理员身份运行"
+        self.root.title(f"YTB视频下载器-3.5版本-{admin_status}")
+
+        self.create_menu()
+        self.create_widgets()
+        self.cookies_valid = False
+        # 多账号 Cookies 轮换：主 cookies 文件 + 设置里添加的备用账号
+        self.cookie_pool = CookiePool(
+            [self.cookies_path] + config.get("cookies_pool", []),
+            hourly_budget=config.get("cookies_hourly_budget", 90)
+        )
+        # 正在下载的任务：url -> {"name": 队列中的名称, "process": yt-dlp 进程, "cancelled": 取消标记, "host": 站点}
+        # 队列名称用于“取消下载”识别，避免依赖文本里的“下载中”关键字；
+        # 取消标记用于在“准备下载/获取标题/封面”阶段安全中止任务
+        self.active_downloads = {}
+        self.download_info = {}  # 用于存储下载信息
+        # 下载队列控制：同时下载的任务数由自适应并发控制按站点决定
+        self.download_task_queue = []  # [(url, format_id), ...]
+        self.is_downloading = False    # 当前是否有任务正在下载
+        # 自适应并发：识别 429/限流后按 AIMD 调整槽位和分片并发
+        self.throttle = ThrottleController(
+            max_slots=config.get("max_concurrent_downloads", 3),
+            max_fragments=config.get("max_concurrent_fragments", 4)
+        )
+        self.retry_counts = {}  # url -> 因限流/代理故障失败而自动重试的次数
+        # 下载后处理选项：url -> {"eq": 滤镜链, "outputs": 额外交付文件}，入队时根据当前设置记录，生成 PCM MKV 时使用
+        self.task_postprocess = {}
+        self.stream_fallback = set()  # 边下边转失败、需要改走落盘流程的 url
+        # 流水线：下载 → 后处理（独立并发）→ B站上传（上传队列自己的并发），各阶段之间有积压上限
+        self.process_queue = []  # 等待后处理的任务参数
+        self.processing_active = {}  # url -> {"name": 标题, "cancelled": 是否已取消}，正在后处理的任务
+        self.process_workers = config.get("pipeline_process_workers", 2)
+        self.pipeline_upload_backlog = config.get("pipeline_upload_backlog", 2)
+        self.pipeline_upload_ids = set()  # 本次运行由流水线加入上传队列的条目 id，上传背压只统计这些
+        self.backpressure_reasons = {}  # url -> 上次记录的等待原因，原因变化时才写日志
+        # 所有 ffmpeg 任务（下载后转码、合并、EQ）共用的执行器和 CPU 线程预算
+        self.ffmpeg = FFmpegRunner(config.get("ffmpeg_threads") or os.cpu_count() or 1)
+        # 代理池：为每个下载任务分配评分最高的代理，定期做健康检测
+        self.proxy_pool = ProxyPool(config.get("proxies", []))
+        self.proxy_health_lock = threading.Lock()
+        self.proxy_health_running = False  # 健康检测线程是否在运行，保证同一时间只有一个
+        self.proxy_health_wake = threading.Event()  # 代理设置变化时唤醒检测线程立即检测
+        if self.proxy_pool:
+            self._ensure_proxy_health_loop()
+        # 传输参数自动调优：按实际吞吐量选择分块大小和分片并发
+        self.tuner = TransferTuner(os.path.join(CONFIG_DIR, "transfer_tuning.json"))
+        self.throttle_wakeup_pending = False  # 是否已安排在限流冷却结束后重新调度
+        # 标题缓存：url -> (原始标题, 已清洗标题)
+        self.title_cache = {}
+        # 全局带宽管理：总限速 + 按时间段的规则（例如夜间不限速）
+        self.bandwidth = BandwidthManager(config.get("bandwidth_limit", ""), config.get("bandwidth_schedule", ""))
+        self.bandwidth_wait_logged = False  # 带宽预算不足的提示每轮只输出一次
+        # 队列预取：提前为后续 N 个任务获取标题/格式/封面，并发数有上限
+        self.prefetcher = LookaheadPrefetcher(
+            self._prefetch_task,
+            depth=config.get("prefetch_depth", 2),
+            max_workers=config.get("prefetch_workers", 2),
+            cleanup_fn=self._discard_prefetched
+        )
+        self.log_lock = threading.Lock()  # 添加日志锁
+
+        # 启动自动配置（首次运行）
+        self.root.after(50, self.run_auto_setup_on_startup)  # 最先运行自动配置
+        
+        self.root.after(100, self.check_and_update_yt_dlp)  # 启动后延迟检测 yt-dlp
+        self.root.after(200, self._check_biliup_status)  # 启动后延迟检测 biliup（检测到后继续上传上次未完成的队列）
+        self.show_home()  # 启动时直接显示主页
+        
+        self.download_status_label = tk.Label(self.root, text="", bg="white", font=(None, 10))
+        self.download_status_label.pack(pady=5)
+        
+        # 初始化biliup路径
+        self.biliup_path = None
+        self.biliup_exe_path = None
+        self.biliup_cookies_path = None
+        
+
+    def center_window(self):  # 居中窗口
+        self.root.update_idletasks()  # 更新窗口信息
+        width = self.root.winfo_width()  # 获取窗口宽度
+        height = self.root.winfo_height()  # 获取窗口高度
+        screen_width = self.root.winfo_screenwidth()  # 获取屏幕宽度
+        screen_height = self.root.winfo_screenheight()  # 获取屏幕高度
+        x = (screen_width // 2) - (width // 2)  # 计算窗口居中位置的X坐标
+        y = (screen_height // 2) - (height // 2)  # 计算窗口居中位置的Y坐标
+        self.root.geometry(f'{width}x{height}+{x}+{y}')  # 设置窗口位置
+
+
+    def create_menu(self):  # 创建菜单
+        menubar = tk.Menu(self.root)  # 创建菜单栏
+        self.root.config(menu=menubar)  # 设置菜单栏
+
+        menubar.add_command(label=" 🏠 主页  ", command=self.show_home) # 添加主页菜单项
+        menubar.add_command(label=" 📝 日志 ", command=self.show_log) # 添加日志菜单项
+        menubar.add_command(label=" ⚙️ 设置 ", command=self.show_settings) # 添加设置菜单项
+
+
+    def check_cookies_valid(self, path=None):
+        path = path or self.cookies_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            test_url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+            cmd = ["yt-dlp", "--cookies", path, "--dump-json", test_url] + self._proxy_args()
+            env = os.environ.copy()
+            env['PYTHONIOENCODING'] = 'utf-8'
+            result = PROCESSES.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=10, env=env)
+            return result.returncode == 0 and "LOGIN_REQUIRED" not in result.stderr
+        except Exception:
+            return False
+
+    def create_widgets(self):
+        self.settings_frame = tk.Frame(self.root, bg="white")
+        self.main_frame = tk.Frame(self.root, bg="white")
+        self.main_frame.pack(fill="both", expand=True, padx=0, pady=0)
+
+        frame = tk.Frame(self.main_frame, bg="white")
+        frame.pack(pady=0)  # Reduced padding here
+
+        # 添加下载和下载列表选项卡
+        self.main_tabs = ttk.Notebook(self.main_frame)
+
+        self.custom_tab = tk.Frame(self.main_tabs, bg="white", height=10)
+        self.main_tabs.add(self.custom_tab, text="📥 下载页")
+
+        custom_frame = tk.Frame(self.custom_tab, bg="white")
+        custom_frame.pack(pady=10, padx=10, anchor="center")
+
+        icon_button_frame = tk.Frame(custom_frame, bg="white")
+        icon_button_frame.grid(row=0, column=2, rowspan=2, padx=(10, 0), pady=(0, 10))
+
+        search_icon_path = resource_path(os.path.join("icons", "搜索1.png"))
+        search_icon = tk.PhotoImage(file=search_icon_path).subsample(12, 12)
+        self.search_icon = search_icon
+
+        download2_icon_path = resource_path(os.path.join("icons", "下载2.png"))
+        download2_icon = tk.PhotoImage(file=download2_icon_path).subsample(12, 12)
+        self.download2_icon = download2_icon
+
+        tk.Label(custom_frame, text="视频链接：", bg="white", font=(None, 10)).grid(row=0, column=0, sticky="e")
+        self.custom_url_entry = tk.Entry(custom_frame, width=60, bd=1, relief="solid", bg="white", highlightthickness=1, highlightbackground="#CCCCCC", fg="black", font=(None, 10))
+        self.custom_url_entry.grid(row=0, column=1, padx=5)
+
+        tk.Label(custom_frame, text="格式编号：", bg="white", font=(None, 10)).grid(row=1, column=0, sticky="e")
+        self.custom_format_entry = tk.Entry(custom_frame, width=60, bd=1, relief="solid", bg="white", highlightthickness=1, highlightbackground="#CCCCCC", fg="black", font=(None, 10))
+        self.custom_format_entry.grid(row=1, column=1, padx=5, sticky="w")
+
+        # 下载后直接套用均衡器页的 EQ：在生成 PCM MKV 的同一次 ffmpeg 处理中完成，不再单独解码/写出一遍
+        self.download_eq_var = tk.BooleanVar(value=load_config().get("download_eq", False))
+        tk.Checkbutton(custom_frame, text="下载后套用均衡器页的当前EQ", variable=self.download_eq_var, bg="white",
+                       command=self._save_download_postprocess).grid(row=2, column=1, padx=5, sticky="w")
+
+        # 边下边转：HLS/DASH 单一格式时不落地中间文件，其它格式自动走原流程
+        self.stream_transcode_var = tk.BooleanVar(value=load_config().get("stream_transcode", False))
+        tk.Checkbutton(custom_frame, text="边下边转（HLS/DASH 单一格式时不生成中间文件）", variable=self.stream_transcode_var, bg="white",
+                       command=self._save_download_postprocess).grid(row=4, column=1, padx=5, sticky="w")
+
+        # 流水线：处理完成后自动把视频和封面加入B站上传队列
+        self.download_upload_var = tk.BooleanVar(value=load_config().get("download_upload", False))
+        tk.Checkbutton(custom_frame, text="处理完成后自动上传到B站（使用B站页的标签）", variable=self.download_upload_var, bg="white",
+                       command=self._save_download_postprocess).grid(row=5, column=1, padx=5, sticky="w")
+
+        # 除 PCM MKV 外额外生成的交付文件，与 PCM MKV 共用一次解码
+        outputs_frame = tk.Frame(custom_frame, bg="white")
+        outputs_frame.grid(row=3, column=1, padx=5, sticky="w")
+        tk.Label(outputs_frame, text="同时生成：", bg="white", font=(None, 10)).pack(side="left")
+        selected_outputs = load_config().get("download_outputs", [])
+        self.download_output_vars = {}
+        for key in ("mp3", "aac", "upload_mp4"):
+            var = tk.BooleanVar(value=key in selected_outputs)
+            tk.Checkbutton(outputs_frame, text=DELIVERABLES[key][0], variable=var, bg="white",
+                           command=self._save_download_postprocess).pack(side="left")
+            self.download_output_vars[key] = var
+
+        tk.Button(icon_button_frame, image=search_icon, command=self.query_formats, relief="flat", bg="white", activebackground="white", highlightthickness=0, bd=0).pack(pady=(0, 10))
+        tk.Button(icon_button_frame, image=download2_icon, command=self.download_selected_format, relief="flat", bg="white", activebackground="white", highlightthickness=0, bd=0).pack()
+
+        self.format_listbox = tk.Listbox(self.custom_tab, font=(None, 10), bg="white", bd=1, relief="solid")
+        self.format_listbox.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+        # 添加下载队列选项卡
+        self.queue_tab = tk.Frame(self.main_tabs, bg="white")
+        self.main_tabs.add(self.queue_tab, text="📋 下载队列")
+
+        self.download_queue_listbox = tk.Listbox(self.queue_tab, font=(None, 10), bg="white", bd=1, relief="solid", highlightthickness=1, highlightbackground="#CCCCCC")
+        self.download_queue_listbox.pack(fill="both", expand=True, padx=10, pady=10)
+
+        self.queue_menu = tk.Menu(self.root, tearoff=0)
+        self.queue_menu.add_command(label="重新下载", command=self.retry_download)
+        self.queue_menu.add_command(label="取消下载", command=self.cancel_download)
+
+        self.download_queue_listbox.bind("<Button-3>", self.show_queue_menu)
+
+        self.log_frame = tk.Frame(self.root, bg="white")
+
+
+        self.log_notebook = ttk.Notebook(self.log_frame)
+        self.log_notebook.pack(fill="both", expand=True, padx=10, pady=0)
 
         self.download_log_text_frame = tk.Frame(self.log_notebook, bg="white")
         self.download_log_text_frame.pack(fill="both", expand=True)
@@ -711,22 +3447,57 @@ class SimpleDownloader:  # 创建下载器类
         # 先销毁旧的标签，避免路径叠加显示
         if hasattr(self, 'save_label'):
             try:
-                self.save_label.destroy()
+                self.save_label.destroy()
+            except:
+                pass
+        if hasattr(self, 'cookies_label'):
+            try:
+                self.cookies_label.destroy()
+            except:
+                pass
+        if hasattr(self, 'yt_dlp_install_label'):
+            try:
+                self.yt_dlp_install_label.destroy()
+            except:
+                pass
+        if hasattr(self, 'cookies_check_button'):
+            try:
+                self.cookies_check_button.destroy()
+            except:
+                pass
+        if hasattr(self, 'prefetch_frame'):
+            try:
+                self.prefetch_frame.destroy()
+            except:
+                pass
+        if hasattr(self, 'bandwidth_frame'):
+            try:
+                self.bandwidth_frame.destroy()
+            except:
+                pass
+        if hasattr(self, 'concurrency_frame'):
+            try:
+                self.concurrency_frame.destroy()
             except:
                 pass
-        if hasattr(self, 'cookies_label'):
+        if hasattr(self, 'proxy_frame'):
             try:
-                self.cookies_label.destroy()
+                self.proxy_frame.destroy()
             except:
                 pass
-        if hasattr(self, 'yt_dlp_install_label'):
+        if hasattr(self, 'cookie_pool_frame'):
             try:
-                self.yt_dlp_install_label.destroy()
+                self.cookie_pool_frame.destroy()
             except:
                 pass
-        if hasattr(self, 'cookies_check_button'):
+        if hasattr(self, 'ffmpeg_frame'):
             try:
-                self.cookies_check_button.destroy()
+                self.ffmpeg_frame.destroy()
+            except:
+                pass
+        if hasattr(self, 'tools_frame'):
+            try:
+                self.tools_frame.destroy()
             except:
                 pass
 
@@ -754,13 +3525,90 @@ class SimpleDownloader:  # 创建下载器类
         self.cookies_check_button.grid(row=1, column=3, padx=10)
 
         tk.Label(self.settings_frame, text="📦 yt-dlp安装路径：", font=(None, 10)).grid(row=2, column=0, sticky="w")
-        self.yt_dlp_install_label = tk.Label(self.settings_frame, text=self.yt_dlp_path, font=(None, 10))
+        # 显示工具链登记表实际使用的 yt-dlp（可能是版本库中的当前版本，也可能是 PATH 中的），由 refresh_tool_versions 在后台填入
+        self.yt_dlp_install_label = tk.Label(self.settings_frame, text="检测中...", font=(None, 10))
         self.yt_dlp_install_label.grid(row=2, column=1, sticky="w")
 
         # 添加重新检测环境按钮
         tk.Label(self.settings_frame, text="🔧 环境配置：", font=(None, 10)).grid(row=3, column=0, sticky="w", pady=(20, 0))
         tk.Button(self.settings_frame, text="🔄 重新检测环境", command=self.force_rerun_setup, font=(None, 10), bg="#4CAF50", fg="white", relief="flat", padx=15, pady=5).grid(row=3, column=1, sticky="w", pady=(20, 0))
 
+        # 队列预取设置：预取深度（提前处理几个排队任务）和并发上限
+        tk.Label(self.settings_frame, text="⏩ 队列预取：", font=(None, 10)).grid(row=4, column=0, sticky="w", pady=(20, 0))
+        self.prefetch_frame = tk.Frame(self.settings_frame)
+        self.prefetch_frame.grid(row=4, column=1, sticky="w", pady=(20, 0))
+        self.prefetch_depth_var = tk.IntVar(value=self.prefetcher.depth)
+        self.prefetch_workers_var = tk.IntVar(value=self.prefetcher.max_workers)
+        tk.Label(self.prefetch_frame, text="预取深度", font=(None, 10)).pack(side="left")
+        tk.Spinbox(self.prefetch_frame, from_=0, to=10, width=4, textvariable=self.prefetch_depth_var, command=self.update_prefetch_settings).pack(side="left", padx=(4, 12))
+        tk.Label(self.prefetch_frame, text="并发上限", font=(None, 10)).pack(side="left")
+        tk.Spinbox(self.prefetch_frame, from_=1, to=8, width=4, textvariable=self.prefetch_workers_var, command=self.update_prefetch_settings).pack(side="left", padx=4)
+
+        # 带宽限制：总限速（如 4M，留空不限速）+ 时间段规则（如 09:00-18:00=2M;22:00-07:00=0）
+        config = load_config()
+        tk.Label(self.settings_frame, text="🚦 带宽限制：", font=(None, 10)).grid(row=5, column=0, sticky="w", pady=(20, 0))
+        self.bandwidth_frame = tk.Frame(self.settings_frame)
+        self.bandwidth_frame.grid(row=5, column=1, columnspan=3, sticky="w", pady=(20, 0))
+        tk.Label(self.bandwidth_frame, text="总限速", font=(None, 10)).pack(side="left")
+        self.bandwidth_limit_entry = tk.Entry(self.bandwidth_frame, width=8, font=(None, 10))
+        self.bandwidth_limit_entry.insert(0, config.get("bandwidth_limit", ""))
+        self.bandwidth_limit_entry.pack(side="left", padx=(4, 12))
+        tk.Label(self.bandwidth_frame, text="时间段", font=(None, 10)).pack(side="left")
+        self.bandwidth_schedule_entry = tk.Entry(self.bandwidth_frame, width=36, font=(None, 10))
+        self.bandwidth_schedule_entry.insert(0, config.get("bandwidth_schedule", ""))
+        self.bandwidth_schedule_entry.pack(side="left", padx=4)
+        tk.Button(self.bandwidth_frame, text="💾 保存", command=self.update_bandwidth_settings).pack(side="left", padx=6)
+
+        # 并发上限：实际并发由自适应控制在 1 和上限之间调整，遇到限流会自动减半
+        tk.Label(self.settings_frame, text="🔀 并发上限：", font=(None, 10)).grid(row=6, column=0, sticky="w", pady=(20, 0))
+        self.concurrency_frame = tk.Frame(self.settings_frame)
+        self.concurrency_frame.grid(row=6, column=1, sticky="w", pady=(20, 0))
+        self.max_slots_var = tk.IntVar(value=self.throttle.max_slots)
+        self.max_fragments_var = tk.IntVar(value=self.throttle.max_fragments)
+        tk.Label(self.concurrency_frame, text="同时下载", font=(None, 10)).pack(side="left")
+        tk.Spinbox(self.concurrency_frame, from_=1, to=8, width=4, textvariable=self.max_slots_var, command=self.update_concurrency_settings).pack(side="left", padx=(4, 12))
+        tk.Label(self.concurrency_frame, text="分片并发", font=(None, 10)).pack(side="left")
+        tk.Spinbox(self.concurrency_frame, from_=1, to=16, width=4, textvariable=self.max_fragments_var, command=self.update_concurrency_settings).pack(side="left", padx=(4, 12))
+        self.process_workers_var = tk.IntVar(value=self.process_workers)
+        tk.Label(self.concurrency_frame, text="后处理", font=(None, 10)).pack(side="left")
+        tk.Spinbox(self.concurrency_frame, from_=1, to=8, width=4, textvariable=self.process_workers_var, command=self.update_concurrency_settings).pack(side="left", padx=4)
+
+        # 代理池：多个代理用分号分隔，留空则沿用系统代理
+        tk.Label(self.settings_frame, text="🌐 代理池：", font=(None, 10)).grid(row=7, column=0, sticky="w", pady=(20, 0))
+        self.proxy_frame = tk.Frame(self.settings_frame)
+        self.proxy_frame.grid(row=7, column=1, columnspan=3, sticky="w", pady=(20, 0))
+        self.proxy_entry = tk.Entry(self.proxy_frame, width=60, font=(None, 10))
+        self.proxy_entry.insert(0, ";".join(config.get("proxies", [])))
+        self.proxy_entry.pack(side="left")
+        tk.Button(self.proxy_frame, text="💾 保存并检测", command=self.update_proxy_settings).pack(side="left", padx=6)
+
+        # 备用 Cookies 账号：下载任务会在主账号和备用账号之间轮换
+        tk.Label(self.settings_frame, text="👥 备用账号：", font=(None, 10)).grid(row=8, column=0, sticky="w", pady=(20, 0))
+        self.cookie_pool_frame = tk.Frame(self.settings_frame)
+        self.cookie_pool_frame.grid(row=8, column=1, columnspan=3, sticky="w", pady=(20, 0))
+        self.cookie_pool_label = tk.Label(self.cookie_pool_frame, text=f"{len(config.get('cookies_pool', []))} 个", font=(None, 10))
+        self.cookie_pool_label.pack(side="left")
+        tk.Button(self.cookie_pool_frame, text="➕ 添加Cookies文件", command=self.add_pool_cookies).pack(side="left", padx=6)
+        tk.Button(self.cookie_pool_frame, text="🧹 清空", command=self.clear_pool_cookies).pack(side="left")
+
+        # ffmpeg 线程预算：所有同时运行的转码/EQ 任务共享，避免多个任务同时占满 CPU
+        tk.Label(self.settings_frame, text="🧮 转码线程：", font=(None, 10)).grid(row=9, column=0, sticky="w", pady=(20, 0))
+        self.ffmpeg_frame = tk.Frame(self.settings_frame)
+        self.ffmpeg_frame.grid(row=9, column=1, sticky="w", pady=(20, 0))
+        self.ffmpeg_threads_var = tk.IntVar(value=self.ffmpeg.thread_budget)
+        tk.Label(self.ffmpeg_frame, text="总线程数", font=(None, 10)).pack(side="left")
+        tk.Spinbox(self.ffmpeg_frame, from_=1, to=max(64, os.cpu_count() or 1), width=4, textvariable=self.ffmpeg_threads_var, command=self.update_ffmpeg_settings).pack(side="left", padx=4)
+
+        # 工具版本：本程序安装的 yt-dlp/ffmpeg 按版本并存，可一步切回上一个版本
+        tk.Label(self.settings_frame, text="🧰 工具版本：", font=(None, 10)).grid(row=10, column=0, sticky="w", pady=(20, 0))
+        self.tools_frame = tk.Frame(self.settings_frame)
+        self.tools_frame.grid(row=10, column=1, columnspan=3, sticky="w", pady=(20, 0))
+        self.tool_versions_label = tk.Label(self.tools_frame, text="检测中...", font=(None, 10))
+        self.tool_versions_label.pack(side="left")
+        tk.Button(self.tools_frame, text="↩️ 回滚 yt-dlp", command=lambda: self.rollback_tool("yt-dlp")).pack(side="left", padx=(12, 4))
+        tk.Button(self.tools_frame, text="↩️ 回滚 ffmpeg", command=lambda: self.rollback_tool("ffmpeg")).pack(side="left")
+        self.refresh_tool_versions()
+
     def choose_save_path(self):
         path = filedialog.askdirectory()
         if path:
@@ -778,6 +3626,128 @@ class SimpleDownloader:  # 创建下载器类
         save_config(config)
 
 
+    def update_prefetch_settings(self):
+        try:
+            depth = int(self.prefetch_depth_var.get())
+            workers = int(self.prefetch_workers_var.get())
+        except (tk.TclError, ValueError):
+            return
+        self.prefetcher.reconfigure(depth, workers)
+        self.prefetcher.schedule(self.download_task_queue)
+        config = load_config()
+        config["prefetch_depth"] = self.prefetcher.depth
+        config["prefetch_workers"] = self.prefetcher.max_workers
+        save_config(config)
+
+    def update_concurrency_settings(self):
+        try:
+            max_slots = int(self.max_slots_var.get())
+            max_fragments = int(self.max_fragments_var.get())
+            self.process_workers = max(1, int(self.process_workers_var.get()))
+        except (tk.TclError, ValueError):
+            return
+        self.throttle.configure(max_slots, max_fragments)
+        config = load_config()
+        config["max_concurrent_downloads"] = self.throttle.max_slots
+        config["max_concurrent_fragments"] = self.throttle.max_fragments
+        config["pipeline_process_workers"] = self.process_workers
+        save_config(config)
+        self._pump_process_stage()
+        self.start_next_download()
+
+    def update_ffmpeg_settings(self):
+        try:
+            threads = int(self.ffmpeg_threads_var.get())
+        except (tk.TclError, ValueError):
+            return
+        self.ffmpeg.configure(max(1, threads))
+        config = load_config()
+        config["ffmpeg_threads"] = self.ffmpeg.thread_budget
+        save_config(config)
+
+    def add_pool_cookies(self):
+        paths = filedialog.askopenfilenames(filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        if not paths:
+            return
+        config = load_config()
+        extras = config.get("cookies_pool", [])
+        for path in paths:
+            path = os.path.normpath(os.path.abspath(path))
+            if path not in extras and path != self.cookies_path:
+                extras.append(path)
+        self._save_pool_cookies(extras)
+        # 新增账号需要检测后才会参与轮换
+        self.refresh_cookies_status()
+
+    def clear_pool_cookies(self):
+        self._save_pool_cookies([])
+
+    def _save_pool_cookies(self, extras):
+        config = load_config()
+        config["cookies_pool"] = extras
+        save_config(config)
+        self.cookie_pool.configure([self.cookies_path] + extras)
+        if hasattr(self, 'cookie_pool_label') and self.cookie_pool_label.winfo_exists():
+            self.cookie_pool_label.config(text=f"{len(extras)} 个")
+
+    def update_proxy_settings(self):
+        proxies = [p.strip() for p in self.proxy_entry.get().replace("；", ";").split(";") if p.strip()]
+        self.proxy_pool.configure(proxies)
+        config = load_config()
+        config["proxies"] = proxies
+        save_config(config)
+        if not proxies:
+            self.log("🌐 代理池已清空，下载将沿用系统代理", category="下载")
+            self.proxy_health_wake.set()  # 让检测线程立即醒来并退出
+            return
+        self._ensure_proxy_health_loop()
+
+    def _ensure_proxy_health_loop(self):
+        """确保只有一个代理健康检测线程在运行；已在运行时唤醒它立即检测一次"""
+        with self.proxy_health_lock:
+            if self.proxy_health_running:
+                self.proxy_health_wake.set()
+                return
+            self.proxy_health_running = True
+        threading.Thread(target=self._proxy_health_loop, daemon=True).start()
+
+    def _run_proxy_health_check(self):
+        for proxy, (ok, latency) in self.proxy_pool.health_check().items():
+            if ok is None:
+                self.log(f"🌐 代理 {proxy}：无法检测（需要安装 PySocks），按可用处理", category="下载")
+            elif ok:
+                self.log(f"🌐 代理 {proxy}：✅ 可用，耗时 {latency:.2f}s", category="下载")
+            else:
+                self.log(f"🌐 代理 {proxy}：❌ 不可用", category="下载")
+
+    def _proxy_health_loop(self):
+        # 每 5 分钟（或代理设置变化时）检测一次，让停用的代理在恢复后重新参与分配；代理池清空后退出
+        while True:
+            with self.proxy_health_lock:
+                if not self.proxy_pool:
+                    self.proxy_health_running = False
+                    return
+                self.proxy_health_wake.clear()
+            self._run_proxy_health_check()
+            self.proxy_health_wake.wait(300)
+
+    def update_bandwidth_settings(self):
+        limit = self.bandwidth_limit_entry.get().strip()
+        schedule = self.bandwidth_schedule_entry.get().strip()
+        try:
+            parse_rate(limit)
+        except ValueError:
+            self.log(f"❌ 无法识别的总限速：{limit}（示例：4M、500K，留空不限速）", category="下载")
+            return
+        self.bandwidth.configure(limit, schedule)
+        config = load_config()
+        config["bandwidth_limit"] = limit
+        config["bandwidth_schedule"] = schedule
+        save_config(config)
+        self.log(f"🚦 带宽设置已保存，当前总预算：{format_rate(self.bandwidth.current_budget())}", category="下载")
+        # 按新预算重新分配正在进行的下载，并尝试启动因预算不足而等待的任务
+        self.start_next_download()
+
     def copy_selected(self, widget):
         try:
             selected_text = widget.get(tk.SEL_FIRST, tk.SEL_LAST)
@@ -824,15 +3794,28 @@ class SimpleDownloader:  # 创建下载器类
         config = load_config()
         config["cookies_path"] = path
         save_config(config)
+        self.cookie_pool.configure([path] + config.get("cookies_pool", []))
         self.refresh_cookies_status()
 
+    def check_extra_cookies(self):
+        """逐个检测备用账号的 cookies，并记录到账号池（主 cookies 由调用方单独检测）"""
+        for path in self.cookie_pool.paths():
+            if path == self.cookies_path:
+                continue
+            valid = self.check_cookies_valid(path)
+            self.cookie_pool.set_valid(path, valid)
+            self.log(f"🍪 {self.cookie_pool.label(path)}：{'✅ 可用' if valid else '❌ 不可用'}", category="Cookies")
+        # 只要有任一账号可用就启用 cookies 功能
+        self.cookies_valid = self.cookie_pool.has_valid()
+
     def check_cookies_on_startup(self):
         def check():
             # 等待一小段时间确保 yt-dlp 完全准备好
             time.sleep(1)
             self.log("🕒 启动时检测 Cookies 可用性...", category="Cookies")
             valid = self.check_cookies_valid()
-            self.cookies_valid = valid
+            self.cookie_pool.set_valid(self.cookies_path, valid)
+            self.check_extra_cookies()
             # 启动时的检测不更新按钮状态，保持默认的"点击检测"状态
             
             if valid:
@@ -868,7 +3851,8 @@ class SimpleDownloader:  # 创建下载器类
         def check():
             self.log("🕒 开始检测 🍪Cookies 可用性...", category="Cookies")
             valid = self.check_cookies_valid()
-            self.cookies_valid = valid
+            self.cookie_pool.set_valid(self.cookies_path, valid)
+            self.check_extra_cookies()
             
             # 使用self.root.after确保在检测完成后更新UI
             # 更新按钮颜色：可用=绿色，不可用=红色，并重新启用按钮
@@ -971,18 +3955,18 @@ class SimpleDownloader:  # 创建下载器类
 
         def run():
             self.log(f"\n🔍 正在获取格式列表：{url}", category="下载")
-            cmd = [self.yt_dlp_path, "-F", url]
-            # 只有在cookies路径存在且cookies有效时才使用cookies
-            if self.cookies_path and self.cookies_valid:
-                cmd += ["--cookies", self.cookies_path]
+            cmd = ["yt-dlp", "-F", url] + self._proxy_args()
+            # 只有存在可用的 cookies 账号时才使用cookies（多账号时轮换）
+            cookies = self.cookie_pool.pick()
+            if cookies:
+                cmd += ["--cookies", cookies]
                 self.log("🍪 使用cookies进行格式查询", category="下载")
             else:
                 self.log("ℹ️ 未使用cookies进行格式查询", category="下载")
             try:
-                creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
                 env = os.environ.copy()
                 env['PYTHONIOENCODING'] = 'utf-8'
-                result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', creationflags=creationflags, env=env)
+                result = PROCESSES.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', env=env)
                 self.format_listbox.delete(0, tk.END)
                 if result.returncode == 0:
                     formats = result.stdout.splitlines()
@@ -1008,27 +3992,112 @@ class SimpleDownloader:  # 创建下载器类
         self.download_info[filename] = (url, format_id)
         self.download_queue_listbox.insert(tk.END, f"{filename}: 待下载...")
 
+        # 记录本任务的后处理选项（以入队时的 EQ 设置为准，之后修改均衡器页不影响已入队任务）
+        post = {}
+        if self.download_eq_var.get():
+            eq_filter = self._build_9band_filter()
+            if eq_filter:
+                post["eq"] = eq_filter
+            else:
+                self.log("ℹ️ 均衡器页未设置任何增益，本任务不套用EQ", category="下载")
+        extra_outputs = [key for key, var in self.download_output_vars.items() if var.get()]
+        if extra_outputs:
+            post["outputs"] = extra_outputs
+        if self.download_upload_var.get():
+            post["upload"] = True
+        if post:
+            self.task_postprocess[url] = post
+        else:
+            self.task_postprocess.pop(url, None)
+
         # 压入内部任务队列
         self.download_task_queue.append((url, format_id))
 
-        # 后台预先获取标题，并立即更新队列显示为“视频标题: 待下载...”
-        threading.Thread(
-            target=self._prepare_title_for_queue,
-            args=(url, filename),
-            daemon=True
-        ).start()
+        # 交给预取线程池：在预取深度内的任务会提前获取标题/格式/封面，
+        # 并把队列显示更新为“视频标题: 待下载...”
+        self.prefetcher.schedule(self.download_task_queue)
+
+        # 若还有空闲的下载槽位，则立即启动队列中的任务
+        self.start_next_download()
+
+        # 仍在排队、又超出预取深度的任务：只在后台获取标题（一次轻量请求），让队列显示标题而不是链接
+        if not self.prefetcher.scheduled(url) and any(u == url for u, _ in self.download_task_queue):
+            threading.Thread(
+                target=self._prepare_title_for_queue,
+                args=(url, filename),
+                daemon=True
+            ).start()
+
+    def _save_download_postprocess(self):
+        config = load_config()
+        config["download_eq"] = self.download_eq_var.get()
+        config["download_outputs"] = [key for key, var in self.download_output_vars.items() if var.get()]
+        config["stream_transcode"] = self.stream_transcode_var.get()
+        config["download_upload"] = self.download_upload_var.get()
+        save_config(config)
+
+    def _prefetch_task(self, url, format_id):
+        """
+        预取单个排队任务（在预取线程池中运行）：
+        一次 yt-dlp -J 拿到标题和可用格式，再把封面下载到标题文件夹。
+        结果由 _download_task 领取；任意一步失败都不影响下载线程按原流程补做。
+        """
+        filename = url.split("?")[0].split("/")[-1]
+        info = self.get_video_info(url)
+        title = (info or {}).get("title") or self.get_video_title(url, filename)
+        self._prepare_title_for_queue(url, filename, title)
+        sanitized_title = self.sanitize_path(title)
+        formats = [f.get("format_id") for f in (info or {}).get("formats") or [] if f.get("format_id")]
+        format_types = {
+            f.get("format_id"): (f.get("protocol") or "", f.get("container") or "",
+                                 f.get("vcodec") or "", f.get("acodec") or "")
+            for f in (info or {}).get("formats") or [] if f.get("format_id")
+        }
+
+        cover_folder = None
+        title_folder = os.path.join(self.save_path, sanitized_title)
+        created_folder = not os.path.isdir(title_folder)
+        try:
+            os.makedirs(title_folder, exist_ok=True)
+            self.download_thumbnail_jpg(url, title_folder, title)
+            cover_folder = title_folder
+        except Exception as e:
+            self.log(f"⚠️ 预取封面失败，将在下载时重试: {e}", category="下载")
+
+        return {
+            "url": url,
+            "title": title,
+            "sanitized_title": sanitized_title,
+            "formats": formats,
+            "format_types": format_types,
+            "cover_folder": cover_folder,
+            "title_folder": title_folder,
+            "created_folder": created_folder,
+        }
 
-        # 若当前没有任务在下载，则立即启动队列中的下一个任务
-        if not self.is_downloading:
-            self.start_next_download()
+    def _discard_prefetched(self, result):
+        """
+        任务被取消后清理预取生成的文件（在预取线程或取消时的主线程中调用）：
+        只删除由预取新建的标题文件夹，已存在的文件夹（例如之前下载过同名视频）保持不动
+        """
+        url = result["url"]
+        if url not in [u for u, _ in list(self.download_task_queue)] and url not in self.active_downloads:
+            self.title_cache.pop(url, None)  # 进行中的预取在取消后才写入的标题缓存
+        if not result.get("created_folder"):
+            return
+        if any(cached[1] == result["sanitized_title"] for u, cached in list(self.title_cache.items()) if u != url):
+            return  # 队列中另有同名任务仍会使用该文件夹
+        shutil.rmtree(result["title_folder"], ignore_errors=True)
+        self.log(f"🧹 已删除取消任务的预取文件夹: {result['title_folder']}", category="下载")
 
-    def _prepare_title_for_queue(self, url, filename):
+    def _prepare_title_for_queue(self, url, filename, title=None):
         """
-        在点击下载按钮后，提前获取视频标题，并把下载队列中的 URL 名称替换为“视频标题”。
+        提前获取视频标题（预取时已拿到则直接传入），并把下载队列中的 URL 名称替换为“视频标题”。
         仅更新队列显示和映射，不启动下载。
         """
         try:
-            title = self.get_video_title(url, filename)
+            if title is None:
+                title = self.get_video_title(url, filename)
             if not title:
                 return
 
@@ -1061,42 +4130,118 @@ class SimpleDownloader:  # 创建下载器类
 
     def start_next_download(self):
         """
-        从队列中取出下一个任务并启动下载。
-        确保任意时刻只会有一个下载任务在进行。
+        从队列中取出任务并启动下载，直到占满自适应并发控制给出的槽位。
+        只在主线程调用；被限流暂停的站点会在冷却结束后自动重新调度。
         """
-        # 队列为空，则标记为空闲
-        if not self.download_task_queue:
-            self.is_downloading = False
-            self.current_process = None
-            return
+        while True:
+            index = self._next_startable_task()
+            if index is None:
+                break
 
-        # 取出下一个任务
-        url, format_id = self.download_task_queue.pop(0)
-        self.is_downloading = True
-        # 每次开始新任务时重置下载取消标记
-        self.download_cancelled = False
-
-        # 记录当前正在下载的队列名称（可能是原始文件名，也可能是已经替换为视频标题）
-        cached = self.title_cache.get(url)
-        if cached:
-            _, sanitized_title = cached
-            self.current_downloading_name = sanitized_title
-        else:
-            self.current_downloading_name = url.split("?")[0].split("/")[-1]
+            # 在启动前从全局带宽预算中预留本任务的份额，按现在就能同时进行的下载数平分；
+            # 预算已被正在运行的任务占满时先压低它们（以新限速续传），仍不够则继续排队
+            url = self.download_task_queue[index][0]
+            host = ThrottleController.host_of(url)
+            expected = max(1, min(self.throttle.max_slots, self.throttle.slots(host),
+                                  len(self.active_downloads) + len(self.download_task_queue)))
+            rate = self.bandwidth.acquire(url, expected)
+            if rate is None:
+                self._apply_bandwidth_changes(self.bandwidth.rebalance(len(self.active_downloads) + 1, self._rerate_candidates()))
+                rate = self.bandwidth.acquire(url, expected)
+            if rate is None:
+                if not self.bandwidth_wait_logged:
+                    self.bandwidth_wait_logged = True
+                    self.log(f"🚦 带宽预算已分配完（{format_rate(self.bandwidth.current_budget())}），后续任务等待正在进行的下载结束", category="下载")
+                break
+            self.bandwidth_wait_logged = False
+
+            # 取出任务
+            url, format_id = self.download_task_queue.pop(index)
+
+            # 记录该任务在队列中的名称（可能是原始文件名，也可能是已经替换为视频标题）
+            cached = self.title_cache.get(url)
+            if cached:
+                _, name = cached
+            else:
+                name = url.split("?")[0].split("/")[-1]
+            task = {"name": name, "process": None, "cancelled": False, "host": ThrottleController.host_of(url), "rate": rate}
+            self.active_downloads[url] = task
+
+            # 启动实际下载线程
+            threading.Thread(target=self._download_task, args=(url, format_id, task)).start()
+
+        # 有任务结束或预算时间段变化后，把空出的预算分给仍在运行的任务
+        if self.active_downloads:
+            self._apply_bandwidth_changes(self.bandwidth.rebalance(len(self.active_downloads), self._rerate_candidates()))
+        self.is_downloading = bool(self.active_downloads)
+        # 队列前移后，为新进入预取窗口的任务提交预取
+        self.prefetcher.schedule(self.download_task_queue)
+
+        # 队列里还有任务但所在站点处于限流冷却期：冷却结束后再调度一次
+        if self.download_task_queue and not self.throttle_wakeup_pending:
+            waits = [self.throttle.wait_time(ThrottleController.host_of(url)) for url, _ in self.download_task_queue]
+            delay = min(waits)
+            if delay > 0:
+                self.throttle_wakeup_pending = True
+                self.root.after(int(delay * 1000) + 100, self._throttle_wakeup)
+
+    def _rerate_candidates(self):
+        """
+        可以通过重启 yt-dlp 调整限速的下载：落盘下载（断点续传）且仍在传输阶段；
+        边下边转的数据已经送进 ffmpeg，合并/转封装阶段已不占带宽，这两种都不调整
+        """
+        return [url for url, task in list(self.active_downloads.items())
+                if task["process"] is not None and not task.get("streaming") and not task.get("merging")
+                and not task["cancelled"] and "rerate" not in task]
+
+    def _apply_bandwidth_changes(self, changes):
+        """通知下载线程以新的限速重启 yt-dlp（只在主线程调用）"""
+        for url, rate in changes.items():
+            task = self.active_downloads.get(url)
+            if not task or task["process"] is None:
+                continue
+            task["rerate"] = rate
+            try:
+                PROCESSES.kill(task["process"])
+            except Exception:
+                pass
 
-        # 启动实际下载线程
-        threading.Thread(target=self._download_task, args=(url, format_id)).start()
+    def _throttle_wakeup(self):
+        self.throttle_wakeup_pending = False
+        self.start_next_download()
 
-    def _download_task(self, url, format_id):
+    def _next_startable_task(self):
+        """返回队列中第一个可以立即启动的任务下标，没有则返回 None"""
+        for index, (url, _) in enumerate(self.download_task_queue):
+            # 同一链接已在下载中或后处理中时等待其结束，避免两个任务写同一个文件夹
+            if url in self.active_downloads or url in self.processing_active:
+                continue
+            if self._pipeline_backpressure(url):
+                continue
+            host = ThrottleController.host_of(url)
+            # 下载线程结束时会从 active_downloads 中移除任务，遍历前先取快照
+            active_on_host = sum(1 for t in list(self.active_downloads.values()) if t["host"] == host)
+            if self.throttle.can_start(host, active_on_host, len(self.active_downloads)):
+                return index
+        return None
+
+    def _download_task(self, url, format_id, task):
         """
         实际执行单个视频下载的逻辑。
-        该方法会在独立线程中运行，结束后自动触发下一个队列任务。
+        该方法会在独立线程中运行，结束后释放槽位并自动调度下一个队列任务。
+        :param task: start_next_download 登记在 active_downloads 中的任务状态
         """
         # 根据 URL 生成初始文件名，用于与列表中的“排队中”项对应
         filename = url.split("?")[0].split("/")[-1]
+        host = task["host"]
+        success = False
+        throttled = False
 
         try:
-            # 优先使用预先缓存的标题（在点击下载按钮时已获取）
+            # 领取预取结果（预取仍在进行时会等待其完成，避免重复请求）
+            prefetched = self.prefetcher.claim(url) or {}
+
+            # 优先使用预先缓存的标题（预取阶段已获取）
             cached = self.title_cache.get(url)
             if cached:
                 title, sanitized_title = cached
@@ -1107,12 +4252,13 @@ class SimpleDownloader:  # 创建下载器类
                 self.title_cache[url] = (title, sanitized_title)
 
             # 如果在“获取标题阶段”用户已经点击取消，则直接中止本任务
-            if self.download_cancelled:
+            if task["cancelled"]:
                 self.log(f"⏹️ 已在准备阶段取消当前任务: {filename}", category="下载")
                 return
 
             # 一旦获取到标题，就立刻把队列中对应的 URL 文件名替换为“视频标题”
             # 此时状态也更新为“⬇️ 下载中...”
+            task["name"] = sanitized_title
             self.root.after(0, lambda: self.replace_task(filename, sanitized_title, "⬇️ 下载中..."))
             # 迁移下载信息键：从临时 filename (由URL截取) 改为 sanitized_title，确保后续操作一致
             if filename in self.download_info:
@@ -1122,18 +4268,28 @@ class SimpleDownloader:  # 创建下载器类
             self.log(f"\n⬇️ 开始使用格式 {format_id} 下载视频：{title}", category="下载")
             self.log(f"\nURL：{url}\n", category="下载")
 
+            # 预取阶段拿到了可用格式列表时，提前提示明显不存在的格式编号
+            available_formats = prefetched.get("formats")
+            if available_formats:
+                missing = [f for f in re.split(r"[+/,]", format_id) if re.fullmatch(r"\d+(-\w+)?", f) and f not in available_formats]
+                if missing:
+                    self.log(f"⚠️ 格式编号 {'/'.join(missing)} 不在可用格式列表中，下载可能失败", category="下载")
+
             # 创建以替换后的标题命名的文件夹
             title_folder = os.path.join(self.save_path, sanitized_title)
             os.makedirs(title_folder, exist_ok=True)
 
-            # 下载封面并保存为 JPG
-            try:
-                self.download_thumbnail_jpg(url, title_folder, title)
-            except Exception as e:
-                self.log(f"⚠️ 封面下载失败: {e}", category="下载")
+            # 下载封面并保存为 JPG（预取阶段已下载到同一文件夹时直接复用）
+            if prefetched.get("cover_folder") == title_folder and os.path.exists(os.path.join(title_folder, "封面.jpg")):
+                self.log("🖼️ 封面已预取，跳过封面下载", category="下载")
+            else:
+                try:
+                    self.download_thumbnail_jpg(url, title_folder, title)
+                except Exception as e:
+                    self.log(f"⚠️ 封面下载失败: {e}", category="下载")
 
             # 如果在“下载封面阶段”用户已经点击取消，则直接中止本任务
-            if self.download_cancelled:
+            if task["cancelled"]:
                 self.log(f"⏹️ 封面阶段被取消，未开始实际下载: {sanitized_title}", category="下载")
                 return
 
@@ -1149,119 +4305,342 @@ class SimpleDownloader:  # 创建下载器类
             except Exception:
                 pass
 
+            # 分块大小和分片并发由自动调优给出，分片并发不超过自适应并发控制的当前上限
+            format_type = classify_format(format_id, prefetched.get("format_types"))
+            # 从代理池分配本任务的代理（代理池为空时为 None，沿用系统代理）
+            proxy = self.proxy_pool.acquire(url)
+            chunk_size, fragments = self.tuner.choose(format_type, proxy)
+            fragments = min(fragments, self.throttle.fragments(host))
+
+            # 入队时附带的 EQ 和额外交付文件（MP3/AAC/上传用MP4）在生成 PCM MKV 的同一次 ffmpeg 处理中完成，源文件只解码一次
+            post = self.task_postprocess.pop(url, {})
+            outputs = ["pcm_mkv"] + post.get("outputs", [])
+            # 边下边转：格式可顺序读取时 yt-dlp 直接输出到管道，由 ffmpeg 边接收边转码，不再写出和读回中间文件
+            streaming = (self.stream_transcode_var.get() and url not in self.stream_fallback
+                         and can_stream_format(format_id, prefetched.get("format_types")))
+
             # 合并后的中间文件命名为 "原视频.扩展名"
             merged_output_tmpl = os.path.join(title_folder, "原视频.%(ext)s")
-            dl_cmd = [
-                self.yt_dlp_path,
-                "-f", format_id,                   # 可传 "137+140" 或单一整合格式
+            output_args = ["--output", "-"] if streaming else [
                 "--remux-video", "mp4",           # 强制封装为 MP4（尽可能不转码）
                 "--output", merged_output_tmpl,
+            ]
+            dl_cmd = [
+                "yt-dlp",
+                "-f", format_id,                   # 可传 "137+140" 或单一整合格式
+                *output_args,
                 url,
                 "--no-post-overwrites",
                 "--retries", "5",                 # 适中的重试次数
                 "--fragment-retries", "5",        # 片段重试次数
                 "--socket-timeout", "30",         # 设置socket超时
-                "--http-chunk-size", "5242880",   # 5MB块大小，更稳定
+                "--http-chunk-size", str(chunk_size),  # 分块大小，默认 5MB，由自动调优按吞吐量调整
                 "--buffer-size", "32768",         # 适中的缓冲区
-                "--concurrent-fragments", "1",    # 单线程下载，最稳定
+                "--concurrent-fragments", str(fragments),  # 分片并发，初始为 1
                 "--sleep-interval", "1",          # 请求间隔1秒
                 "--max-sleep-interval", "3",      # 最大间隔5秒
-            ]
-            if self.cookies_path and self.cookies_valid:
-                dl_cmd += ["--cookies", self.cookies_path]
-                self.log("🍪 使用cookies进行下载", category="下载")
+            ] + self._ffmpeg_location_args()
+            # 从账号池分配本任务使用的 cookies，并发任务会分散到不同账号
+            cookies = self.cookie_pool.acquire(url)
+            if cookies:
+                dl_cmd += ["--cookies", cookies]
+                self.log(f"🍪 使用cookies进行下载：{self.cookie_pool.label(cookies)}", category="下载")
             else:
                 self.log("ℹ️ 未使用cookies进行下载", category="下载")
 
+            if proxy:
+                dl_cmd += ["--proxy", proxy]
+                self.log(f"🌐 使用代理：{self.proxy_pool.describe(proxy)}", category="下载")
+
+            # 启动时已从全局带宽预算中预留的份额；运行中预算重新分配时以新限速重启（断点续传）
+            rate = task["rate"]
+            self.log(f"🚦 本任务限速：{format_rate(rate)}", category="下载")
+            self.log(f"🔀 并发状态：{self.throttle.describe(host)}", category="下载")
+            self.log(f"🎛️ 传输参数（{format_type}）：分块 {chunk_size // TransferTuner.MB}MB，分片并发 {fragments}", category="下载")
+
             self.log("", category="下载")
             self.log("⬇️ yt-dlp 下载开始\n\n", category="下载")
 
-            creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-            dl_process = subprocess.Popen(
-                dl_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                errors='ignore',
-                creationflags=creationflags
-            )
-            self.current_process = dl_process
+            output_lines = []  # 保存完成行，用于统计吞吐量
+            proxy_error = False
+            account_error = False
 
-            def log_output(process):
+            def log_output(stream):
+                nonlocal throttled, proxy_error, account_error
                 try:
-                    for line in iter(process.stdout.readline, ''):
+                    for line in iter(stream.readline, ''):
                         if line:
-                            self.log(line.strip(), category="下载")
-                            self.root.after(0, lambda l=line: self.update_download_status(l.strip()))
+                            line = line.strip()
+                            if line.startswith("[download] 100"):
+                                output_lines.append(line)
+                            if line.startswith(("[Merger]", "[VideoRemuxer]", "[FixupM3u8]")):
+                                task["merging"] = True  # 已进入本地合并阶段，不再需要调整限速
+                            if proxy and ProxyPool.PROXY_ERROR_PATTERN.search(line):
+                                proxy_error = True
+                            if cookies and CookiePool.ACCOUNT_ERROR_PATTERN.search(line):
+                                account_error = True
+                            if self.throttle.observe(host, line) and not throttled:
+                                throttled = True
+                                self.log(f"🐢 检测到限流信号，降低并发：{self.throttle.describe(host)}", category="下载")
+                            # 多个任务并行时，在每行前加上任务名，便于区分
+                            if len(self.active_downloads) > 1:
+                                line = f"[{sanitized_title[:20]}] {line}"
+                            self.log(line, category="下载")
+                            self.root.after(0, lambda l=line: self.update_download_status(l))
                 except ValueError:
                     self.log("日志读取过程中发生错误，文件描述符已关闭。", category="下载")
 
-            dl_thread = threading.Thread(target=log_output, args=(dl_process,))
-            dl_thread.start()
-            dl_process.wait()
-            dl_thread.join()
-            dl_process.stdout.close()
-
-            if dl_process.returncode != 0:
+            task["streaming"] = streaming
+            rerated = False
+            while True:
+                run_cmd = dl_cmd + (["--limit-rate", str(rate)] if rate else [])
+                transcoder = None
+                if streaming:
+                    # yt-dlp 的视频数据走 stdout 直接交给 ffmpeg，进度信息走 stderr 用于日志
+                    ffmpeg_cmd, output_paths = build_transcode_command(
+                        "pipe:0", os.path.join(title_folder, sanitized_title), outputs, post.get("eq"))
+                    self.log("🔀 边下边转：yt-dlp 输出直接送入 ffmpeg，不生成中间文件\n", category="下载")
+                    # 先启动 ffmpeg（线程预算被 EQ/转码任务占满时在这里等待），再启动 yt-dlp：
+                    # 否则 yt-dlp 已在下载而管道无人读取，写满后停顿，可能因 --socket-timeout 失败
+                    transcoder = self.ffmpeg.start(ffmpeg_cmd, key=url, stdin=subprocess.PIPE)
+                    if task["cancelled"]:
+                        transcoder.cancel()
+                        self.ffmpeg.finish(transcoder)
+                        self.log(f"⏹️ 已在准备阶段取消当前任务: {filename}", category="下载")
+                        return
+                    try:
+                        dl_process = PROCESSES.popen(run_cmd, stdout=transcoder.process.stdin, stderr=subprocess.PIPE)
+                    except Exception:
+                        transcoder.cancel()
+                        self.ffmpeg.finish(transcoder)
+                        raise
+                    transcoder.process.stdin.close()  # 只由 yt-dlp 持有管道写端，yt-dlp 退出时 ffmpeg 能收到输入结束
+                    log_stream = io.TextIOWrapper(dl_process.stderr, errors='ignore')
+                else:
+                    dl_process = PROCESSES.popen(
+                        run_cmd,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.STDOUT,
+                        text=True,
+                        errors='ignore'
+                    )
+                    log_stream = dl_process.stdout
+                task["process"] = dl_process
+
+                dl_thread = threading.Thread(target=log_output, args=(log_stream,))
+                dl_thread.start()
+                dl_process.wait()
+                dl_thread.join()
+                log_stream.close()
+                new_rate = task.pop("rerate", None)
+                if new_rate is None or dl_process.returncode == 0 or task["cancelled"]:
+                    break
+                # 被带宽重新分配打断：以新的限速重新启动，yt-dlp 从已下载的部分续传
+                rate = new_rate
+                rerated = True
+                self.log(f"🚦 带宽重新分配，本任务限速调整为 {format_rate(rate)}，续传中\n", category="下载")
+            stream_failed = False
+            if transcoder:
+                if task["cancelled"]:
+                    transcoder.cancel()
+                self.ffmpeg.finish(transcoder)
+                # 转码失败即回退，不论 yt-dlp 的退出码（ffmpeg 先退出时 yt-dlp 常因管道断开而失败）
+                stream_failed = transcoder.process.returncode != 0 and not task["cancelled"]
+            # 后续只做本地转封装，不再占用带宽
+            self.bandwidth.release(url)
+
+            # 续传后的完成行只反映最后一段的耗时，吞吐量不可信
+            throughput = None if rerated else parse_download_throughput(output_lines)
+            # 归还代理并按本次结果更新评分（只有代理本身出错才计入错误率）
+            self.proxy_pool.release(url, success=dl_process.returncode == 0, throughput=throughput,
+                                    proxy_error=dl_process.returncode != 0 and proxy_error)
+            # 归还账号；出现登录失效或限流的账号停用一段时间，后续任务轮换到其它账号
+            if cookies and (account_error or throttled):
+                self.log(f"🍪 {self.cookie_pool.label(cookies)} 出现登录失效或限流，暂时停用", category="下载")
+            self.cookie_pool.release(url, bench=bool(cookies) and (account_error or throttled))
+
+            if stream_failed:
+                # 管道转码失败（容器实际不支持顺序读取、ffmpeg 先退出导致 yt-dlp 管道断开等）：该任务改走落盘流程重试
+                self.log(f"⚠️ 边下边转失败：{transcoder.error_summary()}，改为先下载再转码", category="下载")
+                self.stream_fallback.add(url)
+
+            if dl_process.returncode != 0 or stream_failed:
+                # 因限流、代理故障、账号失效或边下边转失败且不是用户取消：放回队列最前面自动重试（最多 2 次）
+                # 限流会在冷却结束后重试；代理故障/账号失效会换用其它代理/账号
+                if (throttled or proxy_error or account_error or stream_failed) and not task["cancelled"] and self.retry_counts.get(url, 0) < 2:
+                    self.retry_counts[url] = self.retry_counts.get(url, 0) + 1
+                    if post:
+                        self.task_postprocess[url] = post  # 重试时沿用入队时的后处理选项
+                    reason = "限流" if throttled else ("代理故障" if proxy_error else ("账号失效" if account_error else "边下边转失败"))
+                    self.log(f"⏳ 下载因{reason}失败，稍后自动重试（第 {self.retry_counts[url]} 次）\n", category="下载")
+                    self.root.after(0, lambda: self.download_task_queue.insert(0, (url, format_id)))
+                    self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, f"⏳ {reason}，稍后重试..."))
+                    return
                 self.log("❌ 下载失败\n", category="下载")
+                self.stream_fallback.discard(url)
                 # 此时队列前缀已经被替换为标题（sanitized_title），这里用标题来更新状态
                 self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, "❌ 下载失败"))
                 return
 
+            success = True
+            self.retry_counts.pop(url, None)
+            self.stream_fallback.discard(url)
+            # 记录本次吞吐量供自动调优学习；被站点限流或受带宽预算限速时测到的是限制值而不是网络能力，不记录
+            if throughput:
+                if not throttled and not rate:
+                    self.tuner.record(format_type, proxy, chunk_size, fragments, throughput)
+                self.log(f"📈 本次平均吞吐：{format_rate(int(throughput))}", category="下载")
             self.log("\n✅ 下载完成\n", category="下载")
             self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, "✅ 下载完成\n"))
 
-            # 检测合并后文件的实际扩展名（mp4/mkv/webm）
-            merged_path = None
-            for ext in [".mp4", ".mkv", ".webm", ".mov"]:
-                candidate = os.path.join(title_folder, f"原视频{ext}")
-                if os.path.exists(candidate):
-                    merged_path = candidate
-                    break
-            if not merged_path:
-                self.log("❌ 未找到下载后的视频文件", category="下载")
-                # 队列里显示的也是标题，保持一致更新
-                self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, "❌ 下载文件缺失"))
-                return
+            # 后处理交给独立的处理阶段，下载槽位随即释放给后续任务（流水线）
+            if streaming:
+                self.log(f"✅ 边下边转完成，PCM音视频流: {output_paths['pcm_mkv']}\n", category="下载")
+                self._complete_download(url, title, sanitized_title, output_paths, post)
+            else:
+                self.process_queue.append((url, title, sanitized_title, title_folder, post, outputs))
+                self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, "⏳ 等待后处理..."))
+                self.root.after(0, self._pump_process_stage)
+        finally:
+            # 标记当前下载结束，释放槽位并自动拉起下一个任务
+            self.bandwidth.release(url)
+            self.proxy_pool.release(url)
+            self.cookie_pool.release(url)
+            self.throttle.task_finished(host, success, throttled)
+            self.active_downloads.pop(url, None)
+            task["process"] = None
+            # 在主线程调度下一个任务，避免线程直接操作 Tk
+            self.root.after(0, self.start_next_download)
 
-            # 按批处理方式生成 hi-res MKV：复制视频流，音频转 PCM 32bit/48kHz/2ch，+genpts
-            mkv_output_path = os.path.join(title_folder, f"{sanitized_title}.mkv")
-            self.log("🔄 开始生成PCM音视频流\n", category="下载")
-            ffmpeg_cmd = [
-                "ffmpeg",
-                "-loglevel", "info",
-                "-i", merged_path,
-                "-c:v", "copy",
-                "-c:a", "pcm_s32le",
-                "-ar", "48000",
-                "-ac", "2",
-                "-fflags", "+genpts",
-                "-y",
-                mkv_output_path
-            ]
-            subprocess.run(ffmpeg_cmd, shell=True)
-            self.log(f"✅ PCM音视频流生成完成: {mkv_output_path}\n", category="下载")
-            self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, "✅ PCM音视频流生成完成"))
+    def _pump_process_stage(self):
+        """
+        后处理阶段（PCM/转封装、EQ、附加输出）：按并发上限从处理队列取任务执行。
+        只在主线程调用；每完成一个任务会重新调度下载（解除背压）和本阶段。
+        """
+        while self.process_queue and len(self.processing_active) < self.process_workers:
+            job = self.process_queue.pop(0)
+            self.processing_active[job[0]] = {"name": job[2], "cancelled": False}
+            threading.Thread(target=self._process_stage_worker, args=job, daemon=True).start()
 
-            # 重命名为标题名（与你原逻辑一致）
-            try:
-                sanitized_title = self.sanitize_path(title)
-                new_name = os.path.join(self.save_path, sanitized_title, f"{sanitized_title}.mkv")
-                os.rename(mkv_output_path, new_name)
-                self.log(f"✅ 文件已重命名为: {new_name}\n", category="下载")
-                # 下载成功后额外空三行，方便在日志中分隔不同任务
-                self.log("✅ 下载成功\n\n\n", category="下载")
-                self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, "✅ 下载成功"))
-            except Exception as e:
-                self.log(f"⚠️ 重命名失败，但已生成 PCM音视频流: {mkv_output_path}，错误：{e}", category="下载")
+    def _process_stage_worker(self, url, title, sanitized_title, title_folder, post, outputs):
+        try:
+            self._process_download(url, title, sanitized_title, title_folder, post, outputs)
+        except Exception as e:
+            self.log(f"❌ 后处理失败: {e}", category="下载")
+            self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, "❌ 后处理失败"))
         finally:
-            # 标记当前下载结束，并自动拉起下一个任务
-            self.is_downloading = False
-            self.current_process = None
-            self.current_downloading_name = None
-            # 在主线程调度下一个任务，避免线程直接操作 Tk
+            self.processing_active.pop(url, None)
+            self.root.after(0, self._pump_process_stage)
             self.root.after(0, self.start_next_download)
 
+    def _process_download(self, url, title, sanitized_title, title_folder, post, outputs):
+        """把下载得到的 原视频.* 转为 PCM MKV（同时套用 EQ、生成附加输出），成功后进入上传阶段"""
+        # 检测合并后文件的实际扩展名（mp4/mkv/webm）
+        merged_path = None
+        for ext in [".mp4", ".mkv", ".webm", ".mov"]:
+            candidate = os.path.join(title_folder, f"原视频{ext}")
+            if os.path.exists(candidate):
+                merged_path = candidate
+                break
+        if not merged_path:
+            self.log("❌ 未找到下载后的视频文件", category="下载")
+            # 队列里显示的也是标题，保持一致更新
+            self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, "❌ 下载文件缺失"))
+            return
+
+        # 取消可能发生在探测、等待线程预算等任何环节，由 cancel_download 在这里留下标记
+        state = self.processing_active.get(url, {})
+
+        # 按批处理方式生成 hi-res MKV：复制视频流，音频转 PCM 32bit/48kHz/2ch，+genpts
+        has_audio = probe_has_audio(merged_path)
+        ffmpeg_cmd, output_paths = build_transcode_command(
+            merged_path, os.path.join(title_folder, sanitized_title), outputs, post.get("eq"), has_audio=has_audio)
+        mkv_output_path = output_paths["pcm_mkv"]
+        self.log("🔄 开始生成PCM音视频流\n", category="下载")
+        if not has_audio:
+            self.log("ℹ️ 源文件没有音轨，只转封装视频（跳过EQ和纯音频输出）", category="下载")
+        elif post.get("eq"):
+            self.log(f"🎚️ 同时套用EQ: {post['eq']}", category="下载")
+        if len(output_paths) > 1:
+            self.log(f"📦 同时生成: {'、'.join(DELIVERABLES[key][0] for key in output_paths if key != 'pcm_mkv')}", category="下载")
+        duration = probe_duration(merged_path)
+        if state.get("cancelled"):
+            self.log(f"⏹️ 已取消转码: {sanitized_title}", category="下载")
+            return
+        job = self.ffmpeg.start(ffmpeg_cmd, key=url, duration=duration,
+                                on_progress=self._transcode_progress_reporter(sanitized_title))
+        if state.get("cancelled"):
+            job.cancel()  # 等待线程预算期间被取消
+        self.ffmpeg.finish(job)
+        if job.process.returncode != 0:
+            if job.cancelled:
+                self.log(f"⏹️ 已取消转码: {sanitized_title}", category="下载")
+                return
+            self.log(f"❌ PCM音视频流生成失败: {job.error_summary()}", category="下载")
+            self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, "❌ 转码失败"))
+            return
+        if state.get("cancelled"):
+            self.log(f"⏹️ 已取消: {sanitized_title}（转码已完成，不再重命名和上传）", category="下载")
+            return
+        self.log(f"✅ PCM音视频流生成完成: {mkv_output_path}\n", category="下载")
+        self._complete_download(url, title, sanitized_title, output_paths, post)
+
+    def _complete_download(self, url, title, sanitized_title, output_paths, post):
+        """记录各输出文件、重命名 PCM MKV，任务要求自动上传时交给上传阶段"""
+        mkv_output_path = output_paths["pcm_mkv"]
+        for key, path in output_paths.items():
+            if key != "pcm_mkv":
+                state = "✅" if os.path.exists(path) else "❌ 未生成"
+                self.log(f"{state} {DELIVERABLES[key][0]}: {path}", category="下载")
+        self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, "✅ PCM音视频流生成完成"))
+
+        # 重命名为标题名（与你原逻辑一致）
+        try:
+            sanitized_title = self.sanitize_path(title)
+            new_name = os.path.join(self.save_path, sanitized_title, f"{sanitized_title}.mkv")
+            os.rename(mkv_output_path, new_name)
+            self.log(f"✅ 文件已重命名为: {new_name}\n", category="下载")
+            # 下载成功后额外空三行，方便在日志中分隔不同任务
+            self.log("✅ 下载成功\n\n\n", category="下载")
+            self.root.after(0, lambda: self.replace_task(sanitized_title, sanitized_title, "✅ 下载成功"))
+        except Exception as e:
+            self.log(f"⚠️ 重命名失败，但已生成 PCM音视频流: {mkv_output_path}，错误：{e}", category="下载")
+            new_name = mkv_output_path
+        if post.get("upload") and os.path.exists(new_name):
+            self.root.after(0, lambda: self._enqueue_pipeline_upload(new_name, title))
+
+    def _enqueue_pipeline_upload(self, path, title):
+        """流水线上传阶段：把处理好的视频连同下载时保存的 封面.jpg 加入B站上传队列（只在主线程调用）"""
+        folder_cover = os.path.join(os.path.dirname(path), "封面.jpg")
+        cover = folder_cover if os.path.exists(folder_cover) else (find_cover_near(path) or "")
+        item_id = self.bili_queue.add(path, title=title, cover=cover, tags=self.bili_tags_entry.get().strip())
+        self.pipeline_upload_ids.add(item_id)
+        self.log(f"📺 已加入B站上传队列: {title}", category="下载")
+        self._pump_bili_uploads()
+
+    def _pipeline_backpressure(self, url):
+        """
+        流水线背压：后处理积压过多时暂停启动新下载；
+        需要自动上传的任务在上传队列积压过多时也先等待，避免下载远远跑在上传前面占满磁盘。
+        上传积压只统计本次运行由流水线加入的条目，且只在 biliup 可用（上传会真正进行）时生效；
+        任务被暂缓时记录原因（同一原因只记录一次）
+        """
+        reason = None
+        if len(self.process_queue) + len(self.processing_active) >= self.process_workers * 2:
+            reason = f"后处理积压已达上限（{self.process_workers * 2} 个）"
+        elif (self.task_postprocess.get(url, {}).get("upload")
+              and self.biliup_exe_path and self.biliup_cookies_path):
+            pending = self.bili_queue.counts(self.pipeline_upload_ids).get("pending", 0)
+            if pending >= self.pipeline_upload_backlog:
+                reason = f"上传队列中等待上传的流水线任务已达上限（{self.pipeline_upload_backlog} 个）"
+        if reason is None:
+            self.backpressure_reasons.pop(url, None)
+            return False
+        if self.backpressure_reasons.get(url) != reason:
+            self.backpressure_reasons[url] = reason
+            self.log(f"⏸️ 暂缓启动 {url}：{reason}", category="下载")
+        return True
+
     def retry_download(self):
         selected = self.download_queue_listbox.curselection()
         if selected:
@@ -1295,27 +4674,34 @@ class SimpleDownloader:  # 创建下载器类
             task = self.download_queue_listbox.get(selected[0])
             filename = task.split(":")[0]
 
-            # 只有当选中的这一条，正好是当前正在下载的任务时，才去终止下载进程
-            if filename == self.current_downloading_name and self.current_process:
-                # 标记取消，供“获取标题/获取封面”阶段使用
-                self.download_cancelled = True
-                try:
-                    if psutil is not None:
-                        parent = psutil.Process(self.current_process.pid)
-                        for child in parent.children(recursive=True):
-                            child.kill()
-                        parent.kill()
-                    else:
-                        # 未安装 psutil 时，直接终止当前进程
-                        self.current_process.terminate()
-                    self.log(f"⛔ 已经取消下载任务 {filename}", category="下载")
-                except Exception as e:
-                    self.log(f"❌ 无法取消下载任务: {e}", category="下载")
-                self.current_process = None
+            # 只有当选中的这一条正好是正在下载的任务时，才去终止对应的下载进程
+            # 下载线程会并发地从 active_downloads 中移除任务，这里遍历的是快照
+            active = list(self.active_downloads.items())
+            task = next((t for _, t in active if t["name"] == filename), None)
+            if task:
+                # 标记取消，供“获取标题/获取封面”阶段使用；正在转码则一并终止 ffmpeg
+                task["cancelled"] = True
+                self.ffmpeg.cancel(next((u for u, t in active if t is task), None))
+                process = task["process"]
+                if process:
+                    try:
+                        # 结束 yt-dlp 及其启动的 ffmpeg 等整棵进程树
+                        PROCESSES.kill(process)
+                        self.log(f"⛔ 已经取消下载任务 {filename}", category="下载")
+                    except Exception as e:
+                        self.log(f"❌ 无法取消下载任务: {e}", category="下载")
 
             # 尝试从内部队列中也移除对应任务（3.4 中没有这部分，这里做个兼容清理即可）
             url, _ = self.get_download_info(filename)
             if url:
+                # 丢弃尚未被领取的预取和后处理选项；已进入后处理阶段的任务一并取消
+                self.prefetcher.discard(url)
+                self.task_postprocess.pop(url, None)
+                self.process_queue = [job for job in self.process_queue if job[0] != url]
+                processing = self.processing_active.get(url)
+                if processing:
+                    processing["cancelled"] = True
+                self.ffmpeg.cancel(url)
                 # 从内部任务队列中移除对应的任务
                 for i, item in enumerate(self.download_task_queue):
                     if isinstance(item, (list, tuple)) and len(item) >= 1 and item[0] == url:
@@ -1332,21 +4718,44 @@ class SimpleDownloader:  # 创建下载器类
             self.log(f"下载任务已从队列中移除: {filename}", category="下载")
 
     def update_download_status(self, line):
-        if self.current_process:
+        if self.active_downloads:
             self.root.after(0, lambda: self.download_log_text.config(state="normal"))
             self.download_log_text.insert(tk.END, line + "\n")
             self.download_log_text.config(state="disabled")
 
+    def _proxy_args(self):
+        """标题/格式/封面等元数据请求使用代理池中当前最优的代理；代理池为空时沿用系统代理"""
+        proxy = self.proxy_pool.best()
+        return ["--proxy", proxy] if proxy else []
+
+    def get_video_info(self, url):
+        """通过 yt-dlp -J 获取视频元数据（标题、格式列表、缩略图等），失败返回 None"""
+        try:
+            cmd = ["yt-dlp", "-J", url] + self._proxy_args()
+            # 只有存在可用的 cookies 账号时才使用cookies（多账号时轮换）
+            cookies = self.cookie_pool.pick()
+            if cookies:
+                cmd += ["--cookies", cookies]
+            env = os.environ.copy()
+            env['PYTHONIOENCODING'] = 'utf-8'
+            result = PROCESSES.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', env=env)
+            if result.returncode == 0:
+                return json.loads(result.stdout)
+            self.log(f"获取视频信息失败: {result.stderr}", category="下载")
+        except Exception as e:
+            self.log(f"获取视频信息失败: {e}", category="下载")
+        return None
+
     def get_video_title(self, url, filename):
         try:
-            cmd = [self.yt_dlp_path, "--get-title", url]
-            # 只有在cookies路径存在且cookies有效时才使用cookies
-            if self.cookies_path and self.cookies_valid:
-                cmd += ["--cookies", self.cookies_path]
-            creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            cmd = ["yt-dlp", "--get-title", url] + self._proxy_args()
+            # 只有存在可用的 cookies 账号时才使用cookies（多账号时轮换）
+            cookies = self.cookie_pool.pick()
+            if cookies:
+                cmd += ["--cookies", cookies]
             env = os.environ.copy()
             env['PYTHONIOENCODING'] = 'utf-8'
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', creationflags=creationflags, env=env)
+            result = PROCESSES.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', env=env)
             if result.returncode == 0:
                 title = result.stdout.strip()
                 return title
@@ -1357,26 +4766,31 @@ class SimpleDownloader:  # 创建下载器类
             self.log(f"获取视频标题失败: {e}", category="下载")
             return filename
 
+    def _ffmpeg_location_args(self):
+        """让 yt-dlp 的合并/转封装使用工具链登记表中的同一个 ffmpeg"""
+        tool = TOOLS.get("ffmpeg")
+        return ["--ffmpeg-location", tool["path"]] if tool else []
+
     def download_thumbnail_jpg(self, url, title_folder, expected_title):
         # 使用 yt-dlp 写缩略图并转换为 jpg，然后重命名为 cover.jpg
         # 输出模板到标题文件夹，避免污染其它位置
         self.log("🖼️ 正在获取封面...", category="下载")  # 新增：开始日志
         out_tmpl = os.path.join(title_folder, "%(title)s.%(ext)s")
         cmd = [
-            self.yt_dlp_path,
+            "yt-dlp",
             "--skip-download",
             "--write-thumbnail",
             "--convert-thumbnails", "jpg",
             "-o", out_tmpl,
             url
-        ]
-        # 只有在cookies路径存在且cookies有效时才使用cookies
-        if self.cookies_path and self.cookies_valid:
-            cmd += ["--cookies", self.cookies_path]
-        creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        ] + self._proxy_args() + self._ffmpeg_location_args()
+        # 只有存在可用的 cookies 账号时才使用cookies（多账号时轮换）
+        cookies = self.cookie_pool.pick()
+        if cookies:
+            cmd += ["--cookies", cookies]
         env = os.environ.copy()
         env['PYTHONIOENCODING'] = 'utf-8'
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', creationflags=creationflags, env=env)
+        result = PROCESSES.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace', env=env)
 
         if result.returncode != 0:
             self.log(f"❌ 封面下载失败：{result.stderr.strip() or 'yt-dlp 缩略图提取失败'}", category="下载")  # 新增：失败日志
@@ -1429,6 +4843,28 @@ class SimpleDownloader:  # 创建下载器类
                 self.download_queue_listbox.insert(i, f"{new_title}: {status}")  # 插入新任务
                 break  # 跳出循环
 
+    def _transcode_progress_reporter(self, name):
+        """生成 ffmpeg 进度回调：每秒最多把进度（百分比/速度）更新到队列中的该任务一次"""
+        last = [0.0]
+
+        def report(info):
+            now = time.time()
+            if info["done"] or now - last[0] < 1:
+                return
+            last[0] = now
+            parts = []
+            if info["percent"] is not None:
+                parts.append(f"{info['percent']:.0f}%")
+            elif info["time"] is not None:
+                parts.append(f"{int(info['time'])}s")
+            if info["speed"]:
+                parts.append(f"{info['speed']:.1f}x")
+            if info["fps"]:
+                parts.append(f"{info['fps']:.0f}fps")
+            status = "🔄 转码中 " + " ".join(parts)
+            self.root.after(0, lambda: self.replace_task(name, name, status))
+        return report
+
     def merge_audio_video_to_mkv(self, video_path, audio_path, mkv_output_path, audio_path_for_ffmpeg, title, filename,output_audio_path):  # 合并音频和视频
         try:
             # 使用 ffmpeg 合并音频和视频
@@ -1443,7 +4879,10 @@ class SimpleDownloader:  # 创建下载器类
                 "-y",
                 mkv_output_path
             ]
-            subprocess.run(ffmpeg_cmd, shell=True)
+            job = self.ffmpeg.run(ffmpeg_cmd, key=title, duration=probe_duration(video_path),
+                                  on_progress=self._transcode_progress_reporter(title))
+            if job.process.returncode != 0:
+                raise RuntimeError(job.error_summary())
             self.log(f"✅ 音频和视频已合并为: {mkv_output_path}\n", category="下载")
             self.root.after(0, lambda: self.replace_task(title, title, "✅ 合并音频和视频完成"))
 
@@ -1476,15 +4915,9 @@ class SimpleDownloader:  # 创建下载器类
         def run_check():
             try:
                 self.log("🔍 检测 yt-dlp 版本中...", category="下载")
-                # 检查 APPDATA/YTBDownloader 下是否有 yt-dlp.exe
-                if os.path.exists(self.yt_dlp_path):
-                    creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-                    env = os.environ.copy()
-                    env['PYTHONIOENCODING'] = 'utf-8'
-                    result = subprocess.run([self.yt_dlp_path, "--version"], capture_output=True, text=True, encoding='utf-8', errors='replace', creationflags=creationflags, env=env)
-                    current_version_line = result.stdout.splitlines()[0] if result.returncode == 0 else ""
-                else:
-                    current_version_line = ""
+                # 版本号取自工具链登记表（yt-dlp.exe 未变化时不再重复运行 --version）
+                tool = TOOLS.get("yt-dlp")
+                current_version_line = tool["version"] if tool else ""
                 current_version_match = re.search(r'\d+\.\d+\.\d+', current_version_line)
                 current_version = current_version_match.group(0) if current_version_match else "未知版本"
 
@@ -1498,7 +4931,7 @@ class SimpleDownloader:  # 创建下载器类
                 def normalize_version(ver):
                     return ".".join(str(int(x)) for x in ver.split(".")) if ver and ver != "未知版本" else ver
 
-                if (not os.path.exists(self.yt_dlp_path)) or (normalize_version(current_version) != normalize_version(latest_version)):
+                if (not tool) or (normalize_version(current_version) != normalize_version(latest_version)):
                     # 不是最新版本或没有
                     self.root.after(0, lambda: self.log(f"❌ yt-dlp 不存在或不是最新版本 (当前: {current_version}, 最新: {latest_version})，正在下载...", category="下载"))
                     self.download_yt_dlp_exe()
@@ -1535,60 +4968,41 @@ class SimpleDownloader:  # 创建下载器类
     def download_yt_dlp_exe(self, system32=False):
         def run_download():
             try:
-                # 下载前先检测并添加 PATH
-                save_dir = os.path.join(os.getenv("APPDATA"), "YTBDownloader")
+                # 下载前先检测并添加 PATH（配置目录中会同步一份当前版本的 yt-dlp.exe）
                 path_env = os.environ.get("PATH", "")
                 path_dirs = [os.path.normcase(os.path.normpath(p)) for p in path_env.split(";") if p]
-                save_dir_norm = os.path.normcase(os.path.normpath(save_dir))
-                if save_dir_norm not in path_dirs:
-                    self.add_to_user_path(save_dir)
-
-                save_path = os.path.join(save_dir, "yt-dlp.exe")
-                if os.path.exists(save_path):
-                    try:
-                        os.remove(save_path)
-                    except Exception as e:
-                        self.root.after(0, lambda: self.download_log_text.config(state="normal"))
-                        self.root.after(0, lambda: self.download_log_text.insert(
-                            tk.END, f"❌ 无法删除旧的 yt-dlp.exe: {e}\n请手动关闭所有 yt-dlp 相关程序并删除该文件后重试。\n"))
-                        self.root.after(0, lambda: self.download_log_text.config(state="disabled"))
-                        return
+                if os.path.normcase(os.path.normpath(CONFIG_DIR)) not in path_dirs:
+                    self.add_to_user_path(CONFIG_DIR)
 
                 self.root.after(0, lambda: self.download_log_text.config(state="normal"))
                 self.root.after(0, lambda: self.download_log_text.insert(tk.END, f"🔄 正在下载最新的 yt-dlp.exe...\n"))
                 self.root.after(0, lambda: self.download_log_text.config(state="disabled"))
 
-                url = "https://github.com/yt-dlp/yt-dlp/releases/latest/download/yt-dlp.exe"
-                response = requests.get(url, stream=True)
-                response.raise_for_status()
-
-                total_size = int(response.headers.get('content-length', 0))
-                downloaded = 0
-                chunk_size = 8192
                 start_time = time.time()
 
                 # 创建进度条
                 self.root.after(0, lambda: self.create_download_progressbar())
 
-                with open(save_path, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=chunk_size):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            percent = int(downloaded * 100 / total_size) if total_size else 0
-                            elapsed = time.time() - start_time
-                            speed = downloaded / elapsed if elapsed > 0 else 0
-                            remain = (total_size - downloaded) / speed if speed > 0 else 0
-                            # 更新进度条和剩余时间
-                            self.root.after(0, lambda p=percent, r=remain: self.update_download_progressbar(p, r))
-
-                # 下载完成后移除进度条
-                self.root.after(0, self.remove_download_progressbar)
-
-                install_path = save_path
+                def progress(downloaded, total_size):
+                    percent = int(downloaded * 100 / total_size) if total_size else 0
+                    elapsed = time.time() - start_time
+                    speed = downloaded / elapsed if elapsed > 0 else 0
+                    remain = (total_size - downloaded) / speed if speed > 0 else 0
+                    # 更新进度条和剩余时间
+                    self.root.after(0, lambda p=percent, r=remain: self.update_download_progressbar(p, r))
+
+                # 新版本装入单独的版本目录后再切换，旧版本保留：正在运行的下载不受影响，更新失败时当前版本仍可用
+                try:
+                    version = install_yt_dlp(progress)
+                finally:
+                    # 下载完成后移除进度条
+                    self.root.after(0, self.remove_download_progressbar)
+
+                install_path = STORE.current_dir("yt-dlp")
                 self.root.after(0, lambda: self.download_log_text.config(state="normal"))
-                self.root.after(0, lambda: self.download_log_text.insert(tk.END, f"✅ yt-dlp.exe 已成功下载并安装到：{install_path} 路径\n"))
+                self.root.after(0, lambda: self.download_log_text.insert(tk.END, f"✅ yt-dlp.exe {version} 已成功下载并安装到：{install_path} 路径\n"))
                 self.root.after(0, lambda: self.download_log_text.config(state="disabled"))
+                self.root.after(0, self.refresh_tool_versions)
                 # 下载完成后再次检测是否为最新版本
                 self.root.after(0, self.check_and_update_yt_dlp)
             except Exception as e:
@@ -1599,6 +5013,37 @@ class SimpleDownloader:  # 创建下载器类
 
         threading.Thread(target=run_download).start()
 
+    def refresh_tool_versions(self):
+        """在后台读取工具链版本和 yt-dlp 路径并刷新设置页的显示（首次检测可能要运行版本探测，不能阻塞界面）"""
+        if not hasattr(self, "tool_versions_label"):
+            return
+        versions_label, path_label = self.tool_versions_label, self.yt_dlp_install_label
+
+        def show(label, text):
+            # 设置页可能已在检测期间关闭
+            if label.winfo_exists():
+                label.config(text=text)
+
+        def run():
+            parts = []
+            entries = {tool: TOOLS.get(tool) for tool in ("yt-dlp", "ffmpeg")}
+            for tool, entry in entries.items():
+                parts.append(f"{tool} {entry['version'] if entry else '未找到'}")
+            text = "，".join(parts)
+            path = entries["yt-dlp"]["path"] if entries["yt-dlp"] else "未找到 yt-dlp"
+            self.root.after(0, lambda: (show(versions_label, text), show(path_label, path)))
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def rollback_tool(self, tool):
+        """把本程序安装的 yt-dlp/ffmpeg 切回上一个版本（正在运行的任务继续使用原版本）"""
+        version = STORE.rollback(tool)
+        if version:
+            self.log(f"↩️ {tool} 已回滚到 {version}", category="下载")
+        else:
+            self.log(f"ℹ️ {tool} 没有可回滚的旧版本", category="下载")
+        self.refresh_tool_versions()
+
     def create_download_progressbar(self):
         if hasattr(self, 'download_progressbar'):
             self.download_progressbar.destroy()
@@ -1629,6 +5074,7 @@ class SimpleDownloader:  # 创建下载器类
         self.eq_file_entry = tk.Entry(file_frame, width=50, bd=1, relief="solid", bg="white", highlightthickness=1, highlightbackground="#CCCCCC", fg="black", font=(None, 10))
         self.eq_file_entry.pack(side="left", padx=6)
         tk.Button(file_frame, text="选择文件", command=self._choose_eq_file).pack(side="left")
+        tk.Button(file_frame, text="选择文件夹", command=self._choose_eq_folder).pack(side="left", padx=(6, 0))
 
         # 9 段 EQ 输入（低3/中3/高3），输入 +3 / -3
         grp = tk.LabelFrame(container, text="均衡器（单位 dB）", bg="white", font=(None, 10))
@@ -1648,11 +5094,16 @@ class SimpleDownloader:  # 创建下载器类
                   ("H1","4kHz"),("H2","8kHz"),("H3","16kHz")]
 
         self.eq_inputs = {}
+        self.eq_analysis_labels = {}
         for idx, (key, text) in enumerate(labels):
             tk.Label(grp, text=text, bg="white", font=(None, 9)).grid(row=1, column=idx, padx=(0,6), sticky="w")
             ent = tk.Entry(grp, width=6, bd=1, relief="solid", bg="white", highlightthickness=1, highlightbackground="#CCCCCC", fg="black", font=(None, 10))
             ent.grid(row=2, column=idx, padx=(0,6), pady=(0,6))
             self.eq_inputs[key] = ent
+            # 分析结果：该频段相对平均能量的 dB
+            lbl = tk.Label(grp, text="", bg="white", fg="#666", font=(None, 8))
+            lbl.grid(row=3, column=idx, padx=(0,6), sticky="w")
+            self.eq_analysis_labels[key] = lbl
 
         # 右侧：总体音量（与高中低同一行风格）
         tk.Label(grp, text="总音量", bg="white", font=(None, 10, "bold")).grid(row=0, column=9, columnspan=1, sticky="w", padx=(10,0))
@@ -1665,35 +5116,216 @@ class SimpleDownloader:  # 创建下载器类
         btns.pack(fill="x", pady=(6, 0))
         tk.Button(btns, text="应用EQ", command=self.apply_eq_to_path).pack(side="left")
         tk.Button(btns, text="重置为0dB", command=self._reset_eq_inputs).pack(side="left", padx=8)
+        tk.Button(btns, text="批量应用EQ", command=self.apply_eq_to_batch).pack(side="left")
+        tk.Button(btns, text="分析频谱/响度", command=self.analyze_eq_file).pack(side="left", padx=(8, 0))
+        tk.Button(btns, text="停止处理", command=self.stop_eq_processing).pack(side="left", padx=(8, 0))
+        self.eq_stop_events = set()  # 正在进行的 EQ 处理各自的停止标志
+        self.eq_analyzer = AudioAnalyzer(os.path.join(CONFIG_DIR, "eq_analysis"))
+        # 进程内 NumPy 引擎（仅音频输出）；未安装 numpy/scipy 时不可勾选
+        self.eq_numpy_var = tk.BooleanVar(value=load_config().get("eq_engine") == "numpy" and NumpyEQEngine.available())
+        tk.Checkbutton(btns, text="使用 NumPy 引擎（仅音频）", variable=self.eq_numpy_var, bg="white",
+                       command=self._save_eq_engine, state="normal" if NumpyEQEngine.available() else "disabled").pack(side="left", padx=8)
+
+        # 响度标准化（两遍 loudnorm，第一遍测量结果按文件缓存）
+        config = load_config()
+        loud = tk.Frame(container, bg="white")
+        loud.pack(fill="x", pady=(6, 0))
+        self.loudnorm_var = tk.BooleanVar(value=config.get("loudnorm_enabled", False))
+        tk.Checkbutton(loud, text="响度标准化", variable=self.loudnorm_var, bg="white").pack(side="left")
+        tk.Label(loud, text="目标(LUFS)：", bg="white", font=(None, 10)).pack(side="left", padx=(8, 0))
+        self.loudnorm_target_entry = tk.Entry(loud, width=6, bd=1, relief="solid", bg="white", highlightthickness=1, highlightbackground="#CCCCCC", fg="black", font=(None, 10))
+        self.loudnorm_target_entry.insert(0, str(config.get("loudnorm_target", -14.0)))
+        self.loudnorm_target_entry.pack(side="left")
+        tk.Label(loud, text="真峰值上限(dBTP)：", bg="white", font=(None, 10)).pack(side="left", padx=(8, 0))
+        self.loudnorm_tp_entry = tk.Entry(loud, width=6, bd=1, relief="solid", bg="white", highlightthickness=1, highlightbackground="#CCCCCC", fg="black", font=(None, 10))
+        self.loudnorm_tp_entry.insert(0, str(config.get("loudnorm_tp", -1.0)))
+        self.loudnorm_tp_entry.pack(side="left")
+        self.loudnorm = LoudnessNormalizer(os.path.join(CONFIG_DIR, "loudnorm"))
+
+        # 试听：解码一次选定片段，之后修改增益会自动重新套用并播放
+        preview = tk.Frame(container, bg="white")
+        preview.pack(fill="x", pady=(6, 0))
+        tk.Label(preview, text="试听起点(秒)：", bg="white", font=(None, 10)).pack(side="left")
+        self.eq_preview_start = tk.Entry(preview, width=6, bd=1, relief="solid", bg="white", highlightthickness=1, highlightbackground="#CCCCCC", fg="black", font=(None, 10))
+        self.eq_preview_start.insert(0, "30")
+        self.eq_preview_start.pack(side="left")
+        tk.Label(preview, text="时长(秒)：", bg="white", font=(None, 10)).pack(side="left", padx=(8, 0))
+        self.eq_preview_duration = tk.Entry(preview, width=6, bd=1, relief="solid", bg="white", highlightthickness=1, highlightbackground="#CCCCCC", fg="black", font=(None, 10))
+        self.eq_preview_duration.insert(0, "20")
+        self.eq_preview_duration.pack(side="left")
+        tk.Button(preview, text="试听EQ", command=self.preview_eq).pack(side="left", padx=(8, 0))
+        self.eq_ab_button = tk.Button(preview, text="A/B：EQ", command=self.toggle_eq_ab)
+        self.eq_ab_button.pack(side="left", padx=8)
+        tk.Button(preview, text="停止", command=self.stop_eq_preview).pack(side="left")
+        self.eq_preview = None
+        self.eq_preview_mode = None  # None=未试听，"wet"=EQ后，"dry"=原声
+        self.eq_preview_job = 0  # 递增编号，只播放最近一次请求的结果
+        for ent in list(self.eq_inputs.values()) + [self.eq_volume_entry]:
+            ent.bind("<KeyRelease>", self._schedule_eq_preview_refresh)
+
+        # 提示
+        tk.Label(container, text="在各框输入+3或-3，留空表示不调节。视频将复制视频流并替换为EQ后的音频。试听时修改增益会自动刷新。", bg="white", fg="#666", font=(None, 9)).pack(anchor="w", pady=(6, 0))
+
+        # 均衡器日志区域
+        log_frame = tk.Frame(container, bg="white")
+        log_frame.pack(fill="both", expand=True, pady=(10, 0))
+        tk.Label(log_frame, text="均衡器日志", bg="white", font=(None, 10, "bold")).pack(anchor="w", pady=(0, 6))
+        inner = tk.Frame(log_frame, bg="white")
+        inner.pack(fill="both", expand=True)
+        self.eq_log_text = tk.Text(inner, height=10, wrap="word", bg="white", font=(None, 10), state="disabled")
+        self.eq_log_text.pack(side="left", fill="both", expand=True)
+        # 防止用户编辑日志内容 - 使用更强的方法
+        def prevent_edit_eq(event):
+            if self.eq_log_text.cget("state") == "disabled":
+                return "break"
+            return None
+        self.eq_log_text.bind("<Key>", prevent_edit_eq)
+        self.eq_log_text.bind("<KeyPress>", prevent_edit_eq)
+        self.eq_log_text.bind("<KeyRelease>", prevent_edit_eq)
+        eq_scroll = tk.Scrollbar(inner, command=self.eq_log_text.yview)
+        eq_scroll.pack(side="right", fill="y")
+        self.eq_log_text.configure(yscrollcommand=eq_scroll.set)
+
+    def _choose_eq_file(self):
+        path = filedialog.askopenfilename(filetypes=[("Media files", "*.mp3;*.wav;*.flac;*.m4a;*.mp4;*.mkv;*.mov"), ("All files", "*.*")])
+        if path:
+            self.eq_file_entry.delete(0, tk.END)
+            self.eq_file_entry.insert(0, path)
+
+    def _choose_eq_folder(self):
+        path = filedialog.askdirectory()
+        if path:
+            self.eq_file_entry.delete(0, tk.END)
+            self.eq_file_entry.insert(0, path)
+
+    def preview_eq(self):
+        path = (self.eq_file_entry.get() or "").strip()
+        if not path or not os.path.isfile(path):
+            self.eq_log("❌ 请选择有效的文件路径")
+            return
+        try:
+            start = float(self.eq_preview_start.get().strip() or 0)
+            duration = float(self.eq_preview_duration.get().strip() or 0)
+        except ValueError:
+            start, duration = 0.0, 0.0
+        if duration <= 0:
+            self.eq_log("❌ 试听时长必须是大于 0 的秒数")
+            return
+        if self.eq_preview is None:
+            self.eq_preview = EQPreview()
+            atexit.register(self.eq_preview.close)
+        self.eq_preview_mode = "wet"
+        self.eq_ab_button.config(text="A/B：EQ")
+        eq_filter = self._build_9band_filter()
+        self.eq_preview_job += 1
+        job = self.eq_preview_job
+
+        def run():
+            try:
+                t0 = time.time()
+                self.eq_preview.load(path, max(start, 0.0), duration)
+                t1 = time.time()
+                wet = self.eq_preview.render(eq_filter)
+                if job == self.eq_preview_job and self.eq_preview_mode == "wet":
+                    self.eq_preview.play(wet)
+                self.eq_log(f"🎧 试听 {start:g}s 起 {duration:g}s（解码 {t1 - t0:.2f}s，套用EQ {time.time() - t1:.2f}s）")
+            except Exception as e:
+                self.eq_log(f"❌ 试听失败: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _schedule_eq_preview_refresh(self, event=None):
+        # 试听 EQ 时修改增益：停顿 300ms 后用当前缓存片段重新套用滤镜
+        if self.eq_preview_mode != "wet":
+            return
+        if getattr(self, "_eq_preview_after", None):
+            self.root.after_cancel(self._eq_preview_after)
+        self._eq_preview_after = self.root.after(300, self._refresh_eq_preview)
+
+    def _refresh_eq_preview(self):
+        self._eq_preview_after = None
+        if self.eq_preview_mode != "wet" or self.eq_preview is None or self.eq_preview.current is None:
+            return
+        eq_filter = self._build_9band_filter()
+        self.eq_preview_job += 1
+        job = self.eq_preview_job
+
+        def run():
+            try:
+                wet = self.eq_preview.render(eq_filter)
+                if job == self.eq_preview_job and self.eq_preview_mode == "wet":
+                    self.eq_preview.play(wet)
+            except Exception as e:
+                self.eq_log(f"❌ 试听刷新失败: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def toggle_eq_ab(self):
+        # 在原声与 EQ 后之间切换；两者都已缓存为 WAV，切换是即时的
+        if self.eq_preview_mode is None or self.eq_preview is None or self.eq_preview.current is None:
+            self.eq_log("ℹ️ 请先点击“试听EQ”")
+            return
+        self.eq_preview_mode = "dry" if self.eq_preview_mode == "wet" else "wet"
+        self.eq_ab_button.config(text="A/B：原声" if self.eq_preview_mode == "dry" else "A/B：EQ")
+        if self.eq_preview_mode == "dry":
+            self.eq_preview_job += 1
+            self.eq_preview.play(self.eq_preview.render(None))
+        else:
+            self._refresh_eq_preview()
+
+    def stop_eq_preview(self):
+        self.eq_preview_mode = None
+        self.eq_preview_job += 1
+        if self.eq_preview:
+            self.eq_preview.stop()
+
+    def analyze_eq_file(self):
+        path = (self.eq_file_entry.get() or "").strip()
+        if not path or not os.path.isfile(path):
+            self.eq_log("❌ 请选择有效的文件路径")
+            return
+        keys = list(self._eq_freqs.keys())
+        bands = [self._eq_freqs[key] for key in keys]
+        for lbl in self.eq_analysis_labels.values():
+            lbl.config(text="")
+
+        def report(done, total):
+            pct = int(done / total * 100)
+            if pct // 25 != report.last // 25:
+                report.last = pct
+                self.eq_log(f"📊 分析中... {pct}%")
+        report.last = 0
 
-        # 提示
-        tk.Label(container, text="在各框输入+3或-3，留空表示不调节。视频将复制视频流并替换为EQ后的音频。", bg="white", fg="#666", font=(None, 9)).pack(anchor="w", pady=(6, 0))
+        def run():
+            try:
+                self.eq_log(f"📊 分析: {path}")
+                result = self.eq_analyzer.analyze(path, bands, progress=report)
+            except Exception as e:
+                self.eq_log(f"❌ 分析失败: {e}")
+                return
 
-        # 均衡器日志区域
-        log_frame = tk.Frame(container, bg="white")
-        log_frame.pack(fill="both", expand=True, pady=(10, 0))
-        tk.Label(log_frame, text="均衡器日志", bg="white", font=(None, 10, "bold")).pack(anchor="w", pady=(0, 6))
-        inner = tk.Frame(log_frame, bg="white")
-        inner.pack(fill="both", expand=True)
-        self.eq_log_text = tk.Text(inner, height=10, wrap="word", bg="white", font=(None, 10), state="disabled")
-        self.eq_log_text.pack(side="left", fill="both", expand=True)
-        # 防止用户编辑日志内容 - 使用更强的方法
-        def prevent_edit_eq(event):
-            if self.eq_log_text.cget("state") == "disabled":
-                return "break"
-            return None
-        self.eq_log_text.bind("<Key>", prevent_edit_eq)
-        self.eq_log_text.bind("<KeyPress>", prevent_edit_eq)
-        self.eq_log_text.bind("<KeyRelease>", prevent_edit_eq)
-        eq_scroll = tk.Scrollbar(inner, command=self.eq_log_text.yview)
-        eq_scroll.pack(side="right", fill="y")
-        self.eq_log_text.configure(yscrollcommand=eq_scroll.set)
+            def show():
+                for key, value in zip(keys, result.get("spectrum") or []):
+                    if value is not None:
+                        self.eq_analysis_labels[key].config(text=f"{value:+.1f}")
+            self.root.after(0, show)
+
+            def fmt(value, unit):
+                return "—" if value is None else f"{value:.1f} {unit}"
+            source = "（缓存）" if result.get("from_cache") else ""
+            self.eq_log(f"✅ 分析完成{source}: 积分响度 {fmt(result.get('integrated'), 'LUFS')}，"
+                        f"响度范围 {fmt(result.get('lra'), 'LU')}，真峰值 {fmt(result.get('true_peak'), 'dBTP')}")
+            if result.get("spectrum") is None:
+                self.eq_log("ℹ️ 未安装 numpy，跳过频谱分析")
+            else:
+                self.eq_log("ℹ️ 各频段下方数字为该频段相对平均能量的 dB")
 
-    def _choose_eq_file(self):
-        path = filedialog.askopenfilename(filetypes=[("Media files", "*.mp3;*.wav;*.flac;*.m4a;*.mp4;*.mkv;*.mov"), ("All files", "*.*")])
-        if path:
-            self.eq_file_entry.delete(0, tk.END)
-            self.eq_file_entry.insert(0, path)
+        threading.Thread(target=run, daemon=True).start()
+
+    def _save_eq_engine(self):
+        config = load_config()
+        config["eq_engine"] = "numpy" if self.eq_numpy_var.get() else "ffmpeg"
+        save_config(config)
 
     def _reset_eq_inputs(self):
         for ent in self.eq_inputs.values():
@@ -1747,20 +5379,53 @@ class SimpleDownloader:  # 创建下载器类
         except Exception:
             pass
 
-    def _build_9band_filter(self):
-        # 根据 9 个输入构造 ffmpeg equalizer 滤镜链（仅包含非 0dB 的频段）
-        filters = []
-        for key, f in self._eq_freqs.items():
-            g = self._parse_gain(self.eq_inputs[key].get(), clamp=True)
-            if g != 0.0:
-                filters.append(f"equalizer=f={float(f)}:t=o:w=1:g={g}")
-        # 追加总体音量调节（若有输入）
+    def _eq_settings(self):
+        # 读取 9 个频段增益和总音量（只能在主线程调用）
+        bands = [(f, self._parse_gain(self.eq_inputs[key].get(), clamp=True)) for key, f in self._eq_freqs.items()]
         vol_db = self._parse_gain(self.eq_volume_entry.get() if hasattr(self, 'eq_volume_entry') else "", clamp=False)
-        if vol_db != 0.0:
-            filters.append(f"volume={vol_db}dB")
-        if not filters:
+        return bands, vol_db
+
+    def _build_9band_filter(self):
+        # 根据 9 个输入构造 ffmpeg equalizer 滤镜链（仅包含非 0dB 的频段），追加总体音量调节（若有输入）
+        return build_eq_filter(*self._eq_settings())
+
+    def _loudnorm_settings(self):
+        """
+        读取并保存响度标准化设置（只能在主线程调用）
+        :return: 未启用时返回 None，否则返回 (目标 LUFS, 真峰值上限 dBTP)
+        """
+        target_text = self.loudnorm_target_entry.get().strip()
+        tp_text = self.loudnorm_tp_entry.get().strip()
+        target = min(max(self._parse_gain(target_text, clamp=False) if target_text else -14.0, -70.0), -5.0)
+        true_peak = min(max(self._parse_gain(tp_text, clamp=False) if tp_text else -1.0, -9.0), 0.0)
+        config = load_config()
+        config["loudnorm_enabled"] = self.loudnorm_var.get()
+        config["loudnorm_target"] = target
+        config["loudnorm_tp"] = true_peak
+        save_config(config)
+        return (target, true_peak) if self.loudnorm_var.get() else None
+
+    def _begin_eq_run(self):
+        """为一次 EQ 处理登记停止标志（主线程调用），处理结束后由 _end_eq_run 注销"""
+        stop = threading.Event()
+        self.eq_stop_events.add(stop)
+        return stop
+
+    def _end_eq_run(self, stop):
+        self.root.after(0, lambda: self.eq_stop_events.discard(stop))
+
+    def stop_eq_processing(self):
+        """“停止处理”：通知所有进行中的 EQ 处理不再开始新文件，并中止正在运行的测量、NumPy 引擎和 ffmpeg 任务"""
+        for stop in self.eq_stop_events:
+            stop.set()
+        self.ffmpeg.cancel("eq")
+
+    def _eq_engine_for(self, kind):
+        # 勾选了 NumPy 引擎且为音频文件时返回进程内 EQ 引擎，否则返回 None（使用 ffmpeg 滤镜链）
+        # 响度标准化只能由 ffmpeg loudnorm 完成，启用时也使用 ffmpeg
+        if kind != "音频" or not self.eq_numpy_var.get() or not NumpyEQEngine.available() or self.loudnorm_var.get():
             return None
-        return ",".join(filters)
+        return NumpyEQEngine(*self._eq_settings())
 
     def apply_eq_to_path(self):
         path = (self.eq_file_entry.get() or "").strip()
@@ -1769,47 +5434,185 @@ class SimpleDownloader:  # 创建下载器类
             return
 
         eq_filter = self._build_9band_filter()
-        if not eq_filter:
+        loudnorm = self._loudnorm_settings()
+        if not eq_filter and not loudnorm:
             self.eq_log("ℹ️ 未设置任何增益（均为 0dB），不进行处理")
             return
 
+        job = build_eq_command(path, eq_filter or "anull")
+        engine = self._eq_engine_for(job[2]) if job else None
+        stamp = eq_settings_stamp(eq_filter or "anull", loudnorm)
+        stop = self._begin_eq_run()
+
         def run():
-            base, ext = os.path.splitext(path)
-            ext_lower = ext.lower()
             try:
-                if ext_lower in [".mp3", ".wav", ".flac", ".m4a"]:
-                    out_path = f"{base}_EQ.wav"
-                    self.eq_log(f"🔄 处理音频文件: {path}")
-                    self.eq_log(f"🔧 使用滤镜: -af {eq_filter}")
-                    cmd = [
-                        "ffmpeg", "-loglevel", "info",
-                        "-i", path,
-                        "-af", eq_filter,
-                        "-ar", "48000", "-ac", "2",
-                        "-c:a", "pcm_s32le",
-                        "-y", out_path
-                    ]
-                    subprocess.run(cmd, shell=False)
-                    self.eq_log(f"✅ 完成，已输出: {out_path}\n")
-                elif ext_lower in [".mp4", ".mkv", ".mov"]:
-                    out_path = f"{base}_EQ.mkv"
-                    self.eq_log(f"🔄 处理视频文件: {path}")
-                    self.eq_log(f"🔧 使用滤镜: -af {eq_filter}")
-                    cmd = [
-                        "ffmpeg", "-loglevel", "info",
-                        "-i", path,
-                        "-c:v", "copy",
-                        "-af", eq_filter,
-                        "-ar", "48000", "-ac", "2",
-                        "-c:a", "pcm_s32le",
-                        "-y", out_path
-                    ]
-                    subprocess.run(cmd, shell=False)
-                    self.eq_log(f"✅ 完成，已输出: {out_path}\n")
+                process()
+            finally:
+                self._end_eq_run(stop)
+
+        def process():
+            nonlocal eq_filter
+            if job is None:
+                self.eq_log("❌ 不支持的文件类型（支持音频：mp3/wav/flac/m4a；视频：mp4/mkv/mov）")
+                return
+            cmd, out_path, kind = job
+            ok = False
+            try:
+                self.eq_log(f"🔄 处理{kind}文件: {path}")
+                if loudnorm:
+                    t0 = time.time()
+                    eq_filter = self.loudnorm.build_filter(path, eq_filter, *loudnorm, stop=stop)
+                    self.eq_log(f"📏 响度测量用时 {time.time() - t0:.1f}s（相同文件和 EQ 设置再次处理时直接使用缓存）")
+                    cmd = build_eq_command(path, eq_filter)[0]
+                if engine:
+                    self.eq_log("🔧 使用 NumPy 引擎（与 ffmpeg 滤镜链相同的 9 段峰值滤波）")
+                    engine.process_file(path, eq_part_path(out_path), stop)
                 else:
-                    self.eq_log("❌ 不支持的文件类型（支持音频：mp3/wav/flac/m4a；视频：mp4/mkv/mov）")
+                    if stop.is_set():
+                        self.eq_log("⏹️ 已取消EQ处理\n")
+                        return
+                    self.eq_log(f"🔧 使用滤镜: -af {eq_filter}")
+                    last = [-10]
+
+                    def report(info):
+                        # 每 10% 记录一次进度
+                        if info["percent"] is not None and info["percent"] - last[0] >= 10:
+                            last[0] = info["percent"]
+                            speed = f"，{info['speed']:.1f}x" if info["speed"] else ""
+                            self.eq_log(f"⏳ {info['percent']:.0f}%{speed}")
+                    ffmpeg_job = self.ffmpeg.start(cmd, key="eq", duration=probe_duration(path), on_progress=report)
+                    if stop.is_set():
+                        ffmpeg_job.cancel()  # 等待线程预算期间点击了“停止处理”
+                    self.ffmpeg.finish(ffmpeg_job)
+                    if ffmpeg_job.cancelled:
+                        self.eq_log("⏹️ 已取消EQ处理\n")
+                        return
+                    if ffmpeg_job.process.returncode != 0:
+                        self.eq_log(f"❌ EQ 处理失败: {ffmpeg_job.error_summary()}")
+                        return
+                ok = True
             except Exception as e:
-                self.eq_log(f"❌ EQ 处理失败: {e}")
+                self.eq_log("⏹️ 已取消EQ处理\n" if stop.is_set() else f"❌ EQ 处理失败: {e}")
+            finally:
+                try:
+                    finish_eq_output(out_path, ok, stamp)
+                except OSError as e:
+                    ok = False
+                    self.eq_log(f"❌ 无法写入输出文件: {e}")
+            if ok:
+                self.eq_log(f"✅ 完成，已输出: {out_path}\n")
+
+        threading.Thread(target=run).start()
+
+    def _collect_eq_batch(self, target):
+        """
+        收集批量 EQ 的源文件：
+        - 文件夹：递归查找其中所有支持的音视频文件
+        - 通配符（如 D:\\Music\\*.flac，支持 **）：按匹配结果
+        已经是 EQ 输出的文件（*_EQ.* 及其未完成的 *_EQ.part.*）会被排除，避免重复叠加 EQ。
+        """
+        if os.path.isdir(target):
+            candidates = [os.path.join(d, f) for d, _, files in os.walk(target) for f in files]
+        else:
+            candidates = glob.glob(target, recursive=True)
+        files = []
+        for path in sorted(candidates):
+            stem, ext = os.path.splitext(os.path.basename(path))
+            if ext.lower() in EQ_AUDIO_EXTS + EQ_VIDEO_EXTS and not stem.endswith(("_EQ", "_EQ.part")) and os.path.isfile(path):
+                files.append(path)
+        return files
+
+    def apply_eq_to_batch(self):
+        target = (self.eq_file_entry.get() or "").strip()
+        if not target:
+            self.eq_log("❌ 请选择文件夹，或输入通配符路径（如 D:\\Music\\*.flac）")
+            return
+
+        # 滤镜在主线程读取输入框后构造一次，所有文件共用，与单文件处理的输出保持一致
+        eq_filter = self._build_9band_filter()
+        loudnorm = self._loudnorm_settings()
+        if not eq_filter and not loudnorm:
+            self.eq_log("ℹ️ 未设置任何增益（均为 0dB），不进行处理")
+            return
+        audio_engine = self._eq_engine_for("音频")
+        stop = self._begin_eq_run()
+
+        def run():
+            try:
+                process_batch()
+            finally:
+                self._end_eq_run(stop)
+
+        def process_batch():
+            files = self._collect_eq_batch(target)
+            if not files:
+                self.eq_log(f"❌ 未找到可处理的音视频文件: {target}")
+                return
+
+            # 已有输出、比源文件新且由相同 EQ 设置生成的视为最新，直接跳过
+            stamp = eq_settings_stamp(eq_filter or "anull", loudnorm)
+            jobs = []
+            skipped = 0
+            for path in files:
+                cmd, out_path, kind = build_eq_command(path, eq_filter or "anull")
+                if eq_output_fresh(path, out_path, stamp):
+                    skipped += 1
+                    continue
+                jobs.append((path, cmd, out_path, audio_engine if kind == "音频" else None))
+
+            workers = self.ffmpeg.thread_budget
+            self.eq_log(f"🔄 批量EQ：共 {len(files)} 个文件，跳过已是最新的 {skipped} 个，使用 {workers} 个并行进程")
+            self.eq_log(f"🔧 使用滤镜: -af {eq_filter or 'anull'}")
+            if loudnorm:
+                self.eq_log(f"📏 响度标准化：目标 {loudnorm[0]} LUFS，真峰值上限 {loudnorm[1]} dBTP")
+            if not jobs:
+                self.eq_log("✅ 所有文件均已是最新\n")
+                return
+
+            progress = {"done": 0, "failed": 0}
+            progress_lock = threading.Lock()
+
+            def process(job):
+                path, cmd, out_path, engine = job
+                if stop.is_set():
+                    return  # 用户已点击“停止处理”，剩余文件不再处理
+                try:
+                    if loudnorm:
+                        cmd = build_eq_command(path, self.loudnorm.build_filter(path, eq_filter, *loudnorm, stop=stop))[0]
+                    if engine:
+                        engine.process_file(path, eq_part_path(out_path), stop)
+                        ok, error = True, []
+                    elif stop.is_set():
+                        ok, error = False, ["已取消"]
+                    else:
+                        # 每个文件单线程编码，并行度由文件数提供；总占用受共享线程预算限制
+                        ffmpeg_job = self.ffmpeg.start(cmd, key="eq", threads=1)
+                        if stop.is_set():
+                            ffmpeg_job.cancel()  # 等待线程预算期间点击了“停止处理”
+                        self.ffmpeg.finish(ffmpeg_job)
+                        ok = ffmpeg_job.process.returncode == 0
+                        error = [] if ok else (["已取消"] if ffmpeg_job.cancelled else [ffmpeg_job.error_summary(1)])
+                except Exception as e:
+                    ok, error = False, ["已取消" if stop.is_set() else str(e)]
+                try:
+                    finish_eq_output(out_path, ok, stamp)
+                except OSError as e:
+                    ok, error = False, [str(e)]
+                with progress_lock:
+                    progress["done"] += 1
+                    if not ok:
+                        progress["failed"] += 1
+                    index = progress["done"]
+                if ok:
+                    self.eq_log(f"[{index}/{len(jobs)}] ✅ {out_path}")
+                else:
+                    self.eq_log(f"[{index}/{len(jobs)}] ❌ {path}：{' '.join(error) or '未知错误'}")
+
+            # 每个文件由一个独立的 ffmpeg 进程处理，线程池只负责按线程预算限制同时运行的进程数
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eq-batch") as executor:
+                list(executor.map(process, jobs))
+
+            self.eq_log(f"✅ 批量EQ完成：成功 {len(jobs) - progress['failed']} 个，失败 {progress['failed']} 个\n")
 
         threading.Thread(target=run).start()
 
@@ -1866,6 +5669,44 @@ class SimpleDownloader:  # 创建下载器类
         self.bili_cover_entry.pack(side="left", padx=6)
         tk.Button(cover_frame, text="选择封面", command=self._choose_bili_cover).pack(side="left")
 
+        # 标签输入（逗号分隔，每个视频可单独设置）
+        tags_frame = tk.Frame(container, bg="white")
+        tags_frame.pack(fill="x", pady=(0, 10))
+        
+        tk.Label(tags_frame, text="视频标签：", bg="white", font=(None, 10)).pack(side="left")
+        self.bili_tags_entry = tk.Entry(tags_frame, width=60, bd=1, relief="solid", bg="white", highlightthickness=1, highlightbackground="#CCCCCC", fg="black", font=(None, 10))
+        self.bili_tags_entry.insert(0, BILI_DEFAULT_TAGS)
+        self.bili_tags_entry.pack(side="left", padx=6)
+
+        # 上传前转码：PCM MKV 的音轨体积很大，默认压成 FLAC（视频流复制），可改为 AAC 或直接上传原文件
+        profile_frame = tk.Frame(container, bg="white")
+        profile_frame.pack(fill="x", pady=(0, 10))
+
+        tk.Label(profile_frame, text="上传格式：", bg="white", font=(None, 10)).pack(side="left")
+        profile_key = load_config().get("bili_upload_profile", "flac")
+        self.bili_profile_var = tk.StringVar(value=UPLOAD_PROFILES.get(profile_key, UPLOAD_PROFILES["flac"])[0])
+        profile_box = ttk.Combobox(profile_frame, textvariable=self.bili_profile_var, state="readonly", width=16,
+                                   values=[value[0] for value in UPLOAD_PROFILES.values()])
+        profile_box.pack(side="left", padx=6)
+        profile_box.bind("<<ComboboxSelected>>", self._save_bili_profile)
+        tk.Label(profile_frame, text="（仅对 PCM 音轨转码，结果缓存在源文件旁）", bg="white", fg="gray", font=(None, 9)).pack(side="left")
+
+        # 上传线路：自动时按测速结果选择最快线路和分片并发数（结果缓存 6 小时）
+        line_frame = tk.Frame(container, bg="white")
+        line_frame.pack(fill="x", pady=(0, 10))
+
+        tk.Label(line_frame, text="上传线路：", bg="white", font=(None, 10)).pack(side="left")
+        self.bili_line_var = tk.StringVar(value=load_config().get("bili_upload_line", "自动"))
+        line_box = ttk.Combobox(line_frame, textvariable=self.bili_line_var, state="readonly", width=10,
+                                values=["自动"] + list(BILI_UPLOAD_LINES))
+        line_box.pack(side="left", padx=6)
+        line_box.bind("<<ComboboxSelected>>", self._save_bili_line)
+        tk.Button(line_frame, text="📶 测速", command=self.benchmark_bili_lines).pack(side="left")
+        self.bili_line_label = tk.Label(line_frame, text="", bg="white", fg="gray", font=(None, 9))
+        self.bili_line_label.pack(side="left", padx=6)
+        self.bili_tuner = UploadLineTuner(os.path.join(CONFIG_DIR, "bili_line_benchmark.json"))
+        self._show_bili_line_result(self.bili_tuner.cached())
+
         # 上传按钮
         upload_frame = tk.Frame(container, bg="white")
         upload_frame.pack(fill="x", pady=(0, 10))
@@ -1877,12 +5718,36 @@ class SimpleDownloader:  # 创建下载器类
         self.bili_upload_button = tk.Button(button_frame, text="🚀 开始上传到B站", command=self.start_bili_upload, bg="#FF6B6B", fg="white", font=(None, 12, "bold"), relief="flat", padx=20, pady=8)
         self.bili_upload_button.pack(side="left", padx=(0, 10))
         
-        self.bili_cancel_button = tk.Button(button_frame, text="⏹️ 取消上传", command=self.cancel_bili_upload, bg="#6C757D", fg="white", font=(None, 12, "bold"), relief="flat", padx=20, pady=8, state="disabled")
+        self.bili_cancel_button = tk.Button(button_frame, text="⏹️ 取消上传", command=self.cancel_bili_upload, bg="#6C757D", fg="white", font=(None, 12, "bold"), relief="flat", padx=20, pady=8)
         self.bili_cancel_button.pack(side="left")
 
         # 上传状态显示
         self.bili_status_label = tk.Label(container, text="", bg="white", font=(None, 10))
         self.bili_status_label.pack(pady=5)
+
+        # 上传队列：每个视频有自己的标题/封面/标签，按并发上限依次上传，重启后继续
+        queue_frame = tk.LabelFrame(container, text="上传队列", bg="white", font=(None, 10))
+        queue_frame.pack(fill="x", pady=(0, 6))
+        queue_buttons = tk.Frame(queue_frame, bg="white")
+        queue_buttons.pack(fill="x")
+        tk.Button(queue_buttons, text="📂 批量添加", command=self.add_bili_files).pack(side="left")
+        tk.Button(queue_buttons, text="✏️ 更新所选", command=self.update_selected_bili_item).pack(side="left", padx=6)
+        tk.Button(queue_buttons, text="🗑️ 移除所选", command=self.remove_selected_bili_item).pack(side="left")
+        tk.Button(queue_buttons, text="🧹 清除已完成", command=self.clear_finished_bili_items).pack(side="left", padx=6)
+        tk.Label(queue_buttons, text="同时上传", bg="white", font=(None, 10)).pack(side="left", padx=(12, 0))
+        self.bili_concurrency_var = tk.IntVar(value=load_config().get("bili_upload_concurrency", 1))
+        tk.Spinbox(queue_buttons, from_=1, to=5, width=4, textvariable=self.bili_concurrency_var, command=self.update_bili_concurrency).pack(side="left", padx=4)
+        self.bili_queue_listbox = tk.Listbox(queue_frame, height=5, font=(None, 10), bg="white", bd=1, relief="solid")
+        self.bili_queue_listbox.pack(fill="x", pady=(4, 0))
+        self.bili_queue_listbox.bind("<<ListboxSelect>>", self._on_bili_queue_select)
+        self.bili_queue = UploadQueue(os.path.join(CONFIG_DIR, "bili_upload_queue.json"))
+        self.bili_queue_ids = []  # 列表行号 -> 队列条目 id
+        self.bili_active_uploads = {}  # 条目 id -> {"process": biliup 进程, "cancelled": 是否已取消}
+        self.bili_upload_progress = {}  # 条目 id -> UploadProgress（上传中）或转码进度文本
+        self.bili_history = UploadHistory(os.path.join(CONFIG_DIR, "bili_upload_history.json"))
+        self.bili_account = BiliAccountCache(os.path.join(CONFIG_DIR, "bili_account.json"))
+        self.bili_tick_scheduled = False
+        self._refresh_bili_queue_view()
         
 
         # B站上传日志区域
@@ -1926,64 +5791,18 @@ class SimpleDownloader:  # 创建下载器类
             self._auto_find_cover()
 
     def _find_biliup(self):
-        """自动寻找biliup相关文件"""
-        # 获取程序所在目录
-        if getattr(sys, 'frozen', False):
-            # 如果是打包的exe文件
-            program_dir = os.path.dirname(sys.executable)
-        else:
-            # 如果是Python脚本
-            program_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # 首先检查程序同目录下是否有biliup.exe和cookies.json
-        biliup_exe = os.path.join(program_dir, "biliup.exe")
-        cookies_file = os.path.join(program_dir, "cookies.json")
-        
-        if os.path.exists(biliup_exe) and os.path.exists(cookies_file):
-            self.biliup_path = program_dir
-            self.biliup_exe_path = biliup_exe
-            self.biliup_cookies_path = cookies_file
-            return True
-        
-        # 检查程序安装目录（动态检测）
-        if getattr(sys, 'frozen', False):
-            # 如果是打包的exe文件，使用exe文件所在目录
-            install_dir = os.path.dirname(sys.executable)
-        else:
-            # 如果是Python脚本，使用脚本所在目录
-            install_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # 检查程序安装目录
-        if os.path.exists(install_dir):
-            biliup_exe = os.path.join(install_dir, "biliup.exe")
-            cookies_file = os.path.join(install_dir, "cookies.json")
-            
-            if os.path.exists(biliup_exe) and os.path.exists(cookies_file):
-                self.biliup_path = install_dir
-                self.biliup_exe_path = biliup_exe
+        """
+        按工具链登记表的候选路径查找 biliup，取第一个同时有 biliup 可执行文件和 cookies.json 的目录
+        （登记表选中的 biliup 旁边不一定有 cookies.json，例如 PATH 中另有一份）
+        """
+        for exe_path in TOOLS.candidates("biliup"):
+            biliup_dir = os.path.dirname(exe_path)
+            cookies_file = os.path.join(biliup_dir, "cookies.json")
+            if os.path.isfile(exe_path) and os.path.isfile(cookies_file):
+                self.biliup_path = biliup_dir
+                self.biliup_exe_path = exe_path
                 self.biliup_cookies_path = cookies_file
                 return True
-        
-        # 如果程序同目录下没有，再寻找biliup文件夹
-        biliup_dirs = [
-            os.path.join(program_dir, "biliup"),
-            os.path.join(program_dir, "..", "biliup"),  # 上级目录
-            os.path.join(program_dir, "..", "..", "biliup"),  # 上上级目录
-            os.path.join(install_dir, "biliup"),  # 程序安装目录下的biliup文件夹
-        ]
-        
-        for biliup_dir in biliup_dirs:
-            biliup_dir = os.path.abspath(biliup_dir)
-            if os.path.exists(biliup_dir):
-                biliup_exe = os.path.join(biliup_dir, "biliup.exe")
-                cookies_file = os.path.join(biliup_dir, "cookies.json")
-                
-                if os.path.exists(biliup_exe) and os.path.exists(cookies_file):
-                    self.biliup_path = biliup_dir
-                    self.biliup_exe_path = biliup_exe
-                    self.biliup_cookies_path = cookies_file
-                    return True
-        
         return False
     
     def _check_biliup_status(self):
@@ -1999,6 +5818,7 @@ class SimpleDownloader:  # 创建下载器类
                 self.bili_log(f"B站用户名：{username}")
                 self.bili_log(f"URL：{space_url}")
                 self.bili_log("")  # 添加空行
+                self.root.after(0, self._pump_bili_uploads)
             else:
                 self.root.after(0, lambda: self.biliup_status_label.config(
                     text="❌ 未找到biliup", fg="red"
@@ -2007,10 +5827,7 @@ class SimpleDownloader:  # 创建下载器类
                 self.bili_log("请将biliup.exe和cookies.json文件放在以下位置之一：")
                 
                 # 显示实际检测到的程序路径
-                if getattr(sys, 'frozen', False):
-                    actual_path = os.path.dirname(sys.executable)
-                else:
-                    actual_path = os.path.dirname(os.path.abspath(__file__))
+                actual_path = app_dir()
                 
                 self.bili_log(f"1. 程序目录下: {actual_path}")
                 self.bili_log(f"2. 程序目录下的biliup文件夹: {os.path.join(actual_path, 'biliup')}")
@@ -2034,146 +5851,33 @@ class SimpleDownloader:  # 创建下载器类
             self.bili_log("")  # 添加空行
             return
             
-        video_dir = os.path.dirname(video_path)
-        
-        # 查找JPG格式
-        for ext in ['*.jpg', '*.jpeg']:
-            for file in os.listdir(video_dir):
-                if file.lower().endswith(ext[1:]):
-                    cover_path = os.path.join(video_dir, file)
-                    self.bili_cover_entry.delete(0, tk.END)
-                    self.bili_cover_entry.insert(0, cover_path)
-                    return
-        
-        # 查找PNG格式
-        for file in os.listdir(video_dir):
-            if file.lower().endswith('.png'):
-                cover_path = os.path.join(video_dir, file)
-                self.bili_cover_entry.delete(0, tk.END)
-                self.bili_cover_entry.insert(0, cover_path)
-                return
+        cover_path = find_cover_near(video_path)
+        if cover_path:
+            self.bili_cover_entry.delete(0, tk.END)
+            self.bili_cover_entry.insert(0, cover_path)
+            return
                 
         self.bili_log("❌ 未在视频目录找到JPG/PNG图片")
 
     def get_bili_user_info_from_cookies(self):
         """
-        参考 biliup-app-new 的做法：
-        - 从 biliup 使用的 cookies.json 中还原出 Cookie
-        - 调用 B站开放接口获取当前登录账号信息
-        - 返回 用户名 和 空间 URL
+        从 biliup 使用的 cookies.json 得到当前登录账号的 用户名 和 空间 URL（经 BiliAccountCache 缓存，立即返回）；
+        昵称需要访问 B站 nav 接口时在后台获取，拿到后写入上传日志。
         任意一步失败则返回“未知”占位，避免影响主流程。
         """
-        username = "未知"
-        space_url = "未知"
-
-        try:
-            if not self.biliup_cookies_path or not os.path.exists(self.biliup_cookies_path):
-                return username, space_url
-
-            with open(self.biliup_cookies_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            # 先还原成 requests 可用的 cookies 字典
-            cookies = {}
-
-            # 情况 1：cookies.json 是一个 cookie 列表（常见）
-            if isinstance(data, list):
-                for c in data:
-                    if not isinstance(c, dict):
-                        continue
-                    name = c.get("name")
-                    value = c.get("value")
-                    if name and value:
-                        cookies[name] = value
-
-            # 情况 2：cookies.json 是一个 dict（你的示例就是这种）
-            elif isinstance(data, dict):
-                # 2.1 biliup-app/biliup-rs 风格：{"cookie_info":{"cookies":[...]}, "token_info":{"mid":...}, ...}
-                if "cookie_info" in data and isinstance(data["cookie_info"], dict):
-                    ci = data["cookie_info"]
-                    if "cookies" in ci and isinstance(ci["cookies"], list):
-                        for c in ci["cookies"]:
-                            if not isinstance(c, dict):
-                                continue
-                            name = c.get("name")
-                            value = c.get("value")
-                            if name and value:
-                                cookies[name] = value
-                # 2.2 通用结构：{"cookies":[...]}
-                if not cookies and "cookies" in data and isinstance(data["cookies"], list):
-                    for c in data["cookies"]:
-                        if not isinstance(c, dict):
-                            continue
-                        name = c.get("name")
-                        value = c.get("value")
-                        if name and value:
-                            cookies[name] = value
-                # 2.3 顶层键值对形式
-                if not cookies:
-                    for k, v in data.items():
-                        if isinstance(v, str):
-                            cookies[k] = v
-
-            # 如果没解析出任何 cookie，就直接返回“未知”
-            if not cookies:
-                return username, space_url
-
-            # 先尝试直接从 token_info.mid 推出空间 URL（biliup-app 风格）
-            if isinstance(data, dict) and "token_info" in data and isinstance(data["token_info"], dict):
-                mid = data["token_info"].get("mid")
-                if mid:
-                    space_url = f"https://space.bilibili.com/{mid}"
-
-            # 参考 biliup-app-new，使用 cookies 调用 B站 nav 接口获取当前登录用户信息
-            # 如果本地网络或环境不通，这一步可能失败，不影响整体功能
-            try:
-                headers = {
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-                    "Referer": "https://www.bilibili.com/",
-                }
-                resp = requests.get(
-                    "https://api.bilibili.com/x/web-interface/nav",
-                    headers=headers,
-                    cookies=cookies,
-                    timeout=5,
-                )
-
-                if resp.status_code == 200:
-                    j = resp.json()
-                    if j.get("code") == 0 and "data" in j:
-                        d = j["data"]
-                        # data.uname 是当前登录账号昵称
-                        uname = d.get("uname") or d.get("username")
-                        if uname:
-                            username = uname
-                        mid2 = d.get("mid") or d.get("uid")
-                        if mid2:
-                            space_url = f"https://space.bilibili.com/{mid2}"
-            except Exception:
-                # 网络请求失败则忽略，保留前面从 token_info / cookies 推出来的信息
-                pass
-
-            # 如果 API 和 token_info 都没拿到 UID，再退一步从 cookies 里找 DedeUserID
-            if space_url == "未知":
-                uid = None
-                # 从 cookies 字典里找
-                for key, val in cookies.items():
-                    if key.lower() == "dedeuserid" and val:
-                        uid = val
-                        break
-                if uid:
-                    space_url = f"https://space.bilibili.com/{uid}"
-
-        except Exception:
-            # 解析或网络请求失败时静默回退为“未知”
-            pass
+        def on_update(username, space_url):
+            self.bili_log(f"B站用户名：{username}")
+            self.bili_log(f"URL：{space_url}")
+            self.bili_log("")  # 添加空行
 
-        return username, space_url
+        return self.bili_account.lookup(self.biliup_cookies_path, on_update=on_update)
 
     def start_bili_upload(self):
+        """把当前填写的视频和投稿信息加入上传队列，并按并发上限开始上传"""
         video_path = self.bili_file_entry.get().strip()
         title = self.bili_title_entry.get().strip()
         cover_path = self.bili_cover_entry.get().strip()
+        tags = self.bili_tags_entry.get().strip()
         
         if not video_path:
             self.bili_log("❌ 请选择要上传的视频文件")
@@ -2183,267 +5887,402 @@ class SimpleDownloader:  # 创建下载器类
             self.bili_log("❌ 视频文件不存在")
             return
             
-        # 检查biliup是否已找到
-        if not self.biliup_path or not self.biliup_exe_path or not self.biliup_cookies_path:
-            self.bili_log("❌ 未找到biliup，请点击'重新检测'按钮")
-            return
-            
         if not title:
             title = os.path.splitext(os.path.basename(video_path))[0]
             self.bili_log(f"ℹ️ 使用视频文件名作为标题: {title}")
 
-        def run_upload():
-            try:
-                self.bili_log("")  # 添加空行
-                self.bili_log(f"🚀 开始上传视频到B站: {os.path.basename(video_path)}")
-                self.bili_log(f"📝 标题: {title}")
-                self.bili_log(f"🔧 使用biliup: {self.biliup_exe_path}")
-                self.bili_log("")  # 添加空行
-                self.bili_status_label.config(text="上传中...", fg="orange")
-                
-                # 添加上传前延迟，避免频率限制
-                self.bili_log("⏳ 等待1秒后开始上传，避免频率限制...")
-                time.sleep(1)
-                
-                # 更新按钮状态
-                self.bili_upload_button.config(state="disabled")
-                self.bili_cancel_button.config(state="normal")
-                
-                # 构建biliup命令
-                cmd = [
-                    self.biliup_exe_path, "upload",
-                    "--title", title,
-                    "--tag", "电音节,LIVE,DJ,电子音乐,电音",
-                    "--tid", "29",
-                    "--copyright", "2",
-                    "--source", "yt",
-                    "--hires", "1"
-                ]
-                
-                # 添加封面参数
-                if cover_path and os.path.exists(cover_path):
-                    cmd.extend(["--cover", cover_path])
-                    self.bili_log(f"🖼️ 使用封面: {os.path.basename(cover_path)}")
-                    self.bili_log("")  # 添加空行
-                else:
-                    self.bili_log("ℹ️ 未设置封面，将使用默认封面")
-                    self.bili_log("")  # 添加空行
-                
-                # 添加视频文件路径
-                cmd.append(video_path)
-                
-                self.bili_log(f"🔧 执行命令: {' '.join(cmd)}")
-                self.bili_log("")  # 添加空行
-                
-                # 检查cookies文件是否存在
-                if not os.path.exists(self.biliup_cookies_path):
-                    self.bili_log(f"❌ cookies文件不存在: {self.biliup_cookies_path}")
-                    return
-                
-                # 切换到biliup目录，这样biliup就能找到cookies.json文件
-                original_cwd = os.getcwd()
-                os.chdir(self.biliup_path)
-                
-                try:
-                    # 使用终端运行biliup，同时静默监控输出
-                    if shutil.which("wt.exe"):
-                        # 使用Windows Terminal
-                        cmd_str = " ".join(f'"{arg}"' if " " in arg else arg for arg in cmd)
-                        terminal_cmd = ["wt.exe", "cmd", "/c", f"cd /d \"{self.biliup_path}\" && {cmd_str}"]
-                    elif shutil.which("powershell.exe"):
-                        # 使用PowerShell
-                        cmd_str = " ".join(f'"{arg}"' if " " in arg else arg for arg in cmd)
-                        terminal_cmd = ["powershell.exe", "-Command", f"Set-Location '{self.biliup_path}'; & {cmd_str}"]
-                    else:
-                        # 使用传统CMD
-                        cmd_str = " ".join(f'"{arg}"' if " " in arg else arg for arg in cmd)
-                        terminal_cmd = ["cmd.exe", "/c", f"cd /d \"{self.biliup_path}\" && {cmd_str}"]
-                    
-                    # 启动终端窗口显示biliup输出，使用进程组
-                    terminal_process = subprocess.Popen(
-                        terminal_cmd,
-                        stdout=None,  # 不重定向，让终端显示
-                        stderr=None,
-                        text=True, 
-                        encoding='utf-8',
-                        errors='replace',
-                        creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0,  # 创建新的进程组
-                        cwd=self.biliup_path
-                    )
-                    
-                    # 同时启动静默监控进程
-                    monitor_process = subprocess.Popen(
-                        cmd,  # 直接使用biliup命令
-                        stdout=subprocess.PIPE,  # 重定向输出以便检测完成
-                        stderr=subprocess.STDOUT,
-                        text=True, 
-                        encoding='utf-8',
-                        errors='replace',
-                        creationflags=subprocess.CREATE_NO_WINDOW,  # 不显示窗口
-                        cwd=self.biliup_path  # 设置工作目录
-                    )
-                    
-                    process = monitor_process  # 使用监控进程
-                    
-                    # 保存进程引用以便取消
-                    self.bili_upload_process = process
-                    self.bili_terminal_process = terminal_process
-                    
-                    # 显示上传开始信息
-                    if shutil.which("wt.exe"):
-                        self.bili_log("🚀 开始上传，请查看Windows Terminal窗口了解详细进度...")
-                        self.bili_log("")  # 添加空行
-                    elif shutil.which("powershell.exe"):
-                        self.bili_log("🚀 开始上传，请查看PowerShell窗口了解详细进度...")
-                        self.bili_log("")  # 添加空行
-                    else:
-                        self.bili_log("🚀 开始上传，请查看CMD窗口了解详细进度...")
-                        self.bili_log("")  # 添加空行
-                    
-                    # 实时监控输出并等待投稿成功
-                    self.bili_log("⏳ 等待上传完成...")
-                    self.bili_log("")  # 添加空行
-                    
-                    upload_success = False
-                    upload_failed = False
-                    
-                    # 静默监控输出，不显示详细日志
-                    try:
-                        for line in iter(process.stdout.readline, ''):
-                            if line:
-                                line_stripped = line.strip()
-                                # 不显示详细输出，只检测关键信息
-                                
-                                # 检查是否包含成功信息
-                                if "投稿成功" in line_stripped or "APP接口投稿成功" in line_stripped:
-                                    upload_success = True
-                                    self.bili_log("✅ 检测到投稿成功！")
-                                    break
-                                elif "Error:" in line_stripped or "error" in line_stripped.lower() or "failed" in line_stripped.lower():
-                                    upload_failed = True
-                                    self.bili_log(f"❌ 检测到上传错误: {line_stripped}")
-                                    break
-                    except Exception as e:
-                        self.bili_log(f"❌ 监控输出时出错: {e}")
-                    
-                    # 等待进程完成
-                    return_code = process.wait()
-                    
-                    if upload_success or return_code == 0:
-                        self.bili_log("✅ 上传成功！去B站创作中心查看~")
-                        self.bili_log("")  # 添加空行
-                        self.bili_status_label.config(text="上传成功！", fg="green")
-                    elif self.bili_upload_cancelled:
-                        # 用户主动取消，不显示失败信息
-                        pass  # 取消信息已经在cancel_bili_upload中显示
-                    elif upload_failed:
-                        self.bili_log("❌ 上传失败！检测到错误信息")
-                        self.bili_log("")  # 添加空行
-                        self.bili_status_label.config(text="上传失败！", fg="red")
-                    else:
-                        self.bili_log(f"❌ 上传失败！返回码: {return_code}")
-                        self.bili_log("")  # 添加空行
-                        self.bili_status_label.config(text="上传失败！", fg="red")
-                        
-                finally:
-                    # 恢复原始工作目录
-                    os.chdir(original_cwd)
-                    # 恢复按钮状态
-                    self.bili_upload_button.config(state="normal")
-                    self.bili_cancel_button.config(state="disabled")
-                    # 清除进程引用
-                    self.bili_upload_process = None
-                    self.bili_terminal_process = None
-                    self.bili_upload_cancelled = False  # 重置取消标志
-                    
-            except Exception as e:
-                self.bili_log(f"❌ 上传过程中出现错误: {e}")
-                self.bili_status_label.config(text="上传出错！", fg="red")
-                # 恢复按钮状态
-                self.bili_upload_button.config(state="normal")
-                self.bili_cancel_button.config(state="disabled")
-                # 清除进程引用
-                self.bili_upload_process = None
+        self.bili_queue.add(video_path, title=title, cover=cover_path, tags=tags)
+        self.bili_log(f"➕ 已加入上传队列: {title}")
+        self._pump_bili_uploads()
+
+    def add_bili_files(self):
+        """批量加入上传队列：标题取文件名，封面自动在视频目录查找，标签使用当前填写的标签"""
+        paths = filedialog.askopenfilenames(
+            filetypes=[("Video files", "*.mp4;*.mkv;*.mov;*.avi"), ("All files", "*.*")]
+        )
+        if not paths:
+            return
+        tags = self.bili_tags_entry.get().strip()
+        for path in paths:
+            self.bili_queue.add(path, cover=find_cover_near(path) or "", tags=tags)
+        self.bili_log(f"➕ 已加入上传队列 {len(paths)} 个视频")
+        self._pump_bili_uploads()
+
+    def _selected_bili_item(self):
+        selected = self.bili_queue_listbox.curselection()
+        if not selected or selected[0] >= len(self.bili_queue_ids):
+            return None
+        return self.bili_queue.get(self.bili_queue_ids[selected[0]])
+
+    def _on_bili_queue_select(self, event=None):
+        # 选中队列条目时把它的投稿信息填入上方输入框，便于修改
+        item = self._selected_bili_item()
+        if not item:
+            return
+        for entry, value in ((self.bili_file_entry, item["path"]), (self.bili_title_entry, item["title"]),
+                             (self.bili_cover_entry, item["cover"]), (self.bili_tags_entry, item["tags"])):
+            entry.delete(0, tk.END)
+            entry.insert(0, value)
+
+    def update_selected_bili_item(self):
+        """用输入框内容更新所选条目的投稿信息；失败/已取消的条目会重新排队"""
+        item = self._selected_bili_item()
+        if not item:
+            self.bili_log("ℹ️ 请先在上传队列中选择一项")
+            return
+        if item["status"] in ("uploading", "done"):
+            self.bili_log("ℹ️ 正在上传或已完成的视频不能修改")
+            return
+        self.bili_queue.update(
+            item["id"],
+            title=self.bili_title_entry.get().strip() or item["title"],
+            cover=self.bili_cover_entry.get().strip(),
+            tags=self.bili_tags_entry.get().strip() or BILI_DEFAULT_TAGS,
+            status="pending",
+        )
+        self.bili_log(f"✏️ 已更新: {self.bili_title_entry.get().strip() or item['title']}")
+        self._pump_bili_uploads()
 
-        self.bili_upload_thread = threading.Thread(target=run_upload)
-        self.bili_upload_thread.start()
+    def remove_selected_bili_item(self):
+        """移除所选条目；正在上传的会先取消"""
+        item = self._selected_bili_item()
+        if not item:
+            return
+        if item["id"] in self.bili_active_uploads:
+            self._cancel_bili_item(item["id"])
+        self.bili_queue.remove(item["id"])
+        self._refresh_bili_queue_view()
 
-    def cancel_bili_upload(self):
-        """取消B站上传"""
-        if self.bili_upload_process:
+    def clear_finished_bili_items(self):
+        self.bili_queue.clear_finished()
+        self._refresh_bili_queue_view()
+
+    def update_bili_concurrency(self):
+        try:
+            limit = max(1, int(self.bili_concurrency_var.get()))
+        except (tk.TclError, ValueError):
+            return
+        config = load_config()
+        config["bili_upload_concurrency"] = limit
+        save_config(config)
+        self._pump_bili_uploads()
+
+    def _pump_bili_uploads(self):
+        """按并发上限从队列中取出任务开始上传（只在主线程调用）"""
+        if not self.biliup_exe_path or not self.biliup_cookies_path:
+            if self.bili_queue.counts().get("pending"):
+                self.bili_log("ℹ️ 未找到biliup，队列会在检测到biliup后开始上传")
+            self._refresh_bili_queue_view()
+            return
+        try:
+            limit = max(1, int(self.bili_concurrency_var.get()))
+        except (tk.TclError, ValueError):
+            limit = 1
+        while len(self.bili_active_uploads) < limit:
+            item = self.bili_queue.claim_next()
+            if not item:
+                break
+            self.bili_active_uploads[item["id"]] = {"process": None, "cancelled": False}
+            threading.Thread(target=self._bili_upload_worker, args=(item,), daemon=True).start()
+        self._refresh_bili_queue_view()
+        if self.bili_active_uploads and not self.bili_tick_scheduled:
+            self.bili_tick_scheduled = True
+            self.root.after(2000, self._tick_bili_uploads)
+
+    def _tick_bili_uploads(self):
+        """上传进行中每 2 秒刷新一次进度（biliup 没有输出时也能显示停滞），并在日志中提示新出现的停滞"""
+        for item_id, progress in list(self.bili_upload_progress.items()):
+            if isinstance(progress, UploadProgress) and progress.check_stall():
+                item = self.bili_queue.get(item_id)
+                self.bili_log(f"⚠️ 上传停滞超过 {UploadProgress.STALL_SECONDS} 秒: {item['title'] if item else item_id}")
+        self._refresh_bili_queue_view()
+        if self.bili_active_uploads:
+            self.root.after(2000, self._tick_bili_uploads)
+        else:
+            self.bili_tick_scheduled = False
+
+    def _refresh_bili_queue_view(self):
+        """刷新上传队列列表和状态栏（只在主线程调用）"""
+        if not hasattr(self, "bili_queue_listbox"):
+            return
+        icons = {"pending": "⏳ 排队", "uploading": "⬆️ 上传中", "done": "✅ 成功", "failed": "❌ 失败", "cancelled": "⏹️ 已取消"}
+        items = self.bili_queue.snapshot()
+        selected = self.bili_queue_listbox.curselection()
+        self.bili_queue_listbox.delete(0, tk.END)
+        self.bili_queue_ids = []
+        for item in items:
+            status = icons.get(item["status"], item["status"])
+            if item["status"] == "uploading":
+                progress = self.bili_upload_progress.get(item["id"], "")
+                detail = progress.describe() if isinstance(progress, UploadProgress) else progress
+            elif item["status"] == "done" and item.get("stats"):
+                detail = f"平均 {format_size(item['stats']['avg_rate'])}/s，重试 {item['stats']['retries']} 次"
+            else:
+                detail = item.get("error", "")
+            self.bili_queue_listbox.insert(tk.END, f"{status} | {item['title']}" + (f" | {detail}" if detail else ""))
+            self.bili_queue_ids.append(item["id"])
+        if selected and selected[0] < len(items):
+            self.bili_queue_listbox.selection_set(selected[0])
+        counts = self.bili_queue.counts()
+        if counts.get("uploading") or counts.get("pending"):
+            total_rate = sum(p.rate for p in self.bili_upload_progress.values() if isinstance(p, UploadProgress))
+            rate_text = f"，总速率 {format_size(total_rate)}/s" if total_rate else ""
+            self.bili_status_label.config(text=f"上传中 {counts.get('uploading', 0)} 个，排队 {counts.get('pending', 0)} 个{rate_text}", fg="orange")
+        elif items:
+            self.bili_status_label.config(text=f"队列完成：成功 {counts.get('done', 0)} 个，失败 {counts.get('failed', 0)} 个",
+                                          fg="red" if counts.get("failed") else "green")
+
+    def _bili_upload_worker(self, item):
+        """上传队列中的一项（在独立线程中运行），结束后自动开始下一项"""
+        state = self.bili_active_uploads[item["id"]]
+        title = item["title"]
+        status, error = "failed", ""
+        try:
+            def log(message):
+                # 多个视频同时上传时，在每行前加上标题，便于区分
+                if len(self.bili_active_uploads) > 1 and message:
+                    message = f"[{title[:20]}] {message}"
+                self.bili_log(message)
+
+            if not os.path.exists(item["path"]):
+                error = "视频文件不存在"
+                log(f"❌ 视频文件不存在: {item['path']}")
+                return
+            # 检查cookies文件是否存在
+            if not os.path.exists(self.biliup_cookies_path):
+                error = "cookies文件不存在"
+                log(f"❌ cookies文件不存在: {self.biliup_cookies_path}")
+                return
+
+            upload_path = self._prepare_bili_upload_file(item, state, log)
+            if state["cancelled"]:
+                status = "cancelled"
+                return
+            if not upload_path:
+                error = "上传前转码失败"
+                return
+            item = dict(item, **self._choose_bili_line(log))
+            if item.get("line"):
+                self.bili_queue.update(item["id"], line=item["line"])
+            cmd = build_biliup_command(self.biliup_exe_path, dict(item, path=upload_path))
+            self.bili_log("")  # 添加空行
+            log(f"🚀 开始上传视频到B站: {os.path.basename(upload_path)}")
+            log(f"📝 标题: {title}")
+            log(f"🏷️ 标签: {item['tags']}")
+            if "--cover" in cmd:
+                log(f"🖼️ 使用封面: {os.path.basename(item['cover'])}")
+            else:
+                log("ℹ️ 未设置封面，将使用默认封面")
+            log(f"🔧 执行命令: {' '.join(cmd)}")
+            self.bili_log("")  # 添加空行
+
+            # 添加上传前延迟，避免频率限制
+            time.sleep(1)
+            if state["cancelled"]:
+                status = "cancelled"
+                return
+
+            # 只启动一个 biliup 进程：输出逐行显示在下方日志中，同时用于检测投稿结果
+            # 工作目录设为 biliup 目录，这样 biliup 就能找到 cookies.json（不切换本程序的工作目录，多个上传可以并行）
+            process = PROCESSES.popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                cwd=self.biliup_path
+            )
+            state["process"] = process
+
+            upload_success = False
+            upload_failed = False
+            last_progress = 0.0
+            tracker = UploadProgress()
+            self.bili_upload_progress[item["id"]] = tracker
+
+            # 读完全部输出：普通行写入日志，进度行解析为结构化进度，只刷新队列中该条目的显示，避免刷屏
             try:
-                self.bili_log("⏹️ 正在取消上传...")
-                self.bili_upload_cancelled = True  # 设置取消标志
-                
-                # 终止监控进程（这会同时终止biliup）
-                self.bili_upload_process.terminate()
-                try:
-                    self.bili_upload_process.wait(timeout=3)
-                except subprocess.TimeoutExpired:
-                    self.bili_upload_process.kill()
-                    self.bili_upload_process.wait()
-                
-                # 额外强制终止biliup进程
+                for line in iter(process.stdout.readline, ''):
+                    line_stripped = line.strip()
+                    if not line_stripped:
+                        continue
+                    if tracker.feed(line_stripped):
+                        now = time.time()
+                        if now - last_progress >= 1:
+                            last_progress = now
+                            self.root.after(0, self._refresh_bili_queue_view)
+                        continue
+                    log(line_stripped)
+
+                    # 检查是否包含成功信息
+                    if "投稿成功" in line_stripped or "APP接口投稿成功" in line_stripped:
+                        upload_success = True
+                        log("✅ 检测到投稿成功！")
+                    elif "Error:" in line_stripped or "error" in line_stripped.lower() or "failed" in line_stripped.lower():
+                        upload_failed = True
+                        error = line_stripped[-80:]
+            except Exception as e:
+                log(f"❌ 监控输出时出错: {e}")
+
+            # 等待进程完成
+            return_code = process.wait()
+
+            if state["cancelled"]:
+                status = "cancelled"  # 取消信息已经在 _cancel_bili_item 中显示
+            elif upload_success or return_code == 0:
+                status = "done"
+                log("✅ 上传成功！去B站创作中心查看~")
+            elif upload_failed:
+                log("❌ 上传失败！检测到错误信息")
+            else:
+                error = f"返回码 {return_code}"
+                log(f"❌ 上传失败！返回码: {return_code}")
+            # 记录本次上传的统计，便于对比不同线路、发现停滞
+            stats = tracker.summary()
+            if stats["bytes"]:
+                log(f"📊 平均 {format_size(stats['avg_rate'])}/s，峰值 {format_size(stats['peak_rate'])}/s，"
+                    f"用时 {stats['seconds']:.0f}s，重试 {stats['retries']} 次，停滞 {stats['stalls']} 次")
+            self.bili_queue.update(item["id"], stats=stats)
+            self.bili_history.append(dict(stats, title=title, file=os.path.basename(upload_path),
+                                          line=item.get("line", ""), status=status, time=int(time.time())))
+            self.bili_log("")  # 添加空行
+        except Exception as e:
+            error = str(e)
+            self.bili_log(f"❌ 上传过程中出现错误: {e}")
+        finally:
+            self.bili_queue.update(item["id"], status=status, error="" if status == "done" else error)
+            self.bili_active_uploads.pop(item["id"], None)
+            self.bili_upload_progress.pop(item["id"], None)
+            # 在主线程调度下一个上传；上传队列变短后，被背压暂停的流水线下载可以继续
+            self.root.after(0, self._pump_bili_uploads)
+            self.root.after(0, self.start_next_download)
+
+    def _prepare_bili_upload_file(self, item, state, log):
+        """
+        上传前转码：PCM 音轨按所选方案压缩（视频流直接复制），结果缓存在源文件旁边供重复上传使用
+        :return: 实际要上传的文件路径；转码失败或被取消时返回 None
+        """
+        path = item["path"]
+        profile = self.bili_profile_key()
+        if profile == "raw":
+            return path
+        codec = probe_audio_codec(path)
+        if not codec.startswith("pcm_"):
+            # 已经是压缩音频（或读不到音轨）时再转码只会变大，直接上传原文件
+            return path
+        cmd, out_path = build_upload_command(path, profile)
+        if cmd is None:
+            log(f"♻️ 复用已转码的上传文件: {os.path.basename(out_path)}")
+        else:
+            log(f"🔄 上传前转码（{UPLOAD_PROFILES[profile][0]}）: {os.path.basename(path)}")
+
+            def report(info):
+                if info["percent"] is not None and not info["done"]:
+                    self.bili_upload_progress[item["id"]] = f"转码 {info['percent']:.0f}%"
+                    self.root.after(0, self._refresh_bili_queue_view)
+
+            job = self.ffmpeg.run(cmd, key=f"bili-{item['id']}", duration=probe_duration(path), on_progress=report)
+            self.bili_upload_progress.pop(item["id"], None)
+            if job.process.returncode != 0:
+                if not job.cancelled and not state["cancelled"]:
+                    log(f"❌ 上传前转码失败: {job.error_summary()}")
                 try:
-                    if os.name == 'nt':
-                        # 使用taskkill强制终止所有biliup进程
-                        subprocess.run([
-                            "taskkill", "/F", "/IM", "biliup.exe"
-                        ], capture_output=True, timeout=3)
-                except Exception:
+                    os.remove(cmd[-1])
+                except OSError:
                     pass
-                
-                # 强制关闭CMD窗口
-                try:
-                    if os.name == 'nt':
-                        # 使用taskkill强制终止CMD相关进程
-                        subprocess.run([
-                            "taskkill", "/F", "/T", "/PID", str(self.bili_terminal_process.pid)
-                        ], capture_output=True, timeout=3)
-                        
-                        # 额外尝试终止所有cmd.exe进程（如果上面的方法失败）
-                        try:
-                            subprocess.run([
-                                "taskkill", "/F", "/IM", "cmd.exe"
-                            ], capture_output=True, timeout=2)
-                        except Exception:
-                            pass
-                            
-                        # 尝试终止Windows Terminal进程
-                        try:
-                            subprocess.run([
-                                "taskkill", "/F", "/IM", "WindowsTerminal.exe"
-                            ], capture_output=True, timeout=2)
-                        except Exception:
-                            pass
-                            
-                        # 尝试终止PowerShell进程
-                        try:
-                            subprocess.run([
-                                "taskkill", "/F", "/IM", "powershell.exe"
-                            ], capture_output=True, timeout=2)
-                        except Exception:
-                            pass
-                except Exception as e:
-                    self.bili_log(f"⚠️ 强制关闭终端时出错: {e}")
-                
-                self.bili_log("✅ 上传已取消")
-                self.bili_status_label.config(text="上传已取消", fg="orange")
-                
-            except Exception as e:
-                self.bili_log(f"❌ 取消上传时出现错误: {e}")
-                self.bili_status_label.config(text="取消失败", fg="red")
-            finally:
-                # 恢复按钮状态
-                self.bili_upload_button.config(state="normal")
-                self.bili_cancel_button.config(state="disabled")
-                # 清除进程引用
-                self.bili_upload_process = None
-                self.bili_terminal_process = None
+                return None
+            os.replace(cmd[-1], out_path)
+        try:
+            before, after = os.path.getsize(path), os.path.getsize(out_path)
+            log(f"📉 上传文件 {format_size(after)}（原文件 {format_size(before)}，节省 {format_size(max(0, before - after))}，"
+                f"{(1 - after / before) * 100 if before else 0:.0f}%）")
+        except OSError:
+            pass
+        self.bili_queue.update(item["id"], upload_path=out_path)
+        return out_path
+
+    def _choose_bili_line(self, log):
+        """
+        决定本次上传的线路和分片并发数
+        :return: {"line": 线路, "limit": 并发数}；使用 biliup 默认值时返回空字典
+        """
+        line = self.bili_line_var.get()
+        if line in BILI_UPLOAD_LINES:
+            return {"line": line}
+        result = self.bili_tuner.cached()
+        if not result:
+            if self.bili_tuner.recently_failed():
+                log("⚠️ 最近一次测速失败，暂时使用 biliup 默认线路")
+                return {}
+            log("📶 正在测速上传线路...")
+            result = self.bili_tuner.benchmark(progress=log)
+            self.root.after(0, lambda: self._show_bili_line_result(result))
+        if not result:
+            log("⚠️ 测速失败，使用 biliup 默认线路")
+            return {}
+        log(f"📶 使用线路 {result['line']}，分片并发 {result['limit']}")
+        return {"line": result["line"], "limit": result["limit"]}
+
+    def benchmark_bili_lines(self):
+        """手动测速所有上传线路并更新缓存（后台线程）"""
+        def run():
+            self.bili_log("📶 开始测速上传线路...")
+            result = self.bili_tuner.benchmark(progress=self.bili_log, force=True)
+            if result:
+                self.bili_log(f"✅ 最快线路 {result['line']}，分片并发 {result['limit']}")
+            else:
+                self.bili_log("❌ 所有线路测速失败，请检查网络")
+            self.root.after(0, lambda: self._show_bili_line_result(result))
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _show_bili_line_result(self, result):
+        if result:
+            rate = result["rates"].get(result["line"], 0)
+            tested = time.strftime("%H:%M", time.localtime(result["time"]))
+            self.bili_line_label.config(text=f"测速（{tested}）：{result['line']} {format_size(rate)}/s，并发 {result['limit']}")
         else:
-            self.bili_log("ℹ️ 没有正在进行的上传任务")
+            self.bili_line_label.config(text="尚未测速")
 
-    
+    def _save_bili_line(self, event=None):
+        config = load_config()
+        config["bili_upload_line"] = self.bili_line_var.get()
+        save_config(config)
+
+    def bili_profile_key(self):
+        """当前选择的上传前转码方案的键"""
+        label = self.bili_profile_var.get()
+        return next((key for key, value in UPLOAD_PROFILES.items() if value[0] == label), "flac")
+
+    def _save_bili_profile(self, event=None):
+        config = load_config()
+        config["bili_upload_profile"] = self.bili_profile_key()
+        save_config(config)
+
+    def _cancel_bili_item(self, item_id):
+        """终止某个正在上传的 biliup 及其子进程（只针对该上传的进程树，不影响其它程序）"""
+        state = self.bili_active_uploads.get(item_id)
+        if not state:
+            return
+        state["cancelled"] = True
+        self.ffmpeg.cancel(f"bili-{item_id}")
+        if state["process"] is not None:
+            PROCESSES.kill(state["process"])
+
+    def cancel_bili_upload(self):
+        """取消B站上传：终止所有正在上传的视频，并取消队列中尚未开始的视频"""
+        pending = [i for i in self.bili_queue.snapshot() if i["status"] == "pending"]
+        if not self.bili_active_uploads and not pending:
+            self.bili_log("ℹ️ 没有正在进行的上传任务")
+            return
+        self.bili_log("⏹️ 正在取消上传...")
+        for item in pending:
+            self.bili_queue.update(item["id"], status="cancelled")
+        for item_id in list(self.bili_active_uploads):
+            self._cancel_bili_item(item_id)
+        self.bili_log("✅ 上传已取消")
+        self._refresh_bili_queue_view()
 
     def clear_bili_log(self):
         """清空B站上传日志"""
@@ -0,0 +1,117 @@
+"""
+EQ 引擎基准测试：对比 ffmpeg 滤镜链与进程内 NumPy 引擎的耗时、吞吐量、峰值内存和输出差异。
+
+用法：
+    python eq_benchmark.py                 # 自动用 ffmpeg 生成 10 分钟的 WAV 和 FLAC 测试文件
+    python eq_benchmark.py a.flac b.wav    # 使用指定的音频文件
+
+需要 numpy、scipy、psutil，以及 PATH 中的 ffmpeg/ffprobe。
+"""
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import psutil
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# 测试用的 9 段增益（dB）和总音量，覆盖提升、衰减和 0dB 跳过的情况
+BANDS = [(62, 3), (125, -2), (250, 0), (500, 1.5), (1000, -4), (2000, 2), (4000, 0), (8000, 5), (16000, -3)]
+VOLUME_DB = -1.0
+
+
+def load_app():
+    """按文件路径导入 YTB 3.5.py（文件名含空格，不能直接 import）"""
+    spec = importlib.util.spec_from_file_location("ytb", os.path.join(HERE, "YTB 3.5.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_inputs(folder, seconds=600):
+    """生成带噪声的长音频：44.1kHz/16bit WAV 和 48kHz FLAC"""
+    paths = []
+    for name, rate, codec in (("bench.wav", 44100, "pcm_s16le"), ("bench.flac", 48000, "flac")):
+        path = os.path.join(folder, name)
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-f", "lavfi",
+                        "-i", f"anoisesrc=d={seconds}:c=pink:r={rate}:a=0.3",
+                        "-ac", "2", "-c:a", codec, "-y", path], check=True)
+        paths.append(path)
+    return paths
+
+
+def measure(fn):
+    """运行 fn 并返回 (耗时秒, 峰值 RSS 字节)；RSS 统计本进程及所有子进程（ffmpeg）之和"""
+    me = psutil.Process()
+    peak = [0]
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            total = 0
+            for proc in [me] + me.children(recursive=True):
+                try:
+                    total += proc.memory_info().rss
+                except psutil.Error:
+                    pass
+            peak[0] = max(peak[0], total)
+            time.sleep(0.02)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        fn()
+    finally:
+        elapsed = time.perf_counter() - start
+        done.set()
+        sampler.join()
+    return elapsed, peak[0]
+
+
+def max_diff_dbfs(app, a, b):
+    """两个 pcm_s32le 输出的最大逐样本差值（dBFS）"""
+    da, _, scale = app.wav_memmap(a)
+    db, _, _ = app.wav_memmap(b)
+    n = min(len(da), len(db))
+    worst = 0.0
+    for start in range(0, n, 1 << 20):
+        block = np.abs(da[start:start + (1 << 20)].astype(np.float64) - db[start:start + (1 << 20)]) * scale
+        worst = max(worst, float(block.max(initial=0.0)))
+    return 20 * np.log10(worst) if worst else float("-inf")
+
+
+def main():
+    app = load_app()
+    if not app.NumpyEQEngine.available():
+        sys.exit("需要安装 numpy 和 scipy")
+    eq_filter = app.build_eq_filter(BANDS, VOLUME_DB)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = sys.argv[1:] or generate_inputs(folder)
+        for path in paths:
+            seconds = float(subprocess.run(
+                ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+                capture_output=True, text=True).stdout.strip() or 0)
+            cmd, _, kind = app.build_eq_command(path, eq_filter)
+            if kind != "音频":
+                print(f"跳过非音频文件: {path}")
+                continue
+            ffmpeg_out = os.path.join(folder, "ffmpeg_EQ.wav")
+            numpy_out = os.path.join(folder, "numpy_EQ.wav")
+            cmd[-1] = ffmpeg_out
+            engine = app.NumpyEQEngine(BANDS, VOLUME_DB)
+
+            print(f"\n{os.path.basename(path)}（{seconds:.0f} 秒音频）")
+            for label, fn in (("ffmpeg", lambda: subprocess.run(cmd, check=True, capture_output=True)),
+                              ("numpy ", lambda: engine.process_file(path, numpy_out))):
+                elapsed, peak = measure(fn)
+                print(f"  {label}: {elapsed:6.2f}s  {seconds / elapsed:7.1f}x 实时  峰值内存 {peak / 1024 / 1024:7.1f} MB")
+            print(f"  最大差异: {max_diff_dbfs(app, ffmpeg_out, numpy_out):.1f} dBFS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+传输参数自动调优测试：在本机启动一个模拟限速的 HTTP 服务器，让 TransferTuner 反复选择
+--http-chunk-size / --concurrent-fragments 组合下载同一个文件，观察它是否收敛到最快的组合。
+
+服务器对每个请求加固定延迟（模拟往返和 CDN 首字节时间），并对每个连接单独限速，
+因此分块越大请求开销越少、分片并发越多总速率越高，最优组合是确定的。
+
+用法：
+    python tuner_harness.py                         # 进程内按分块/并发发 Range 请求，不需要 yt-dlp
+    python tuner_harness.py --yt-dlp                # 用 PATH 中的 yt-dlp 按相同参数下载，吞吐量从其输出解析
+    python tuner_harness.py --rounds 40 --latency 0.05 --conn-rate 4M --size 64M --format dash
+
+调优结果写入临时目录，不影响程序实际使用的 transfer_tuning.json。
+"""
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_app():
+    """按文件路径导入 YTB 3.5.py（文件名含空格，不能直接 import）"""
+    spec = importlib.util.spec_from_file_location("ytb", os.path.join(HERE, "YTB 3.5.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_handler(size, latency, conn_rate):
+    """构造请求处理类：支持 Range，每个请求先等待 latency 秒，再按 conn_rate 字节/秒发送"""
+    block = bytes(64 * 1024)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_HEAD(self):
+            self._respond(send_body=False)
+
+        def do_GET(self):
+            self._respond(send_body=True)
+
+        def _respond(self, send_body):
+            start, end = 0, size - 1
+            header = self.headers.get("Range", "")
+            if header.startswith("bytes="):
+                first, _, last = header[6:].partition("-")
+                start = int(first or 0)
+                end = min(int(last), size - 1) if last else size - 1
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            length = end - start + 1
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(length))
+            self.end_headers()
+            if not send_body:
+                return
+            time.sleep(latency)
+            began = time.perf_counter()
+            sent = 0
+            try:
+                while sent < length:
+                    chunk = block[:min(len(block), length - sent)]
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+                    # 按连接限速：发送进度超前于限速时间线时等待
+                    ahead = sent / conn_rate - (time.perf_counter() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def fetch_with_ranges(url, size, chunk_size, fragments):
+    """按 chunk_size 切分 Range 请求，用 fragments 个线程并行下载，返回吞吐量（字节/秒）"""
+    ranges = [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+
+    def fetch(byte_range):
+        request = urllib.request.Request(url, headers={"Range": f"bytes={byte_range[0]}-{byte_range[1]}"})
+        with urllib.request.urlopen(request) as response:
+            while response.read(256 * 1024):
+                pass
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=fragments) as executor:
+        list(executor.map(fetch, ranges))
+    return size / (time.perf_counter() - began)
+
+
+def fetch_with_yt_dlp(app, url, folder, chunk_size, fragments):
+    """用 yt-dlp 按给定参数下载，吞吐量由程序自己的 parse_download_throughput 从输出中解析"""
+    cmd = ["yt-dlp", url, "--newline", "--force-overwrites", "-o", os.path.join(folder, "download.%(ext)s"),
+           "--http-chunk-size", str(chunk_size), "--concurrent-fragments", str(fragments)]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"yt-dlp 下载失败：{result.stderr.strip()}")
+    return app.parse_download_throughput(result.stdout.splitlines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在本地模拟服务器上测试 TransferTuner 的收敛情况")
+    parser.add_argument("--rounds", type=int, default=30, help="下载轮数")
+    parser.add_argument("--size", default="32M", help="测试文件大小")
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--conn-rate", default="8M", help="每个连接的限速（字节/秒）")
+    parser.add_argument("--format", default="dash", choices=["progressive", "hls", "dash"], help="模拟的格式类型")
+    parser.add_argument("--yt-dlp", dest="use_yt_dlp", action="store_true", help="用 yt-dlp 实际下载")
+    args = parser.parse_args()
+
+    app = load_app()
+    size = app.parse_rate(args.size)
+    conn_rate = app.parse_rate(args.conn_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(size, args.latency, conn_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/test.mp4"
+    print(f"模拟服务器：{url}（{app.format_rate(conn_rate)}/连接，每个请求延迟 {args.latency * 1000:.0f}ms）")
+
+    mb = app.TransferTuner.MB
+    with tempfile.TemporaryDirectory() as folder:
+        tuner = app.TransferTuner(os.path.join(folder, "transfer_tuning.json"))
+        try:
+            for round_no in range(1, args.rounds + 1):
+                chunk_size, fragments = tuner.choose(args.format)
+                if args.use_yt_dlp:
+                    throughput = fetch_with_yt_dlp(app, url, folder, chunk_size, fragments)
+                else:
+                    throughput = fetch_with_ranges(url, size, chunk_size, fragments)
+                if throughput:
+                    tuner.record(args.format, None, chunk_size, fragments, throughput)
+                print(f"[{round_no:3d}] 分块 {chunk_size // mb:2d}MB 并发 {fragments}："
+                      f"{app.format_rate(int(throughput or 0))}")
+        finally:
+            server.shutdown()
+
+        print("\n各组合的平均吞吐：")
+        stats = tuner.profiles.get(tuner.profile_key(args.format), {})
+        for arm in sorted(stats, key=lambda key: -stats[key]["mean"]):
+            chunk_size, fragments = map(int, arm.split(":"))
+            print(f"  分块 {chunk_size // mb:2d}MB 并发 {fragments}：{app.format_rate(int(stats[arm]['mean']))}"
+                  f"（{stats[arm]['n']} 次）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+上传线路测速测试：在本机启动几个模拟 upos 分片上传的节点，让 UploadLineTuner 对它们测速，
+检查是否选中最快的线路和并发数、各种拒绝方式是否被正确计入、结果和失败是否按预期缓存。
+
+每个模拟节点接收 PUT 分片并按设定速率读取请求体（对每个连接单独限速，并可设置节点总速率上限），
+因此并发数在节点总速率以内越高越快，超过后不再提升。
+与真实 upos 节点一样，"auth" 节点读完整个分片后才以 403 拒绝未授权的请求，这种样本应当有效；
+"early" 节点不读请求体就拒绝并关闭连接、"broken" 节点返回 503，这两种样本应当作废。
+
+用法：
+    python upload_line_harness.py
+    python upload_line_harness.py --probe-bytes 8M --chunk-bytes 1M
+
+需要 requests。测速结果写入临时目录，不影响程序实际使用的 bili_line_benchmark.json。
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MB = 1024 * 1024
+# 模拟线路：名称 -> (每连接速率, 节点总速率, 返回的状态码, 是否先读完请求体)
+LINES = {
+    "slow": (2 * MB, 4 * MB, 200, True),
+    "fast": (4 * MB, 12 * MB, 200, True),
+    "capped": (8 * MB, 8 * MB, 200, True),
+    "auth": (3 * MB, 6 * MB, 403, True),  # 与生产节点相同：收完数据再拒绝未授权请求
+    "early": (64 * MB, 64 * MB, 403, False),  # 不读数据就拒绝，若计入会被误判为最快
+    "broken": (64 * MB, 64 * MB, 503, True),  # 服务端错误
+}
+
+
+def load_app():
+    """按文件路径导入 YTB 3.5.py（文件名含空格，不能直接 import）"""
+    spec = importlib.util.spec_from_file_location("ytb", os.path.join(HERE, "YTB 3.5.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class RateLimiter:
+    """节点总速率限制：所有连接共享一条按时间补充的额度"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_free = time.perf_counter()
+
+    def take(self, size):
+        with self.lock:
+            now = time.perf_counter()
+            self.next_free = max(self.next_free, now) + size / self.rate
+            wait = self.next_free - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+def make_handler(conn_rate, node_rate, status, read_body):
+    """构造模拟节点的请求处理类：read_body 为 False 时不读请求体直接返回，否则按速率读完分片再返回 status"""
+    limiter = RateLimiter(node_rate)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_PUT(self):
+            length = int(self.headers.get("Content-Length", 0))
+            if not read_body:
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                return
+            began = time.perf_counter()
+            received = 0
+            while received < length:
+                data = self.rfile.read(min(64 * 1024, length - received))
+                if not data:
+                    break
+                received += len(data)
+                limiter.take(len(data))
+                ahead = received / conn_rate - (time.perf_counter() - began)
+                if ahead > 0:
+                    time.sleep(ahead)
+            body = b"OK" if status < 400 else b"denied"
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def start_nodes():
+    """启动各模拟节点，返回 ({线路: 节点地址}, [服务器])"""
+    endpoints, servers = {}, []
+    for line, (conn_rate, node_rate, status, read_body) in LINES.items():
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(conn_rate, node_rate, status, read_body))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        endpoints[line] = f"http://127.0.0.1:{server.server_address[1]}"
+        servers.append(server)
+    return endpoints, servers
+
+
+def check(label, ok):
+    print(f"  {'✅' if ok else '❌'} {label}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在本地模拟节点上测试 UploadLineTuner")
+    parser.add_argument("--probe-bytes", default="4M", help="每次探测上传的总字节数")
+    parser.add_argument("--chunk-bytes", default="512K", help="每个分片的大小")
+    args = parser.parse_args()
+
+    app = load_app()
+    endpoints, servers = start_nodes()
+    probe_bytes, chunk_bytes = app.parse_rate(args.probe_bytes), app.parse_rate(args.chunk_bytes)
+    passed = True
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            state_path = os.path.join(folder, "bili_line_benchmark.json")
+            tuner = app.UploadLineTuner(state_path, endpoints=endpoints, probe_bytes=probe_bytes, chunk_bytes=chunk_bytes)
+            print("测速：")
+            result = tuner.benchmark(progress=lambda text: print(f"  {text}"))
+            print(f"结果：线路 {result and result['line']}，并发 {result and result['limit']}\n")
+            passed &= check("选中最快的线路 fast", bool(result) and result["line"] == "fast")
+            passed &= check("收完数据后才拒绝的节点计入有效测速", bool(result) and result["rates"]["auth"] > 0)
+            passed &= check("不读数据就拒绝的节点记为不可用", bool(result) and result["rates"]["early"] == 0)
+            passed &= check("返回 5xx 的节点记为不可用", bool(result) and result["rates"]["broken"] == 0)
+            passed &= check("节点总速率未饱和时选用多于 1 的并发", bool(result) and result["limit"] != 1)
+
+            started = time.perf_counter()
+            again = tuner.best()
+            passed &= check("有效期内直接复用缓存", again is result and time.perf_counter() - started < 0.1)
+            reloaded = app.UploadLineTuner(state_path, endpoints=endpoints)
+            passed &= check("缓存写入文件，重新创建后仍可用", bool(reloaded.cached()) and reloaded.cached()["line"] == "fast")
+
+            # 所有线路都拒绝：失败结果在短期内被缓存，不会重复测速
+            denied = {"a": endpoints["early"], "b": endpoints["broken"]}
+            failing = app.UploadLineTuner(os.path.join(folder, "failing.json"), endpoints=denied,
+                                          probe_bytes=probe_bytes, chunk_bytes=chunk_bytes)
+            passed &= check("全部线路拒绝时测速失败", failing.benchmark() is None)
+            probes = []
+            original_probe = failing.probe
+            failing.probe = lambda *a, **kw: probes.append(a) or original_probe(*a, **kw)
+            passed &= check("失败缓存期内不再重测", failing.best() is None and not probes)
+            failing.benchmark(force=True)
+            passed &= check("手动测速忽略失败缓存", len(probes) == len(denied))
+    finally:
+        for server in servers:
+            server.shutdown()
+    print("\n全部通过" if passed else "\n存在失败项")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()